@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Pool of local source addresses to bind outgoing connections to
+# Built from the sourceIPPool .fuzzer setting, which can be a list
+# of addresses and/or CIDR blocks, e.g. "10.0.0.5,10.0.1.0/28"
+#
+#------------------------------------------------------------------
+
+import os
+import socket
+import struct
+
+class SourceAddressPool(object):
+    class Mode:
+        # Move to the next address on every connection
+        Connection = "connection"
+        # Pick one address for the lifetime of this Mutiny process, so that
+        # several Mutiny instances launched against the same target spread out
+        Worker = "worker"
+
+    def __init__(self, poolStr, mode=Mode.Connection):
+        if mode != self.Mode.Connection and mode != self.Mode.Worker:
+            raise RuntimeError("Invalid sourceIPPoolMode {0}, must be {1} or {2}".format(mode, self.Mode.Connection, self.Mode.Worker))
+        self.mode = mode
+        # List of (family, first address as int, address count)
+        # CIDR blocks are never expanded, so a /16 costs the same as a single address
+        self._ranges = []
+        # Address count, a long for large IPv6 blocks, which is why there's
+        # no __len__() (and so no truthiness), that has to fit in an int
+        self.size = 0
+        for entry in filter(None, poolStr.replace(" ", "").split(",")):
+            self._addEntry(entry)
+        # Next index handed out per address family, so mixed v4/v6 pools
+        # rotate independently
+        self._nextIndex = {}
+        if self.mode == self.Mode.Worker and self.size > 0:
+            self._workerOffset = os.getpid() % self.size
+        else:
+            self._workerOffset = 0
+
+    def _addEntry(self, entry):
+        if "/" in entry:
+            (address, prefixLength) = entry.split("/", 1)
+            prefixLength = int(prefixLength)
+        else:
+            address = entry
+            prefixLength = None
+
+        (family, addressInt) = self._addressToInt(address)
+        bits = 32 if family == socket.AF_INET else 128
+        if prefixLength is None:
+            prefixLength = bits
+        if prefixLength < 0 or prefixLength > bits:
+            raise RuntimeError("Invalid prefix length in sourceIPPool entry {0}".format(entry))
+
+        hostBits = bits - prefixLength
+        first = (addressInt >> hostBits) << hostBits
+        count = 1 << hostBits
+        if family == socket.AF_INET and hostBits >= 2:
+            # Skip IPv4 network and broadcast addresses
+            first += 1
+            count -= 2
+        elif family == socket.AF_INET6 and hostBits >= 2:
+            # Skip the IPv6 network (subnet-router anycast) address, /127 and
+            # /128 are point-to-point/single addresses with nothing to skip
+            first += 1
+            count -= 1
+        self._ranges.append((family, first, count))
+        self.size += count
+
+    def _addressToInt(self, address):
+        try:
+            return (socket.AF_INET, struct.unpack("!I", socket.inet_pton(socket.AF_INET, address))[0])
+        except socket.error:
+            pass
+        try:
+            (high, low) = struct.unpack("!QQ", socket.inet_pton(socket.AF_INET6, address))
+            return (socket.AF_INET6, (high << 64) | low)
+        except socket.error:
+            raise RuntimeError("Invalid sourceIPPool address: {0}".format(address))
+
+    def _intToAddress(self, family, addressInt):
+        if family == socket.AF_INET:
+            return socket.inet_ntop(socket.AF_INET, struct.pack("!I", addressInt))
+        else:
+            return socket.inet_ntop(socket.AF_INET6, struct.pack("!QQ", addressInt >> 64, addressInt & 0xFFFFFFFFFFFFFFFF))
+
+    # Count of addresses in the pool usable with the given address family
+    def familySize(self, family):
+        return sum(count for (rangeFamily, first, count) in self._ranges if rangeFamily == family)
+
+    # Get the index'th address of the given family, wrapping around
+    def _addressAt(self, family, index):
+        for (rangeFamily, first, count) in self._ranges:
+            if rangeFamily != family:
+                continue
+            if index < count:
+                return self._intToAddress(family, first + index)
+            index -= count
+        return None
+
+    # Returns the source address to bind the next connection of the given
+    # family to, or None if the pool has nothing for that family
+    def nextAddress(self, family):
+        size = self.familySize(family)
+        if size == 0:
+            return None
+
+        if self.mode == self.Mode.Worker:
+            return self._addressAt(family, self._workerOffset % size)
+
+        index = self._nextIndex.get(family, 0)
+        self._nextIndex[family] = (index + 1) % size
+        return self._addressAt(family, (index + self._workerOffset) % size)
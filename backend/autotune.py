@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Picks receiveTimeout and a run rate for a session by repeatedly
+# performing the unfuzzed test run and measuring how the target responds
+#
+#------------------------------------------------------------------
+
+import math
+import socket
+import time
+
+class AutotuneStats(object):
+    def __init__(self):
+        # Seconds from recv() being called until data arrived
+        self.receiveLatencies = []
+        self.runs = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def getErrorRate(self):
+        return float(self.timeouts + self.errors) / max(self.runs, 1)
+
+    def getRunsPerSecond(self):
+        return self.runs / max(self.elapsed, 0.000001)
+
+    # Latency below which the given fraction of receives completed
+    def getLatencyQuantile(self, quantile):
+        if not self.receiveLatencies:
+            return None
+        latencies = sorted(self.receiveLatencies)
+        index = int(math.ceil(quantile * len(latencies))) - 1
+        return latencies[min(max(index, 0), len(latencies) - 1)]
+
+class Autotuner(object):
+    # How many times slower than the slowest accepted response a receive
+    # may be before we give up on it
+    timeoutMargin = 1.5
+    # Never pick a receiveTimeout below this (seconds)
+    minimumTimeout = 0.01
+    # How much to divide the run rate by on each step looking for a stable
+    # one, and how many steps to try
+    rateBackoff = 4.0
+    maxRateSteps = 6
+
+    # iterations - test runs per measurement
+    # maxTimeoutRate - highest acceptable fraction of runs timing out/erroring
+    # sidecarPath - file to write the chosen settings to
+    def __init__(self, iterations, maxTimeoutRate, sidecarPath):
+        self.iterations = iterations
+        self.maxTimeoutRate = maxTimeoutRate
+        self.sidecarPath = sidecarPath
+        # Set while measuring so receivePacket() knows to record latencies
+        self.stats = None
+        # receiveTimeout from the .fuzzer file, kept for repeated tuning
+        self.ceilingTimeout = None
+        # Run rate from --rate (0 = unlimited), never exceeded either
+        self.ceilingRate = None
+
+    # Called by receivePacket() for every successful receive while tuning
+    def recordReceive(self, latency):
+        if self.stats:
+            self.stats.receiveLatencies.append(latency)
+
+    # runOnce - callable performing one unfuzzed run
+    # fuzzerData - receiveTimeout is updated in place
+    # pacer - run rate is updated in place
+    def tune(self, runOnce, fuzzerData, pacer):
+        print "\n** Autotuning with %d test runs per step **" % (self.iterations)
+        # Measure with the configured timeout and rate as ceilings, since
+        # we can't learn anything about responses slower than the timeout,
+        # and the rate limit may be protecting the target or shared with
+        # other Mutiny processes through --rateshare
+        if self.ceilingTimeout is None:
+            self.ceilingTimeout = fuzzerData.receiveTimeout
+        if self.ceilingRate is None:
+            self.ceilingRate = pacer.getRunRate()
+        ceilingTimeout = self.ceilingTimeout
+        ceilingRate = self.ceilingRate
+        fuzzerData.receiveTimeout = ceilingTimeout
+        rate = ceilingRate
+        pacer.setRunRate(rate)
+        stats = self._measure(runOnce, pacer)
+        print "%s: %.2f runs/s, %.1f%% timed out or failed" % ("Rate %.2f runs/s" % (rate) if rate else "Unlimited rate", stats.getRunsPerSecond(), stats.getErrorRate()*100)
+
+        # If the target can't keep up, back off from the rate achieved until it can
+        step = 0
+        while stats.getErrorRate() > self.maxTimeoutRate and step < self.maxRateSteps:
+            if step == 0:
+                rate = stats.getRunsPerSecond() if ceilingRate == 0 else min(stats.getRunsPerSecond(), ceilingRate)
+            rate /= self.rateBackoff
+            pacer.setRunRate(rate)
+            stats = self._measure(runOnce, pacer)
+            print "Rate %.2f runs/s: %.1f%% timed out or failed" % (rate, stats.getErrorRate()*100)
+            step += 1
+        if stats.getErrorRate() > self.maxTimeoutRate:
+            print "WARNING: Couldn't find a rate with under %.1f%% failed test runs, leaving rate at %s" % (self.maxTimeoutRate*100, "%.2f runs/s" % (ceilingRate) if ceilingRate else "unlimited")
+            rate = ceilingRate
+            pacer.setRunRate(rate)
+
+        # Wait long enough for all but maxTimeoutRate of responses
+        slowest = stats.getLatencyQuantile(1.0 - self.maxTimeoutRate)
+        if slowest is None:
+            print "WARNING: No responses received while autotuning, leaving receiveTimeout at %.3f" % (ceilingTimeout)
+            receiveTimeout = ceilingTimeout
+        else:
+            receiveTimeout = min(max(slowest * self.timeoutMargin, self.minimumTimeout), ceilingTimeout)
+        fuzzerData.receiveTimeout = receiveTimeout
+
+        print "Autotune chose receiveTimeout %.4f, rate %s" % (receiveTimeout, "%.2f runs/s" % (rate) if rate else "unlimited")
+        self.writeSidecar(stats, receiveTimeout, rate)
+
+    def _measure(self, runOnce, pacer):
+        self.stats = AutotuneStats()
+        startTime = time.time()
+        try:
+            for i in range(0, self.iterations):
+                pacer.waitForRun()
+                self.stats.runs += 1
+                try:
+                    runOnce()
+                except socket.timeout:
+                    self.stats.timeouts += 1
+                except Exception as e:
+                    if "timed out" in str(e):
+                        self.stats.timeouts += 1
+                    else:
+                        self.stats.errors += 1
+            self.stats.elapsed = time.time() - startTime
+            return self.stats
+        finally:
+            self.stats = None
+
+    # Written in .fuzzer setting syntax so values can be copied straight in
+    def writeSidecar(self, stats, receiveTimeout, rate):
+        with open(self.sidecarPath, "w") as outputFile:
+            outputFile.write("# Autotune results from %s\n" % (time.strftime("%Y-%m-%d %H:%M:%S")))
+            outputFile.write("# %d test runs at %.2f runs/s, %d timed out, %d failed\n" % (stats.runs, stats.getRunsPerSecond(), stats.timeouts, stats.errors))
+            for quantile in (0.5, 0.9, 0.99, 1.0):
+                latency = stats.getLatencyQuantile(quantile)
+                if latency is not None:
+                    outputFile.write("# p%g receive latency %.4f\n" % (quantile*100, latency))
+            outputFile.write("receiveTimeout %.4f\n" % (receiveTimeout))
+            outputFile.write("# Pass to mutiny.py as --rate, 0 = unlimited\n")
+            outputFile.write("rate %.2f\n" % (rate))
+        print "Wrote autotune results to %s" % (self.sidecarPath)
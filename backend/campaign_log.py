@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Binary campaign log, so logging every run doesn't mean a file per run
+#
+# A log folder holds numbered segment files of length-prefixed records plus
+# an index mapping each seed to the segment and offset of its latest record.
+# All integers are little-endian.
+#
+# Record:  <I total length of everything below>
+#          <q seed> <d start time> <d end time> <i highest message number>
+#          <I length> error message
+#          <I count> then per altered subcomponent:
+#              <I message number> <I subcomponent number> <I length> data
+#          <I count> then per received message:
+#              <I message number> <I length> data
+#
+# Index:   <q seed> <I segment number> <Q offset>, one per record, in the
+#          order the records were written
+#
+# The log only holds what changes per run, util/campaign_log.py renders a
+# record back into the text log format using the .fuzzer it came from
+#
+#------------------------------------------------------------------
+
+import os
+import os.path
+import re
+import struct
+
+SEGMENT_NAME = "campaign-%05d.log"
+INDEX_NAME = "campaign.index"
+# Start a new segment once the current one passes this many bytes
+DEFAULT_SEGMENT_SIZE = 256*1024*1024
+
+_lengthFormat = struct.Struct("<I")
+_headerFormat = struct.Struct("<qddi")
+_alteredFormat = struct.Struct("<III")
+_receivedFormat = struct.Struct("<II")
+_indexFormat = struct.Struct("<qIQ")
+
+# One decoded record, see CampaignLogReader.getRecord()
+class CampaignLogRecord(object):
+    __slots__ = ["seed", "startTime", "endTime", "highestMessageNumber", "errorMessage", "alteredState", "receivedMessageData"]
+
+    def __init__(self, seed, startTime, endTime, highestMessageNumber, errorMessage, alteredState, receivedMessageData):
+        self.seed = seed
+        self.startTime = startTime
+        self.endTime = endTime
+        self.highestMessageNumber = highestMessageNumber
+        self.errorMessage = errorMessage
+        # Same shape as MessageCollection.getAlteredState(), so it can be
+        # handed straight to Logger.writeLog()
+        self.alteredState = alteredState
+        # messageNumber -> bytearray, like Logger.receivedMessageData
+        self.receivedMessageData = receivedMessageData
+
+class CampaignLogWriter(object):
+    def __init__(self, folderPath, segmentSize=DEFAULT_SEGMENT_SIZE):
+        self._folderPath = folderPath
+        self._segmentSize = segmentSize
+        self._segmentNumber = -1
+        self._segmentFile = None
+        self._offset = 0
+        self._indexFile = open(os.path.join(folderPath, INDEX_NAME), "ab")
+        self._nextSegment()
+
+    def _nextSegment(self):
+        if self._segmentFile:
+            self._segmentFile.close()
+        self._segmentNumber += 1
+        self._segmentFile = open(os.path.join(self._folderPath, SEGMENT_NAME % (self._segmentNumber)), "wb")
+        self._offset = 0
+
+    # alteredState - from MessageCollection.getAlteredState()
+    # receivedMessageData - messageNumber -> received data
+    def append(self, seed, startTime, endTime, highestMessageNumber, errorMessage, alteredState, receivedMessageData):
+        pieces = [_headerFormat.pack(seed, startTime, endTime, highestMessageNumber), _lengthFormat.pack(len(errorMessage)), errorMessage]
+        pieces.append(_lengthFormat.pack(len(alteredState)))
+        for (messageNumber, subcomponentNumber, altered) in alteredState:
+            pieces.append(_alteredFormat.pack(messageNumber, subcomponentNumber, len(altered)))
+            pieces.append(str(altered))
+        pieces.append(_lengthFormat.pack(len(receivedMessageData)))
+        for (messageNumber, data) in sorted(receivedMessageData.items()):
+            pieces.append(_receivedFormat.pack(messageNumber, len(data)))
+            pieces.append(str(data))
+        record = "".join(pieces)
+
+        if self._offset > 0 and self._offset + _lengthFormat.size + len(record) > self._segmentSize:
+            self._nextSegment()
+        self._segmentFile.write(_lengthFormat.pack(len(record)))
+        self._segmentFile.write(record)
+        self._indexFile.write(_indexFormat.pack(seed, self._segmentNumber, self._offset))
+        self._offset += _lengthFormat.size + len(record)
+
+    # Logger flushes after every record, or every batch when logging on a
+    # background thread, so the log is complete if Mutiny dies or is killed
+    def flush(self):
+        self._segmentFile.flush()
+        self._indexFile.flush()
+
+    def close(self):
+        self._segmentFile.close()
+        self._indexFile.close()
+
+class CampaignLogReader(object):
+    def __init__(self, folderPath):
+        self._folderPath = folderPath
+        # seed -> (segment number, offset), the latest record wins if a seed
+        # was logged more than once (LogAll and then a crash, for example)
+        self.index = {}
+        with open(os.path.join(folderPath, INDEX_NAME), "rb") as indexFile:
+            indexData = indexFile.read()
+        # Ignore a partial entry at the end from an interrupted write
+        for offset in xrange(0, len(indexData) - len(indexData) % _indexFormat.size, _indexFormat.size):
+            (seed, segmentNumber, recordOffset) = _indexFormat.unpack_from(indexData, offset)
+            self.index[seed] = (segmentNumber, recordOffset)
+
+    def getSeeds(self):
+        return sorted(self.index.keys())
+
+    def getRecord(self, seed):
+        if seed not in self.index:
+            raise RuntimeError("Seed %d is not in the campaign log at %s" % (seed, self._folderPath))
+        (segmentNumber, offset) = self.index[seed]
+        with open(os.path.join(self._folderPath, SEGMENT_NAME % (segmentNumber)), "rb") as segmentFile:
+            segmentFile.seek(offset)
+            (recordLength,) = _lengthFormat.unpack(segmentFile.read(_lengthFormat.size))
+            record = segmentFile.read(recordLength)
+        if len(record) != recordLength:
+            raise RuntimeError("Record for seed %d is truncated in segment %d" % (seed, segmentNumber))
+        return self._decodeRecord(record)
+
+    def _decodeRecord(self, record):
+        (seed, startTime, endTime, highestMessageNumber) = _headerFormat.unpack_from(record, 0)
+        offset = _headerFormat.size
+        (length,) = _lengthFormat.unpack_from(record, offset)
+        offset += _lengthFormat.size
+        errorMessage = record[offset:offset+length]
+        offset += length
+
+        alteredState = []
+        (count,) = _lengthFormat.unpack_from(record, offset)
+        offset += _lengthFormat.size
+        for _ in xrange(count):
+            (messageNumber, subcomponentNumber, length) = _alteredFormat.unpack_from(record, offset)
+            offset += _alteredFormat.size
+            alteredState.append((messageNumber, subcomponentNumber, bytearray(record[offset:offset+length])))
+            offset += length
+
+        receivedMessageData = {}
+        (count,) = _lengthFormat.unpack_from(record, offset)
+        offset += _lengthFormat.size
+        for _ in xrange(count):
+            (messageNumber, length) = _receivedFormat.unpack_from(record, offset)
+            offset += _receivedFormat.size
+            receivedMessageData[messageNumber] = bytearray(record[offset:offset+length])
+            offset += length
+
+        return CampaignLogRecord(seed, startTime, endTime, highestMessageNumber, errorMessage, alteredState, receivedMessageData)
+
+# Parse util/campaign_log.py's --seeds, "X" or "X-Y" where either can be
+# negative since the test run is logged as seed -1
+# Returns (lowest seed, highest seed)
+def parseSeedRange(seedsStr):
+    match = re.match(r"^(-?[0-9]+)(?:-(-?[0-9]+))?$", seedsStr.strip())
+    if not match:
+        raise RuntimeError("Invalid seed range {0}, expected X or X-Y".format(seedsStr))
+    low = int(match.group(1))
+    high = low if match.group(2) is None else int(match.group(2))
+    return (low, high)
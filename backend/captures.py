@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Declarative session state: "capture" lines after an inbound message save
+# part of the received data, and ${name} in outbound messages is replaced
+# with the latest captured value before fuzzing
+#
+#   capture <name> <firstByte>-[<lastByte>]
+#   capture <name> regex '<pattern>'
+#
+# Regex patterns are quoted the same way as message data, and capture group
+# 1 if there is one, otherwise the whole match
+#
+#------------------------------------------------------------------
+
+import re
+from backend.fuzzer_types import Message
+
+class CaptureRule(object):
+    def __init__(self, ruleStr):
+        self.ruleStr = ruleStr
+        args = ruleStr.split(" ", 2)
+        if len(args) < 2 or not args[0]:
+            raise RuntimeError("Invalid capture, expected '<name> <firstByte>-[<lastByte>]' or '<name> regex <pattern>': {0}".format(ruleStr))
+        self.name = args[0]
+        if not re.match(r"^\w+$", self.name):
+            raise RuntimeError("Capture names can only contain letters, numbers and _: {0}".format(ruleStr))
+
+        self.regex = None
+        if args[1] == "regex":
+            if len(args) < 3:
+                raise RuntimeError("Capture regex is missing its pattern: {0}".format(ruleStr))
+            try:
+                self.regex = re.compile(str(Message.deserializeByteArray(args[2])), re.DOTALL)
+            except (ValueError, re.error) as e:
+                raise RuntimeError("Invalid capture regex ({0}): {1}".format(str(e), ruleStr))
+            self.group = 1 if self.regex.groups else 0
+        else:
+            try:
+                (first, last) = args[1].split("-")
+                self.start = int(first)
+                # Slice index, None = to the end
+                self.end = int(last) + 1 if last else None
+            except ValueError:
+                raise RuntimeError("Invalid capture range, expected <firstByte>-[<lastByte>]: {0}".format(ruleStr))
+
+    def __str__(self):
+        return self.ruleStr
+
+    # Returns the captured bytearray, or None if data doesn't contain it
+    def capture(self, data):
+        if self.regex:
+            match = self.regex.search(str(data))
+            if not match:
+                return None
+            return bytearray(match.group(self.group))
+        if len(data) < (self.end or self.start + 1):
+            return None
+        return data[self.start:self.end]
+
+# Current value of every capture for a run
+class CapturedValues(object):
+    # captures - FuzzerData.captures
+    def __init__(self, captures, messageCollection):
+        self.captures = captures
+        # Values from the recorded conversation, used until something is received
+        self.defaults = {}
+        for (messageNum, rules) in captures.iteritems():
+            for rule in rules:
+                value = rule.capture(messageCollection.messages[messageNum].getOriginalMessage())
+                if value != None:
+                    self.defaults[rule.name] = value
+        self.values = dict(self.defaults)
+
+        names = set([rule.name for rules in captures.itervalues() for rule in rules])
+        self.placeholderRegex = None
+        if names:
+            self.placeholderRegex = re.compile(r"\$\{(" + "|".join(sorted(names)) + r")\}")
+
+    def resetForNewRun(self):
+        self.values = dict(self.defaults)
+
+    # Save anything captured from data, received for message number messageNum
+    def capture(self, messageNum, data):
+        for rule in self.captures.get(messageNum, []):
+            value = rule.capture(data)
+            if value != None:
+                self.values[rule.name] = value
+
+    # Whether byteArray contains any placeholders to substitute
+    def hasPlaceholders(self, byteArray):
+        return self.placeholderRegex != None and self.placeholderRegex.search(str(byteArray)) != None
+
+    # Returns byteArray with every ${name} replaced by its current value
+    # Names without a value so far are left alone
+    def substitute(self, byteArray):
+        return bytearray(self.placeholderRegex.sub(self._replacement, str(byteArray)))
+
+    def _replacement(self, match):
+        value = self.values.get(match.group(1))
+        if value == None:
+            return match.group(0)
+        return str(value)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Builds the connections used for each fuzzing run
+# Target resolution, address family detection and socket parameters
+# are worked out once per campaign instead of once per run
+#
+#------------------------------------------------------------------
+
+import errno
+import os.path
+import select
+import socket
+import ssl
+import sys
+import time
+from backend.packets import PROTO
+
+# ssl only has OP_NO_TICKET from Python 3.6, this is OpenSSL's SSL_OP_NO_TICKET
+OP_NO_TICKET = getattr(ssl, "OP_NO_TICKET", 0x4000)
+
+class ConnectionFactory(object):
+    def __init__(self, fuzzerData, host, sourceAddressPool=None, fuzzerFolder="", pacer=None):
+        self.fuzzerData = fuzzerData
+        self.host = host
+        # Pacer to wait on before each connection, if any
+        self.pacer = pacer
+        # Relative certificate paths are relative to the .fuzzer file
+        self.fuzzerFolder = fuzzerFolder
+        self.sourceAddressPool = sourceAddressPool
+        # Time after which the cached resolution below is considered stale
+        self._resolveExpiry = 0
+        # Filled in by resolve()
+        self.family = None
+        self.addr = None
+        self._socketArgs = None
+        self._bindAddress = None
+        # Whether raw sockets get IP_HDRINCL cleared, see _prepareSocketArgs()
+        self._clearHeaderInclude = False
+        self.resolve()
+
+        # TLS state shared by every connection of the session
+        self._tlsContext = None
+        self.tlsStats = TLSHandshakeStats()
+        if fuzzerData.proto == "tls":
+            self._tlsContext = self._createTLSContext()
+
+    # Resolve the target, caching the result for fuzzerData.resolveTTL seconds
+    # Returns (address family, address to connect/send to)
+    def resolve(self):
+        now = time.time()
+        if self.addr is not None and now < self._resolveExpiry:
+            return (self.family, self.addr)
+
+        (family, addr) = self._resolveHost(self.host, self.fuzzerData.port)
+        if family != self.family:
+            self._socketArgs = None
+        self.family = family
+        self.addr = addr
+        self._resolveExpiry = now + self.fuzzerData.resolveTTL
+        self._prepareSocketArgs()
+        if self._socketArgs[1] == socket.SOCK_RAW and family != socket.AF_UNIX and family != socket.AF_PACKET:
+            # Raw sockets have no port
+            self.addr = (addr[0], 0)
+        return (self.family, self.addr)
+
+    # Address to hand to the MessageProcessor/Monitor as the target
+    def targetAddress(self):
+        (family, addr) = self.resolve()
+        if family == socket.AF_UNIX:
+            return addr
+        return addr[0]
+
+    def _resolveHost(self, host, port):
+        # Anything that looks like a path is a domain socket
+        if "/" in host:
+            return (socket.AF_UNIX, host)
+        # Layer 2 just needs the interface name
+        if self.fuzzerData.proto == "L2raw":
+            return (socket.AF_PACKET, (host, 0))
+
+        socketType = socket.SOCK_DGRAM if self.fuzzerData.proto == "udp" else socket.SOCK_STREAM
+        try:
+            results = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socketType)
+        except socket.gaierror as e:
+            # Not resolvable, but could be a domain socket in the current directory
+            if os.path.exists(host):
+                return (socket.AF_UNIX, host)
+            raise RuntimeError("Unable to resolve target host {0}: {1}".format(host, str(e)))
+
+        # Prefer IPv4 when a name has both, so "localhost" keeps meaning 127.0.0.1
+        for (family, _, _, _, sockaddr) in results:
+            if family == socket.AF_INET:
+                return (family, sockaddr)
+        (family, _, _, _, sockaddr) = results[0]
+        return (family, sockaddr)
+
+    # Work out (family, type, proto) for socket() and where to bind/connect
+    # so createConnection() only has to make the calls
+    def _prepareSocketArgs(self):
+        if self._socketArgs is not None:
+            return
+        proto = self.fuzzerData.proto
+        family = self.family
+        self._clearHeaderInclude = False
+
+        if proto == "tcp" or proto == "tls":
+            self._socketArgs = (family, socket.SOCK_STREAM, 0)
+        elif proto == "udp":
+            self._socketArgs = (family, socket.SOCK_DGRAM, 0)
+        elif proto == "L2raw":
+            self._socketArgs = (socket.AF_PACKET, socket.SOCK_RAW, 0x0300)
+        else:
+            # PROTO = dictionary of assorted L3 proto => proto number
+            # e.g. "icmp" => 1, otherwise proto should be a protocol number
+            if proto in PROTO:
+                protoNumber = PROTO[proto]
+            else:
+                try:
+                    protoNumber = int(proto)
+                except ValueError:
+                    raise RuntimeError("Unknown protocol {0}".format(proto))
+                # Protocol numbers have IP_HDRINCL cleared so the kernel
+                # builds the IP header, named protocols keep the default
+                # It's an IPv4 socket option, IPv6 raw sockets don't have it
+                self._clearHeaderInclude = family == socket.AF_INET
+            self._socketArgs = (family, socket.SOCK_RAW, protoNumber)
+
+        # Specifying source port or address is only supported for tcp and udp currently
+        self._bindAddress = None
+        if proto == "tcp" or proto == "udp" or proto == "tls":
+            sourceIP = self.fuzzerData.sourceIP
+            if sourceIP == "":
+                sourceIP = "0.0.0.0"
+            if self.fuzzerData.sourcePort != -1:
+                self._bindAddress = (sourceIP, self.fuzzerData.sourcePort)
+            elif sourceIP != "0.0.0.0":
+                # No port was specified, so 0 should auto-select
+                self._bindAddress = (sourceIP, 0)
+
+    # Where to bind the next connection, if anywhere
+    def _nextBindAddress(self):
+        if self.sourceAddressPool is not None:
+            # Rotate through the pool, keeping sourceIP if the pool has
+            # nothing matching the target's address family
+            poolAddress = self.sourceAddressPool.nextAddress(self.family)
+            if poolAddress:
+                port = self.fuzzerData.sourcePort if self.fuzzerData.sourcePort != -1 else 0
+                return (poolAddress, port)
+        return self._bindAddress
+
+    # Create, bind and (for stream protocols) connect a socket to the target
+    # Returns (connection, addr) where addr is used for sendto()
+    def createConnection(self):
+        (family, addr) = self.resolve()
+        proto = self.fuzzerData.proto
+
+        if self.pacer:
+            self.pacer.waitForConnection()
+
+        try:
+            connection = socket.socket(*self._socketArgs)
+        except socket.error as e:
+            if self._socketArgs[1] != socket.SOCK_RAW:
+                raise
+            print e
+            print "Unable to create raw socket, please verify that you have sudo access"
+            sys.exit(0)
+
+        if self._clearHeaderInclude:
+            connection.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 0)
+
+        if proto == "tcp" or proto == "udp" or proto == "tls":
+            bindAddress = self._nextBindAddress()
+            if bindAddress is not None:
+                connection.bind(bindAddress)
+
+        if proto == "tcp" or proto == "tls":
+            # Now that we've had a chance to bind as necessary, connect
+            self._connect(connection, addr)
+            if proto == "tls":
+                connection = self._wrapTLS(connection)
+
+        return (connection, addr)
+
+    # Build the one SSLContext used for the whole session
+    def _createTLSContext(self):
+        try:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        except AttributeError:
+            # Legacy Python without SSLContext, fall back to ssl.wrap_socket()
+            print "WARNING: This Python has no ssl.SSLContext, TLS settings are unavailable"
+            return None
+
+        # Targets being fuzzed rarely have certificates we could verify
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        if self.fuzzerData.tlsCiphers:
+            context.set_ciphers(self.fuzzerData.tlsCiphers)
+        if self.fuzzerData.tlsAlpn:
+            context.set_alpn_protocols(self.fuzzerData.tlsAlpn.split(","))
+        if self.fuzzerData.tlsClientCert:
+            certPath = os.path.join(self.fuzzerFolder, self.fuzzerData.tlsClientCert)
+            keyPath = None
+            if self.fuzzerData.tlsClientKey:
+                keyPath = os.path.join(self.fuzzerFolder, self.fuzzerData.tlsClientKey)
+            context.load_cert_chain(certPath, keyPath)
+        # Only stops session tickets being offered, Python 2's ssl module
+        # can't resume sessions so every run does a full handshake anyway
+        if not self.fuzzerData.tlsSessionResumption:
+            context.options |= OP_NO_TICKET
+        return context
+
+    # Wrap a connected socket and perform the handshake, timing it in tlsStats
+    def _wrapTLS(self, connection):
+        if self._tlsContext is None:
+            return ssl.wrap_socket(connection)
+
+        wrapArgs = {"do_handshake_on_connect": False}
+        if self.family != socket.AF_UNIX and not _isIPAddress(self.host):
+            wrapArgs["server_hostname"] = self.host
+        connection = self._tlsContext.wrap_socket(connection, **wrapArgs)
+
+        startTime = time.time()
+        startCPU = _cpuTime()
+        connection.do_handshake()
+        self.tlsStats.addHandshake(time.time() - startTime, _cpuTime() - startCPU)
+        return connection
+
+    # Connect, giving up after fuzzerData.connectTimeout seconds if it's set
+    # A refused connection still raises socket.error(ECONNREFUSED) so the
+    # ExceptionProcessor can treat it the same as a blocking connect
+    def _connect(self, connection, addr):
+        connectTimeout = self.fuzzerData.connectTimeout
+        if connectTimeout < 0:
+            connection.connect(addr)
+            return
+
+        connection.setblocking(0)
+        result = connection.connect_ex(addr)
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            raise socket.error(result, os.strerror(result))
+        if result != 0:
+            (_, writable, _) = select.select([], [connection], [], connectTimeout)
+            if not writable:
+                connection.close()
+                raise socket.timeout("timed out")
+            result = connection.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if result != 0:
+                raise socket.error(result, os.strerror(result))
+        connection.setblocking(1)
+
+# Keeps TLS handshake cost separate from the rest of the run, summarized
+# after the first handshake and then every SUMMARY_INTERVAL handshakes
+# rather than on every connection
+class TLSHandshakeStats(object):
+    SUMMARY_INTERVAL = 100
+
+    def __init__(self):
+        self.handshakes = 0
+        self.totalTime = 0.0
+        self.totalCPU = 0.0
+
+    def addHandshake(self, elapsed, cpu):
+        self.handshakes += 1
+        self.totalTime += elapsed
+        self.totalCPU += cpu
+        if self.handshakes == 1 or self.handshakes % self.SUMMARY_INTERVAL == 0:
+            print "\tTLS handshakes: average %.2fms (%.2fms CPU) over %d handshakes" % (self.totalTime*1000/self.handshakes, self.totalCPU*1000/self.handshakes, self.handshakes)
+
+# User + system CPU time of this process
+def _cpuTime():
+    times = os.times()
+    return times[0] + times[1]
+
+def _isIPAddress(host):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except socket.error:
+            pass
+    return False
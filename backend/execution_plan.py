@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Compiled form of a .fuzzer conversation, so performRun only does
+# per-seed work for the messages that can actually change between runs
+#
+#------------------------------------------------------------------
+
+from backend.fuzzer_types import joinPieces
+
+class ExecutionPlan(object):
+    # Op types, the first element of every op tuple
+    # (Send, messageNumber, data)
+    #   Outbound message that is never fuzzed or altered, data is pre-joined,
+    #   or a list of pieces if the message has blob data
+    Send = 0
+    # (Mutate, messageNumber, message, fuzzedSubcomponentNumbers, fixups, substitutedSubcomponentNumbers)
+    #   Outbound message that is fuzzed, fixed up, has captured values
+    #   substituted or is passed through MessageProcessor callbacks, rebuilt
+    #   every run
+    Mutate = 1
+    # (Receive, messageNumber, expectedData, expectedLength, captures, receiveOptions)
+    #   receiveOptions is None unless the message has a "receive" line
+    Receive = 2
+    # (Pipeline, lastMessageNumber, data, expectedData, sends, receives)
+    #   Unfuzzed prefix of the conversation when pipelinePrefix is set, all
+    #   outbound data is sent at once and all responses are read at once
+    #   sends/receives - (messageNumber, data) for every message in it
+    Pipeline = 3
+
+    # messageProcessorHooks - MessageProcessorHooks from ProcDirector, to
+    #   know whether outbound messages get altered by callbacks
+    # capturedValues - CapturedValues for fuzzerData's captures
+    def __init__(self, fuzzerData, messageProcessorHooks, capturedValues):
+        self.fuzzerData = fuzzerData
+        self.messageProcessorHooks = messageProcessorHooks
+        self.capturedValues = capturedValues
+        # One op per message, each built the first time a run gets that far
+        # so messages past where runs stop are never loaded from the .fuzzer
+        self.ops = [None] * len(fuzzerData.messageCollection.messages)
+
+        # Whether any data going into the mutator changes from run to run,
+        # because captured values are substituted into it
+        self.fuzzesSubstitutedData = False
+        for op in self.getFuzzedOps():
+            if set(op[3]) & set(op[5]):
+                self.fuzzesSubstitutedData = True
+
+        # Where fuzzed runs end early, from fuzzerData.stopAfterFuzz
+        # fuzzPoint - number of the last fuzzed outbound message, if any
+        # stopAfter - message number to end fuzzed runs after, if any
+        # stopOnDivergence - end fuzzed runs at the first response after
+        #   fuzzPoint that differs from the recording
+        messages = fuzzerData.messageCollection.messages
+        fuzzedNums = [i for i in range(0, len(messages)) if messages[i].isFuzzed and messages[i].isOutbound()]
+        self.fuzzPoint = fuzzedNums[-1] if fuzzedNums else None
+        self.stopAfter = None
+        self.stopOnDivergence = False
+        if self.fuzzPoint is not None:
+            if fuzzerData.stopAfterFuzz == "response":
+                responseNums = [i for i in range(self.fuzzPoint + 1, len(messages)) if not messages[i].isOutbound()]
+                self.stopAfter = responseNums[0] if responseNums else None
+            elif fuzzerData.stopAfterFuzz == "diverge":
+                self.stopOnDivergence = True
+            elif fuzzerData.stopAfterFuzz:
+                self.stopAfter = self.fuzzPoint + int(fuzzerData.stopAfterFuzz)
+
+        # Pipeline op standing in for the ops at the start, if any
+        self.pipelineOp = None
+        if fuzzerData.pipelinePrefix and fuzzerData.proto in ("tcp", "tls") and not messageProcessorHooks.postReceiveProcess:
+            self.pipelineOp = self._buildPipelineOp()
+
+    # Iterate over every op in order, building them as needed
+    def __iter__(self):
+        start = 0
+        if self.pipelineOp is not None:
+            yield self.pipelineOp
+            start = self.pipelineOp[1] + 1
+        for i in xrange(start, len(self.ops)):
+            op = self.ops[i]
+            if op is None:
+                op = self._buildOp(i)
+            yield op
+
+    # Mutate ops for every fuzzed outbound message
+    def getFuzzedOps(self):
+        messages = self.fuzzerData.messageCollection.messages
+        return [self.ops[i] or self._buildOp(i) for i in range(0, len(messages)) if messages[i].isFuzzed and messages[i].isOutbound()]
+
+    # Pipeline op for the Send and Receive ops the conversation starts with,
+    # up to the first one that's altered, captures something or has receive
+    # options
+    # None if there's no point, IE nothing would be sent after a response
+    def _buildPipelineOp(self):
+        sends = []
+        receives = []
+        isSentAfterResponse = False
+        for i in range(0, len(self.ops)):
+            op = self.ops[i] or self._buildOp(i)
+            if op[0] == ExecutionPlan.Send:
+                sends.append((i, op[2]))
+                isSentAfterResponse = isSentAfterResponse or len(receives) > 0
+            elif op[0] == ExecutionPlan.Receive and not op[4] and op[5] is None:
+                receives.append((i, op[2]))
+            else:
+                break
+            lastMessageNumber = i
+        if not isSentAfterResponse:
+            return None
+
+        pieces = []
+        for (i, data) in sends:
+            if isinstance(data, list):
+                pieces.extend(data)
+            else:
+                pieces.append(data)
+        if not any(isinstance(piece, buffer) for piece in pieces):
+            pieces = bytes(joinPieces(pieces))
+        expectedData = bytearray().join(data for (i, data) in receives)
+        return (ExecutionPlan.Pipeline, lastMessageNumber, pieces, expectedData, sends, receives)
+
+    # Split the responses read for a Pipeline op up by their recorded lengths
+    # Returns (messageNumber, data) for every receive in it, short or empty
+    # at the end if less than expected was read
+    @staticmethod
+    def splitResponses(op, data):
+        responses = []
+        offset = 0
+        for (i, messageByteArray) in op[5]:
+            responses.append((i, data[offset:offset+len(messageByteArray)]))
+            offset += len(messageByteArray)
+        return responses
+
+    def _buildOp(self, i):
+        fuzzerData = self.fuzzerData
+        message = fuzzerData.messageCollection.messages[i]
+        if message.isOutbound():
+            # Blob data isn't searched for placeholders
+            substitutedSubcomponentNumbers = [j for j in range(0, len(message.subcomponents)) if not message.subcomponents[j].isBlob and self.capturedValues.hasPlaceholders(message.subcomponents[j].getOriginalByteArray())]
+            if message.isFuzzed or i in fuzzerData.fixups or substitutedSubcomponentNumbers or self.messageProcessorHooks.altersOutbound:
+                fuzzedSubcomponentNumbers = [j for j in range(0, len(message.subcomponents)) if message.subcomponents[j].isFuzzed]
+                op = (ExecutionPlan.Mutate, i, message, fuzzedSubcomponentNumbers, fuzzerData.fixups.get(i, []), substitutedSubcomponentNumbers)
+            elif message.hasBlobs():
+                op = (ExecutionPlan.Send, i, message.getAlteredPieces())
+            else:
+                op = (ExecutionPlan.Send, i, bytes(message.getOriginalMessage()))
+        else:
+            expectedData = message.getOriginalMessage()
+            op = (ExecutionPlan.Receive, i, expectedData, len(expectedData), fuzzerData.captures.get(i, []), fuzzerData.receiveOptions.get(i))
+        self.ops[i] = op
+        return op
+
+    def __len__(self):
+        return len(self.ops)
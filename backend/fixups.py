@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Declarative fixups for outbound messages (length fields, checksums,
+# counters), set with "fixup" lines after a message in the .fuzzer file:
+#
+#   fixup <type> <subcomponent>:<firstByte>-<lastByte> [<sources>] [big|little]
+#
+# e.g. "fixup length 0:2-3 1-2" writes the big-endian length of
+# subcomponents 1-2 into bytes 2-3 of subcomponent 0, and
+# "fixup crc32 3:0-3 1" writes the CRC32 of subcomponent 1 into sub 3
+#
+# "fixup counter 0:0-1" takes no sources and writes the field's original
+# value plus seed + 1, so the unfuzzed test run (seed -1) sends the recorded
+# value and every seed its own.  The value only depends on the seed, never
+# on how many runs came before, so -r and --dumpraw reproduce logged cases
+#
+#------------------------------------------------------------------
+
+import array
+import struct
+import zlib
+from backend.fuzzer_types import joinPieces
+
+class FixupRule(object):
+    # Rule types, and the field sizes they allow
+    Length = "length"
+    Crc32 = "crc32"
+    Adler32 = "adler32"
+    # RFC 1071 Internet checksum, always written in network order
+    Inet = "inet"
+    # Original value of the field plus seed + 1
+    Counter = "counter"
+    fieldSizes = {
+        Length: (1, 2, 4, 8),
+        Crc32: (4,),
+        Adler32: (4,),
+        Inet: (2,),
+        Counter: (1, 2, 4, 8),
+    }
+    packFormats = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+    def __init__(self, ruleStr):
+        self.ruleStr = ruleStr
+        args = ruleStr.split()
+        if len(args) < 2 or args[0] not in FixupRule.fieldSizes:
+            raise RuntimeError("Invalid fixup, expected '<{0}> <subcomponent>:<firstByte>-<lastByte> [<sources>] [big|little]': {1}".format("|".join(sorted(FixupRule.fieldSizes)), ruleStr))
+        self.type = args.pop(0)
+
+        try:
+            (subcomponent, byteRange) = args.pop(0).split(":")
+            self.subcomponent = int(subcomponent)
+            (self.start, self.end) = _parseRange(byteRange)
+        except ValueError:
+            raise RuntimeError("Invalid fixup field, expected <subcomponent>:<firstByte>-<lastByte>: {0}".format(ruleStr))
+        # Work with end as a slice index from here on
+        self.end += 1
+        size = self.end - self.start
+        if size not in FixupRule.fieldSizes[self.type]:
+            raise RuntimeError("Fixup {0} field must be {1} bytes: {2}".format(self.type, " or ".join(map(str, FixupRule.fieldSizes[self.type])), ruleStr))
+
+        self.endianness = "big"
+        if args and args[-1] in ("big", "little"):
+            self.endianness = args.pop()
+        self.packFormat = "{0}{1}".format(">" if self.endianness == "big" else "<", FixupRule.packFormats[size])
+        # Masks off anything too big for the field, e.g. huge fuzzed lengths
+        self.mask = (1 << (size * 8)) - 1
+
+        self.sources = None
+        if self.type == FixupRule.Counter:
+            # Read from the original data the first time it's needed
+            self.originalCount = None
+        else:
+            if len(args) != 1:
+                raise RuntimeError("Fixup {0} needs the subcomponents to compute it over: {1}".format(self.type, ruleStr))
+            try:
+                (first, last) = _parseRange(args.pop())
+            except ValueError:
+                raise RuntimeError("Invalid fixup sources, expected <subcomponent> or <first>-<last>: {0}".format(ruleStr))
+            self.sources = xrange(first, last + 1)
+        if args:
+            raise RuntimeError("Unexpected fixup arguments {0}: {1}".format(" ".join(args), ruleStr))
+
+    def __str__(self):
+        return self.ruleStr
+
+    # Make sure every subcomponent referenced exists in message
+    def validate(self, message):
+        highest = max([self.subcomponent] + list(self.sources or []))
+        if highest >= len(message.subcomponents):
+            raise RuntimeError("Fixup references subcomponent {0}, message only has {1}: {2}".format(highest, len(message.subcomponents), self.ruleStr))
+        if self.end > message.subcomponents[self.subcomponent].getOriginalLength():
+            raise RuntimeError("Fixup field is past the end of subcomponent {0}: {1}".format(self.subcomponent, self.ruleStr))
+
+    # Rewrite the field in message's altered data
+    # seed - the run's seed, -1 for a test run
+    def apply(self, message, seed):
+        subcomponent = message.subcomponents[self.subcomponent]
+        # Copy, so the original data is never written to
+        field = bytearray(subcomponent.getAlteredPiece())
+        if self.end > len(field):
+            # Fuzzing made the subcomponent too short to hold the field
+            return
+
+        if self.type == FixupRule.Counter:
+            if self.originalCount == None:
+                self.originalCount = struct.unpack(self.packFormat, subcomponent.getBuffer()[self.start:self.end])[0]
+            value = self.originalCount + seed + 1
+        else:
+            # Checksums covering their own field are computed with it zeroed
+            field[self.start:self.end] = bytearray(self.end - self.start)
+            subcomponent.setAlteredByteArray(field)
+            data = [message.subcomponents[j].getAlteredPiece() for j in self.sources]
+            value = self._compute(data)
+
+        if self.type == FixupRule.Inet:
+            # Computed in native order, so stored in native order it's network order
+            field[self.start:self.end] = struct.pack("=H", value)
+        else:
+            field[self.start:self.end] = struct.pack(self.packFormat, value & self.mask)
+        subcomponent.setAlteredByteArray(field)
+
+    def _compute(self, data):
+        if self.type == FixupRule.Length:
+            return sum(map(len, data))
+        if self.type == FixupRule.Crc32:
+            checksum = 0
+            for byteArray in data:
+                checksum = zlib.crc32(buffer(byteArray), checksum)
+            return checksum & 0xffffffff
+        if self.type == FixupRule.Adler32:
+            checksum = 1
+            for byteArray in data:
+                checksum = zlib.adler32(buffer(byteArray), checksum)
+            return checksum & 0xffffffff
+        # Inet - sum all 16-bit words at once in C, padding odd lengths
+        byteArray = joinPieces(data)
+        if len(byteArray) % 2:
+            byteArray.append(0)
+        total = sum(array.array("H", str(byteArray)))
+        while total >> 16:
+            total = (total & 0xffff) + (total >> 16)
+        return ~total & 0xffff
+
+# Applies rules in the order given to message, for the run with seed
+def applyFixups(fixups, message, seed):
+    for fixup in fixups:
+        fixup.apply(message, seed)
+
+# "X" or "X-Y" -> (X, Y)
+def _parseRange(rangeStr):
+    if "-" in rangeStr:
+        (first, last) = rangeStr.split("-")
+        return (int(first), int(last))
+    return (int(rangeStr), int(rangeStr))
@@ -35,23 +35,224 @@
 # the fuzzer, and utility functions used by them.
 #------------------------------------------------------------------
 
+import binascii
+import mmap
+
+# Original message data for a whole .fuzzer file, stored back-to-back in
+# one buffer rather than as one bytearray per subcomponent
+class MessageArena(object):
+    __slots__ = ("data",)
+
+    def __init__(self):
+        self.data = bytearray()
+
+    # Add data to the end of the arena, returns its offset
+    def append(self, byteArray):
+        offset = len(self.data)
+        self.data += byteArray
+        return offset
+
+# External binary file referenced by "blob" subcomponents, mapped into
+# memory the first time its data is needed
+# The mapping is shared with the file, so a blob must not be modified (and
+# especially not truncated, which gets SIGBUS) while Mutiny is running
+class MessageBlob(object):
+    __slots__ = ("path", "fullPath", "_mmap")
+
+    # path - as written in the .fuzzer file
+    # fullPath - path resolved relative to the .fuzzer file
+    # data - contents already read into a string, used instead of mapping the file
+    def __init__(self, path, fullPath, data=None):
+        self.path = path
+        self.fullPath = fullPath
+        self._mmap = data
+
+    # Read-only buffer over length bytes of the file at offset, without copying
+    def getBuffer(self, offset, length):
+        if self._mmap is None:
+            try:
+                with open(self.fullPath, "rb") as blobFile:
+                    self._mmap = mmap.mmap(blobFile.fileno(), 0, access=mmap.ACCESS_READ)
+            except (IOError, mmap.error, ValueError) as e:
+                raise RuntimeError("Unable to map blob {0}: {1}".format(self.fullPath, str(e)))
+        if offset + length > len(self._mmap):
+            raise RuntimeError("Blob {0} is only {1} bytes, can't read {2} bytes at offset {3}".format(self.path, len(self._mmap), length, offset))
+        return buffer(self._mmap, offset, length)
+
+# Join bytearrays and buffers (which bytearray.join() won't take)
+def joinPieces(pieces):
+    joined = bytearray()
+    for piece in pieces:
+        joined += piece
+    return joined
+
 class MessageSubComponent(object):
-    def __init__(self, message, isFuzzed):
-        self.message = message
-        self.isFuzzed = isFuzzed
+    # Bits in _flags
+    _FUZZED = 0x1
+    # Whether the original data is in a MessageBlob instead of an arena
+    isBlob = False
+
+    # Subcomponents are by far the most numerous object for big captures,
+    # so keep them to a fixed set of slots
+    __slots__ = ("_arena", "_offset", "_length", "_flags", "_altered")
+
+    def __init__(self, message, isFuzzed, arena=None):
+        # Original data lives in _arena at _offset, _length bytes long, and
+        # is only ever copied out for callers rather than kept alongside it
+        self._arena = arena if arena is not None else MessageArena()
+        self._offset = self._arena.append(message)
+        self._length = len(message)
+        self._flags = self._FUZZED if isFuzzed else 0
         # This includes both fuzzed messages and messages the user
         # has altered with messageprocessor callbacks
-        self._altered = message
-    
+        # None until something actually changes it
+        self._altered = None
+
+    # Subcomponent for data already in arena, without copying it
+    @classmethod
+    def fromArena(cls, arena, offset, length, isFuzzed):
+        subcomponent = cls.__new__(cls)
+        subcomponent._arena = arena
+        subcomponent._offset = offset
+        subcomponent._length = length
+        subcomponent._flags = cls._FUZZED if isFuzzed else 0
+        subcomponent._altered = None
+        return subcomponent
+
+    # (offset, length) of the original data in the arena
+    def getArenaSpan(self):
+        return (self._offset, self._length)
+
+    @property
+    def isFuzzed(self):
+        return bool(self._flags & self._FUZZED)
+
+    @isFuzzed.setter
+    def isFuzzed(self, isFuzzed):
+        if isFuzzed:
+            self._flags |= self._FUZZED
+        else:
+            self._flags &= ~self._FUZZED
+
+    # Copy of the original data from the .fuzzer file
+    @property
+    def message(self):
+        return self._arena.data[self._offset:self._offset+self._length]
+
+    @message.setter
+    def message(self, byteArray):
+        self._offset = self._arena.append(byteArray)
+        self._length = len(byteArray)
+
+    # Length of the original data, without pulling it out of the arena
+    def getOriginalLength(self):
+        return self._length
+
+    # Read-only buffer over the original data, without copying it
+    # Stays valid as the arena grows
+    def getBuffer(self):
+        return buffer(self._arena.data, self._offset, self._length)
+
+    # Copy of the original data, for one-off use like serializing
+    def peekOriginalByteArray(self):
+        return self.message
+
+    # Add data to the end of the original data
+    def extendOriginal(self, byteArray):
+        if self._offset + self._length == len(self._arena.data):
+            # Already at the end of the arena, can grow in place
+            self._arena.append(byteArray)
+        else:
+            # A copy, a buffer over the arena can't be appended to itself
+            self._offset = self._arena.append(self.message)
+            self._arena.append(byteArray)
+        self._length += len(byteArray)
+
+    # Copy original data into another arena, used when a Message joins
+    # a MessageCollection
+    def moveToArena(self, arena):
+        if arena is self._arena:
+            return
+        self._offset = arena.append(self.getBuffer())
+        self._arena = arena
+
+    # Data that matches the original isn't kept, so callbacks that hand
+    # back what they were given don't count as altering anything
     def setAlteredByteArray(self, byteArray):
-        self._altered = byteArray
+        if len(byteArray) == self._length and buffer(byteArray) == self.getBuffer():
+            self._altered = None
+        else:
+            self._altered = byteArray
     
     def getAlteredByteArray(self):
+        if self._altered is None:
+            return self.message
         return self._altered
     
     def getOriginalByteArray(self):
         return self.message
 
+    # Altered data as something that can be sent/hashed, a buffer over the
+    # original data when it's unaltered so it isn't copied
+    def getAlteredPiece(self):
+        if self._altered is None:
+            return self.getBuffer()
+        return self._altered
+
+    def resetAltered(self):
+        self._altered = None
+
+    # Whether fuzzing or a messageprocessor callback replaced the data
+    def isAltered(self):
+        return self._altered is not None
+
+# Subcomponent whose original data is a range of a MessageBlob
+# The data is only copied into memory when something asks for it as a
+# bytearray (fuzzing, callbacks) and isn't kept around afterwards
+class BlobSubComponent(MessageSubComponent):
+    isBlob = True
+    __slots__ = ("_blob",)
+
+    def __init__(self, blob, offset, length, isFuzzed):
+        self._blob = blob
+        self._arena = None
+        self._offset = offset
+        self._length = length
+        self._flags = self._FUZZED if isFuzzed else 0
+        self._altered = None
+
+    @property
+    def message(self):
+        return bytearray(self.getBuffer())
+
+    @message.setter
+    def message(self, byteArray):
+        raise RuntimeError("Blob subcomponents can't be changed")
+
+    def peekOriginalByteArray(self):
+        return self.message
+
+    def extendOriginal(self, byteArray):
+        raise RuntimeError("Can't add data to a blob subcomponent")
+
+    # Data stays in the blob
+    def moveToArena(self, arena):
+        pass
+
+    def getArenaSpan(self):
+        raise RuntimeError("Blob subcomponents aren't stored in an arena")
+
+    def getBuffer(self):
+        return self._blob.getBuffer(self._offset, self._length)
+
+    # (path, offset, length) of the original data
+    def getBlobSpan(self):
+        return (self._blob.path, self._offset, self._length)
+
+    # How the original data is written in a .fuzzer file
+    def getSerialized(self):
+        return "blob {0} {1} {2}".format(repr(self._blob.path), self._offset, self._length)
+
 # Contains all data of a given packet of the session            
 class Message(object):
     class Direction:
@@ -62,19 +263,66 @@ class Message(object):
         CommaSeparatedHex = 0 # 00,01,02,20,2a,30,31
         Ascii = 1 # asdf\x00\x01\x02
         Raw = 2 # a raw byte array from a pcap
+
+    # How message data is written in a .fuzzer file, the tag goes
+    # right before the quoted data, IE outbound fuzz hex '617364'
+    class Encoding:
+        Escaped = "escaped" # 'asdf\x00\x01\x02', no tag
+        Hex = "hex" # hex '61736466000102'
+        Base64 = "base64" # base64 'YXNkZgABAg=='
+        Tags = ("hex", "base64")
         
-    def __init__(self):
+    # Big captures have tens of thousands of messages, so no per-message dict
+    __slots__ = ("_arena", "direction", "isFuzzed", "encoding", "_subcomponents", "_pending")
+
+    # arena - MessageArena to store original data in, normally the arena
+    #   of the MessageCollection this message will be added to
+    def __init__(self, arena=None):
+        self._arena = arena if arena is not None else MessageArena()
         self.direction = -1
         # Whether any subcomponent is fuzzed - might not be entire message
         # Default to False, set to True as message subcomponents are set below
         self.isFuzzed = False 
+        # Encoding.Escaped, Hex or Base64, used when writing the message out
+        self.encoding = self.Encoding.Escaped
         # This will be populated with message subcomponents
         # IE, specified as message 0 11,22,33
         # 44,55,66
         # Then 11,22,33 will be subcomponent 0, 44,55,66 will be subcomponent 1
         # If it's a traditional message, it will only have one element (entire message)
-        self.subcomponents = []
+        self._subcomponents = []
+        # (loader, entries) until subcomponents are first used, see setLoader()
+        self._pending = None
+
+    @property
+    def subcomponents(self):
+        if self._pending is not None:
+            (loader, entries) = self._pending
+            self._pending = None
+            loader(self, entries)
+        return self._subcomponents
 
+    @subcomponents.setter
+    def subcomponents(self, subcomponents):
+        self._pending = None
+        self._subcomponents = subcomponents
+
+    # Fill in subcomponents by calling loader(message, entries) the first time
+    # they're used, so messages that are never used are never decoded
+    # direction and isFuzzed should be set as usual
+    def setLoader(self, loader, entries):
+        self._subcomponents = []
+        self._pending = (loader, entries)
+
+    def isLoaded(self):
+        return self._pending is None
+
+    # Entries passed to setLoader(), or None once loaded
+    def getPendingEntries(self):
+        return self._pending[1] if self._pending is not None else None
+
+    # Original data is copied out of the arena on every call, so only ask
+    # for it when it's needed
     def getOriginalSubcomponents(self):
         return map(lambda subcomponent: subcomponent.message, self.subcomponents)
     
@@ -85,17 +333,46 @@ class Message(object):
         return map(lambda subcomponent: subcomponent.getAlteredByteArray(), self.subcomponents)
     
     def getOriginalMessage(self):
-        return bytearray().join(map(lambda subcomponent: subcomponent.message, self.subcomponents))
+        return joinPieces([subcomponent.getBuffer() for subcomponent in self.subcomponents])
+
+    # Length of the original message, without pulling it out of the arena
+    def getOriginalLength(self):
+        return sum(map(lambda subcomponent: subcomponent.getOriginalLength(), self.subcomponents))
+
+    # Move original data into another arena
+    def moveToArena(self, arena):
+        if arena is self._arena:
+            return
+        for subcomponent in self.subcomponents:
+            subcomponent.moveToArena(arena)
+        self._arena = arena
     
     # May or may not have actually been changed
     # Version of message that includes fuzzing and messageprocessor changes from user
     # Is transient and reverted to original every iteration
     def getAlteredMessage(self):
-        return bytearray().join(map(lambda subcomponent: subcomponent.getAlteredByteArray(), self.subcomponents))
+        return joinPieces(self.getAlteredPieces())
+    
+    # Like getAlteredMessage(), but as a list with one piece per subcomponent,
+    # where unaltered data is a buffer over the arena or mapped file
+    def getAlteredPieces(self):
+        return [subcomponent.getAlteredPiece() for subcomponent in self.subcomponents]
+
+    def hasBlobs(self):
+        return any(subcomponent.isBlob for subcomponent in self.subcomponents)
     
     def resetAlteredMessage(self):
+        # Nothing can be altered before it's loaded
+        if self._pending is not None:
+            return
         for subcomponent in self.subcomponents:
-            subcomponent.setAlteredByteArray(subcomponent.message)
+            subcomponent.resetAltered()
+
+    # Add an already created subcomponent, such as a BlobSubComponent
+    def appendSubcomponent(self, subcomponent):
+        self.subcomponents.append(subcomponent)
+        if subcomponent.isFuzzed:
+            self.isFuzzed = True
     
     # Set the message on the Message
     # sourceType - Format.CommaSeparatedHex, Ascii, or Raw
@@ -112,7 +389,7 @@ class Message(object):
         else:
             raise RuntimeError("Invalid sourceType")
         
-        self.subcomponents = [MessageSubComponent(message, isFuzzed)]
+        self.subcomponents = [MessageSubComponent(message, isFuzzed, self._arena)]
         
         if isFuzzed:
             self.isFuzzed = True
@@ -132,9 +409,9 @@ class Message(object):
             raise RuntimeError("Invalid sourceType")
         
         if createNewSubcomponent:
-            self.subcomponents.append(MessageSubComponent(newMessage, isFuzzed))
+            self.subcomponents.append(MessageSubComponent(newMessage, isFuzzed, self._arena))
         else:
-            self.subcomponents[-1].message += newMessage
+            self.subcomponents[-1].extendOriginal(newMessage)
 
         if isFuzzed:
             # Make sure message is set to fuzz as well
@@ -155,15 +432,73 @@ class Message(object):
     def deserializeByteArray(cls, string):
         # This appears to properly reverse repr() without the risks of eval
         return bytearray(string[1:-1].decode('string_escape'))
+
+    # Like serializeByteArray(), but in any Encoding, tag included
+    @classmethod
+    def encodeByteArray(cls, byteArray, encoding):
+        if encoding == cls.Encoding.Hex:
+            return "hex '{0}'".format(binascii.hexlify(byteArray))
+        elif encoding == cls.Encoding.Base64:
+            return "base64 '{0}'".format(binascii.b2a_base64(byteArray)[:-1])
+        return cls.serializeByteArray(byteArray)
+
+    # Decode the data between the quotes of a message line in one go
+    # string - data without quotes or tag
+    @classmethod
+    def decodeByteArray(cls, string, encoding):
+        return bytearray(cls._decodeString(string, encoding))
+
+    # Raise if decodeByteArray() would, without keeping the decoded data
+    @classmethod
+    def validateEncoded(cls, string, encoding):
+        cls._decodeString(string, encoding)
+
+    @classmethod
+    def _decodeString(cls, string, encoding):
+        try:
+            if encoding == cls.Encoding.Hex:
+                return binascii.unhexlify(string)
+            elif encoding == cls.Encoding.Base64:
+                return binascii.a2b_base64(string)
+        except (TypeError, binascii.Error) as e:
+            raise RuntimeError("Invalid {0} message data: {1}".format(encoding, e))
+        return string.decode('string_escape')
+
+    # Encoding tag in a message line's args, if any
+    @classmethod
+    def getEncodingFromArgs(cls, args):
+        for arg in args:
+            if arg in cls.Encoding.Tags:
+                return arg
+        return cls.Encoding.Escaped
     
-    def getAlteredSerialized(self):
+    # Unaltered blob data is written as the blob reference rather than the data
+    def _serializeSubcomponent(self, subcomponent, altered=False):
+        if subcomponent.isBlob and not (altered and subcomponent.isAltered()):
+            return subcomponent.getSerialized()
+        if altered:
+            return self.encodeByteArray(subcomponent.getAlteredByteArray(), self.encoding)
+        return self.encodeByteArray(subcomponent.peekOriginalByteArray(), self.encoding)
+
+    # alteredByteArrays - subcomponent number -> altered data, to serialize
+    # saved altered state instead of what the subcomponents hold right now
+    def getAlteredSerialized(self, alteredByteArrays=None):
         if len(self.subcomponents) < 1:
             return "{0} {1}\n".format(self.direction, "ERROR: No data in message.")
         else:
-            serializedMessage = "{0}{1} {2}\n".format("fuzz " if self.subcomponents[0].isFuzzed else "", self.direction, self.serializeByteArray(self.subcomponents[0].getAlteredByteArray()))
+            serializedSubcomponents = []
+            for j in range(0, len(self.subcomponents)):
+                if alteredByteArrays is None:
+                    serializedSubcomponents.append(self._serializeSubcomponent(self.subcomponents[j], altered=True))
+                elif j in alteredByteArrays:
+                    serializedSubcomponents.append(self.encodeByteArray(alteredByteArrays[j], self.encoding))
+                else:
+                    serializedSubcomponents.append(self._serializeSubcomponent(self.subcomponents[j]))
+
+            serializedMessage = "{0}{1} {2}\n".format("fuzz " if self.subcomponents[0].isFuzzed else "", self.direction, serializedSubcomponents[0])
             
-            for subcomponent in self.subcomponents[1:]:
-                serializedMessage += "sub {0}{1}\n".format("fuzz " if subcomponent.isFuzzed else "", self.serializeByteArray(subcomponent.getAlteredByteArray()))
+            for j in range(1, len(self.subcomponents)):
+                serializedMessage += "sub {0}{1}\n".format("fuzz " if self.subcomponents[j].isFuzzed else "", serializedSubcomponents[j])
             
             return serializedMessage
     
@@ -171,10 +506,10 @@ class Message(object):
         if len(self.subcomponents) < 1:
             return "{0} {1}\n".format(self.direction, "ERROR: No data in message.")
         else:
-            serializedMessage = "{0} {1}{2}\n".format(self.direction, "fuzz " if self.subcomponents[0].isFuzzed else "", self.serializeByteArray(self.subcomponents[0].message))
+            serializedMessage = "{0} {1}{2}\n".format(self.direction, "fuzz " if self.subcomponents[0].isFuzzed else "", self._serializeSubcomponent(self.subcomponents[0]))
             
             for subcomponent in self.subcomponents[1:]:
-                serializedMessage += "sub {0}{1}\n".format("fuzz " if subcomponent.isFuzzed else "", self.serializeByteArray(subcomponent.message))
+                serializedMessage += "sub {0}{1}\n".format("fuzz " if subcomponent.isFuzzed else "", self._serializeSubcomponent(subcomponent))
             
             return serializedMessage
 
@@ -236,10 +571,13 @@ class Message(object):
                 raise RuntimeError("Invalid message data")
         
         self.direction = direction
-        self.setMessageFrom(self.Format.Ascii, messageData, isFuzzed)
+        self.encoding = self.getEncodingFromArgs(args)
+        self.setMessageFrom(self.Format.Raw, self.decodeByteArray(messageData[1:-1], self.encoding), isFuzzed)
     
     # Add another line, used for multiline messages
-    def appendFromSerialized(self, serializedData, createNewSubcomponent=True):
+    # encoding - Encoding of the data, for lines without a "sub" and tag,
+    #   defaults to the message's encoding
+    def appendFromSerialized(self, serializedData, createNewSubcomponent=True, encoding=None):
         serializedData = serializedData.replace("\n", "")
         (serializedData, messageData) = self._extractMessageComponents(serializedData)
         
@@ -258,16 +596,49 @@ class Message(object):
         isFuzzed = False
         if "fuzz" in args:
             isFuzzed = True
+        if createNewSubcomponent:
+            encoding = self.getEncodingFromArgs(args)
+        elif encoding is None:
+            encoding = self.encoding
         
-        self.appendMessageFrom(self.Format.Ascii, messageData, isFuzzed, createNewSubcomponent=createNewSubcomponent)
+        self.appendMessageFrom(self.Format.Raw, self.decodeByteArray(messageData[1:-1], encoding), isFuzzed, createNewSubcomponent=createNewSubcomponent)
 
 class MessageCollection(object):
     def __init__(self):
         self.messages = []
+        # Original data of every message in the collection
+        self.arena = MessageArena()
+        # Files referenced by blob subcomponents, path -> MessageBlob
+        self.blobs = {}
     
     def addMessage(self, message):
+        message.moveToArena(self.arena)
         self.messages.append(message)
-    
+
+    # Get the MessageBlob for path, so each file is only mapped once
+    # fullPath - path resolved relative to the .fuzzer file
+    def getBlob(self, path, fullPath):
+        if path not in self.blobs:
+            self.blobs[path] = MessageBlob(path, fullPath)
+        return self.blobs[path]
+
+    # Get the fuzzed/messageprocessor-altered data of the current run as a
+    # list of (message number, subcomponent number, altered data), covering
+    # only the subcomponents that differ from the .fuzzer file
+    # The altered data isn't copied - each run replaces altered data with
+    # new buffers rather than changing them in place, so holding references
+    # keeps an earlier run's data intact for Logger.writeLog()
+    def getAlteredState(self):
+        alteredState = []
+        for i in range(0, len(self.messages)):
+            if not self.messages[i].isLoaded():
+                continue
+            subcomponents = self.messages[i].subcomponents
+            for j in range(0, len(subcomponents)):
+                if subcomponents[j].isAltered():
+                    alteredState.append((i, j, subcomponents[j].getAlteredByteArray()))
+        return alteredState
+
     def doClientMessagesMatch(self, otherMessageCollection):
         for i in range(0, len(self.messages)):
             # Skip server messages
@@ -285,12 +656,37 @@ class MessageCollection(object):
 
 import os
 import os.path
-from copy import deepcopy
+import time
+from backend.campaign_log import CampaignLogWriter
+from backend.log_writer import AsyncLogWriter
+
+# One run kept by Logger for logging later
+class LoggedRun(object):
+    __slots__ = ["seed", "alteredState", "receivedMessageData", "highestMessageNumber", "startTime", "endTime"]
+
+    def __init__(self):
+        # None until the slot is first used
+        self.seed = None
+        # From MessageCollection.getAlteredState() once the run is over
+        self.alteredState = []
+        self.receivedMessageData = {}
+        self.highestMessageNumber = -1
+        self.startTime = 0
+        self.endTime = 0
 
 # Handles all the logging of the fuzzing session
 # Log messages can be found at sample_apps/<app>/<app>_logs/<date>/
+# useCampaignLog - append runs to a binary campaign log in the same folder
+# instead of a text file per run, see backend/campaign_log.py
+# queueSize - if above 0, write logs on a background thread with a queue of
+# this many runs, see backend/log_writer.py
+# queuePolicy - AsyncLogWriter.Policy for when that queue is full
+# historySize - how many finished runs outputLastLog() can log, for crashes
+# that are only noticed a few runs late
 class Logger(object):
-    def __init__(self, folderPath):
+    def __init__(self, folderPath, useCampaignLog=False, queueSize=0, queuePolicy=AsyncLogWriter.Policy.Block, historySize=1):
+        if historySize < 1:
+            raise RuntimeError("Logger needs to keep at least 1 previous run, got %d" % (historySize))
         self._folderPath = folderPath
         if os.path.exists(folderPath):
             print "Data output directory already exists: %s" % (folderPath)
@@ -302,65 +698,139 @@ class Logger(object):
                 print "Unable to create logging directory: %s" % (folderPath)
                 exit()
 
-        self.resetForNewRun()
+        self._campaignLog = CampaignLogWriter(folderPath) if useCampaignLog else None
+        self._asyncWriter = None
+        if queueSize > 0:
+            self._asyncWriter = AsyncLogWriter(queueSize, queuePolicy, self._writeRecord, self._flushRecords)
+        self._isCollectionLoaded = False
+
+        # Ring of the current run and the historySize runs before it, the
+        # slots are reused so nothing is copied from run to run
+        self.historySize = historySize
+        self._runs = [LoggedRun() for _ in range(historySize + 1)]
+        self._currentIndex = 0
+        self._run = self._runs[0]
+        self._run.startTime = time.time()
 
     # Store just the data, forget trying to make a Message object
     # With the subcomponents and everything, it just gets weird, 
     # and we don't need it
     def setReceivedMessageData(self, messageNumber, data):
-        self.receivedMessageData[messageNumber] = data
+        self._run.receivedMessageData[messageNumber] = data
 
     def setHighestMessageNumber(self, messageNumber):
         # The highest message # this fuzz session made it to
-        self._highestMessageNumber = messageNumber
+        self._run.highestMessageNumber = messageNumber
 
+    # Log the previous run as runNumber, then any older runs kept (see
+    # historySize) under the seeds they were run with
     def outputLastLog(self, runNumber, messageCollection, errorMessage):
-        return self._outputLog(runNumber, messageCollection, errorMessage, self._lastReceivedMessageData, self._lastHighestMessageNumber)
+        for k in range(1, len(self._runs)):
+            run = self._runs[(self._currentIndex - k) % len(self._runs)]
+            if k > 1:
+                # Unused slots and the unfuzzed test run aren't worth logging
+                if run.seed is None or run.seed == -1:
+                    break
+                runNumber = run.seed
+            self._outputLog(runNumber, messageCollection, errorMessage, run.alteredState, run.receivedMessageData, run.highestMessageNumber, run.startTime, run.endTime)
 
-    def outputLog(self, runNumber, messageCollection, errorMessage):
-        return self._outputLog(runNumber, messageCollection, errorMessage, self.receivedMessageData, self._highestMessageNumber)
+    # isDroppable - the log can be thrown away if the log queue is full and
+    # its policy is to drop, for LogAll runs rather than crashes
+    def outputLog(self, runNumber, messageCollection, errorMessage, isDroppable=False):
+        run = self._run
+        return self._outputLog(runNumber, messageCollection, errorMessage, messageCollection.getAlteredState(), run.receivedMessageData, run.highestMessageNumber, run.startTime, time.time(), isDroppable)
 
-    def _outputLog(self, runNumber, messageCollection, errorMessage, receivedMessageData, highestMessageNumber):
-        with open(os.path.join(self._folderPath, str(runNumber)), "w") as outputFile:
-            print "Logging run number %d" % (runNumber)
-            outputFile.write("Log from run with seed %d\n" % (runNumber))
-            outputFile.write("Error message: %s\n" % (errorMessage))
+    def _outputLog(self, runNumber, messageCollection, errorMessage, alteredState, receivedMessageData, highestMessageNumber, startTime, endTime, isDroppable=False):
+        print "Logging run number %d" % (runNumber)
+        # Altered data is replaced rather than changed in place on the next
+        # run, and receivedMessageData is a fresh dict per run, so references
+        # are enough for the record to stay as it is
+        record = (runNumber, messageCollection, errorMessage, alteredState, receivedMessageData, highestMessageNumber, startTime, endTime)
+        if self._asyncWriter:
+            if not self._isCollectionLoaded:
+                # Load every message now, so the worker thread never does
+                for message in messageCollection.messages:
+                    message.subcomponents
+                self._isCollectionLoaded = True
+            self._asyncWriter.put(record, isDroppable)
+        else:
+            self._writeRecord(record)
+            self._flushRecords()
 
-            if highestMessageNumber == -1 or runNumber == 0:
-                outputFile.write("Failed to connect on this run.\n")
+    def _writeRecord(self, record):
+        (runNumber, messageCollection, errorMessage, alteredState, receivedMessageData, highestMessageNumber, startTime, endTime) = record
+        if self._campaignLog:
+            self._campaignLog.append(runNumber, startTime, endTime, highestMessageNumber, errorMessage, alteredState, receivedMessageData)
+        else:
+            with open(os.path.join(self._folderPath, str(runNumber)), "w") as outputFile:
+                Logger.writeLog(outputFile, runNumber, messageCollection, errorMessage, receivedMessageData, highestMessageNumber, alteredState)
+
+    def _flushRecords(self):
+        if self._campaignLog:
+            self._campaignLog.flush()
+
+    # Wait for queued logs to be written, call before halting
+    def flush(self):
+        if self._asyncWriter:
+            self._asyncWriter.flush()
+            if self._asyncWriter.droppedCount:
+                print "Dropped %d LogAll logs because the log queue was full" % (self._asyncWriter.droppedCount)
+                self._asyncWriter.droppedCount = 0
+
+    # Write the text log for a run
+    # alteredState - the run's altered data, from MessageCollection.getAlteredState()
+    # Also used to render campaign log records, see util/campaign_log.py
+    @staticmethod
+    def writeLog(outputFile, runNumber, messageCollection, errorMessage, receivedMessageData, highestMessageNumber, alteredState):
+        alteredByteArrays = {}
+        for (messageNumber, subcomponentNumber, altered) in alteredState:
+            alteredByteArrays.setdefault(messageNumber, {})[subcomponentNumber] = altered
+
+        outputFile.write("Log from run with seed %d\n" % (runNumber))
+        outputFile.write("Error message: %s\n" % (errorMessage))
+
+        if highestMessageNumber == -1 or runNumber == 0:
+            outputFile.write("Failed to connect on this run.\n")
+
+        outputFile.write("\n")
+
+        i = 0
+        for message in messageCollection.messages:
+            outputFile.write("Packet %d: %s" % (i, message.getSerialized()))
+
+            if message.isFuzzed:
+                outputFile.write("Fuzzed Packet %d: %s\n" % (i, message.getAlteredSerialized(alteredByteArrays.get(i, {}))))
+            
+            if receivedMessageData.has_key(i):
+                # Compare what was actually sent to what we expected, log if they differ
+                if receivedMessageData[i] != message.getOriginalMessage():
+                    outputFile.write("Actual data received for packet %d: %s" % (i, Message.serializeByteArray(receivedMessageData[i])))
+                else:
+                    outputFile.write("Received expected data\n")
+
+            if highestMessageNumber == i:
+                if message.isOutbound():
+                    outputFile.write("This is the last message sent\n")
+                else:
+                    outputFile.write("This is the last message received\n")
 
             outputFile.write("\n")
+            i += 1
 
-            i = 0
-            for message in messageCollection.messages:
-                outputFile.write("Packet %d: %s" % (i, message.getSerialized()))
-
-                if message.isFuzzed:
-                    outputFile.write("Fuzzed Packet %d: %s\n" % (i, message.getAlteredSerialized()))
-                
-                if receivedMessageData.has_key(i):
-                    # Compare what was actually sent to what we expected, log if they differ
-                    if receivedMessageData[i] != message.getOriginalMessage():
-                        outputFile.write("Actual data received for packet %d: %s" % (i, Message.serializeByteArray(receivedMessageData[i])))
-                    else:
-                        outputFile.write("Received expected data\n")
-
-                if highestMessageNumber == i:
-                    if message.isOutbound():
-                        outputFile.write("This is the last message sent\n")
-                    else:
-                        outputFile.write("This is the last message received\n")
-
-                outputFile.write("\n")
-                i += 1
-
-    def resetForNewRun(self):
-        try:
-            self._lastReceivedMessageData = deepcopy(self.receivedMessageData)
-            self._lastHighestMessageNumber = self._highestMessageNumber
-        except AttributeError:
-            self._lastReceivedMessageData = {}
-            self._lastHighestMessageNumber = -1
+    # seed - what the new run is fuzzed with, -1 for a test run
+    # messageCollection - still holding the altered data of the run that just
+    # ended, which is kept for outputLastLog()
+    def resetForNewRun(self, seed, messageCollection):
+        now = time.time()
+        self._run.endTime = now
+        self._run.alteredState = messageCollection.getAlteredState()
 
-        self.receivedMessageData = {}
-        self.setHighestMessageNumber(-1)
+        self._currentIndex = (self._currentIndex + 1) % len(self._runs)
+        self._run = self._runs[self._currentIndex]
+        self._run.seed = seed
+        self._run.alteredState = []
+        # A fresh dict rather than clear(), queued logs may still be using
+        # the old one
+        self._run.receivedMessageData = {}
+        self._run.highestMessageNumber = -1
+        self._run.startTime = now
@@ -35,11 +35,39 @@
 #
 #------------------------------------------------------------------
 
-from backend.fuzzer_types import MessageCollection, Message
+from backend.fuzzer_types import MessageCollection, Message, MessageSubComponent, BlobSubComponent, MessageBlob
 from backend.menu_functions import validateNumberRange
+from backend.fixups import FixupRule
+from backend.captures import CaptureRule
+from backend.receive_options import ReceiveOptions
+from cStringIO import StringIO
+import hashlib
+import marshal
+import os
 import os.path
+import re
 import sys
 
+# Matches "inbound/outbound/sub [args] 'data'" lines in the form writeToFD()
+# produces, groups are (command, args, quote, data), args include any
+# encoding tag (see Message.Encoding)
+# Anything else goes through Message.setFromSerialized() etc instead
+_messageLineRegex = re.compile(r"""^(inbound|outbound|sub)((?: [^ '"]+)*) (['"])(.*)\3$""")
+# Matches "inbound/outbound/sub [args] blob 'path' offset length" lines,
+# groups are (command, args, quote, path, offset, length)
+_blobLineRegex = re.compile(r"""^(inbound|outbound|sub)((?: [^ '"]+)*) blob (['"])(.*)\3 ([0-9]+) ([0-9]+)$""")
+# Matches message data continuation lines, group is the data
+_continuationLineRegex = re.compile(r"^\s*'(.*)'$")
+
+# Validates the stopAfterFuzz setting
+def _stopAfterFuzzPolicy(value):
+    if value in ("", "response", "diverge") or value.isdigit():
+        return value
+    raise RuntimeError("stopAfterFuzz must be response, diverge or a number of messages")
+
+# Bump whenever what's stored in .fuzzer cache files changes
+CACHE_VERSION = 5
+
 class FuzzerData(object):
     # Init creates fuzzer data and populates with defaults
     # readFromFile to load a .fuzzer file
@@ -61,39 +89,231 @@ class FuzzerData(object):
         self.sourcePort = -1
         # Source IP to use, 0.0.0.0 or "" is default/automatic
         self.sourceIP = "0.0.0.0"
+        # Pool of source IPs (comma-separated addresses and/or CIDR blocks) to
+        # rotate through instead of sourceIP, "" = disabled
+        self.sourceIPPool = ""
+        # When to move to the next address in sourceIPPool, "connection" or "worker"
+        self.sourceIPPoolMode = "connection"
+        # How long to wait for connect() to complete (seconds), -1 = block
+        self.connectTimeout = -1.0
+        # How long to cache the resolved target address (seconds)
+        self.resolveTTL = 60.0
+        # TLS options for proto tls, "" = library defaults
+        # OpenSSL cipher list string
+        self.tlsCiphers = ""
+        # Comma-separated ALPN protocols to offer
+        self.tlsAlpn = ""
+        # Client certificate/key files, relative to the .fuzzer file
+        self.tlsClientCert = ""
+        self.tlsClientKey = ""
+        # Whether to offer TLS session tickets, 0 sets OP_NO_TICKET
+        # Sessions are never resumed, Python 2's ssl module can't
+        self.tlsSessionResumption = True
         # Whether to perform a test run
         self.shouldPerformTestRun = True
+        # When fuzzed runs end after the last fuzzed message, "" to play the
+        # whole conversation, "response" after the response to it, a number
+        # of messages after it, or "diverge" as soon as a response after it
+        # differs from the recording
+        self.stopAfterFuzz = ""
+        # Whether the target can take the unfuzzed start of the conversation
+        # all at once, rather than waiting for each response before sending
+        self.pipelinePrefix = False
         # How long to time out on receive() (seconds)
         self.receiveTimeout = 1.0
         # Dictionary to save comments made to a .fuzzer file.  Only really does anything if 
         # using readFromFile and then writeToFile in the same program
         # (For example, fuzzerconverter)
         self.comments = {}
-        # Kind of kludgy string for use in readFromFD, made global to not have to pass around
+        # Kind of kludgy list of comment lines for use in readFromFD, made global to not have to pass around
         # Details in readFromFD()
-        self._readComments = ""
+        self._readComments = []
+        # Message.Encoding of the last message data line in readFromFD(),
+        # continuation lines are decoded the same way
+        self._dataEncoding = Message.Encoding.Escaped
         # Update for compatibilty with new Decept
         self.messagesToFuzz = [] 
+        # Folder blob paths are relative to, set by readFromFile()
+        self._fuzzerFolder = ""
+        # MessageBlob holding a private copy of the .fuzzer file readFromFile()
+        # read, message data is decoded from it when first used rather than
+        # while reading
+        # None to decode everything while reading
+        self._source = None
+        # Fixup rules for outbound messages, message number -> list of FixupRule
+        self.fixups = {}
+        # Capture rules for inbound messages, message number -> list of CaptureRule
+        self.captures = {}
+        # Receive options for inbound messages, message number -> ReceiveOptions
+        self.receiveOptions = {}
     
     
     # Read in the FuzzerData from the specified .fuzzer file
-    def readFromFile(self, filePath, quiet=False):
-        with open(filePath, 'r') as inputFile:
-            self.readFromFD(inputFile, quiet=quiet)
+    # useCache - keep a parsed copy in <filePath>.cache, and load that
+    #   instead of parsing again while the .fuzzer is unchanged
+    # lazy - only check each message line is valid while reading, and decode
+    #   it the first time it's used - the file is read into memory first, so
+    #   it can be edited while Mutiny runs
+    def readFromFile(self, filePath, quiet=False, useCache=True, lazy=True):
+        cachePath = "{0}.cache".format(filePath)
+        self._fuzzerFolder = os.path.dirname(os.path.abspath(filePath))
+        if useCache:
+            fileStat = os.stat(filePath)
+        # Binary, so offsets into the file line up with the lines read
+        with open(filePath, 'rb') as inputFile:
+            contents = inputFile.read()
+        self._source = MessageBlob(filePath, os.path.abspath(filePath), contents)
+        if useCache:
+            # SHA1 too, so edits that keep the same mtime/size still
+            # invalidate the cache
+            cacheKey = [fileStat.st_mtime, fileStat.st_size, hashlib.sha1(contents).hexdigest()]
+        if not useCache or not self._readFromCache(cachePath, cacheKey, quiet):
+            self.readFromFD(StringIO(contents), quiet=quiet)
+            if useCache:
+                self._writeToCache(cachePath, cacheKey)
+
+        if not lazy:
+            self._loadAllMessages()
+
+    def _loadAllMessages(self):
+        for message in self.messageCollection.messages:
+            message.subcomponents
+
+    # Loader for Message.setLoader(), entries are tuples of
+    # ("line", offset, length, encoding, isFuzzed, isNewSubcomponent) - data in self._source
+    # ("arena", offset, length, isFuzzed) - data in the message arena
+    # ("blob", path, offset, length, isFuzzed)
+    def _loadEntries(self, message, entries):
+        arena = self.messageCollection.arena
+        for entry in entries:
+            if entry[0] == "line":
+                (kind, offset, length, encoding, isFuzzed, isNewSubcomponent) = entry
+                try:
+                    data = Message.decodeByteArray(str(self._source.getBuffer(offset, length)), encoding)
+                except (RuntimeError, ValueError) as e:
+                    raise RuntimeError("Invalid message data at byte {0} of {1}: {2}".format(offset, self._source.path, e))
+                message.appendMessageFrom(Message.Format.Raw, data, isFuzzed, createNewSubcomponent=isNewSubcomponent)
+            elif entry[0] == "arena":
+                message.appendSubcomponent(MessageSubComponent.fromArena(arena, entry[1], entry[2], entry[3]))
+            else:
+                message.appendSubcomponent(BlobSubComponent(self._getBlob(entry[1]), entry[2], entry[3], entry[4]))
+
+    # Load everything readFromFD() would from the cache if it matches
+    # cacheKey, [mtime, size, sha1]
+    # Returns whether the cache was used
+    def _readFromCache(self, cachePath, cacheKey, quiet):
+        try:
+            with open(cachePath, 'rb') as cacheFile:
+                cache = marshal.load(cacheFile)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return False
+        if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or cache.get("key") != cacheKey:
+            return False
+
+        for (attribute, value) in cache["settings"].iteritems():
+            setattr(self, attribute, value)
+        arena = self.messageCollection.arena
+        arena.data = bytearray(cache["arena"])
+        # Messages are only put back together when first used
+        for (direction, isFuzzed, encoding, entries) in cache["messages"]:
+            message = Message(arena)
+            message.direction = direction
+            message.isFuzzed = isFuzzed
+            message.encoding = encoding
+            message.setLoader(self._loadEntries, entries)
+            self.messageCollection.messages.append(message)
+        for (messageNum, rules) in cache["fixups"].iteritems():
+            self.fixups[messageNum] = [FixupRule(rule) for rule in rules]
+        for (messageNum, rules) in cache["captures"].iteritems():
+            self.captures[messageNum] = [CaptureRule(rule) for rule in rules]
+        for (messageNum, options) in cache["receiveOptions"].iteritems():
+            self.receiveOptions[messageNum] = ReceiveOptions(options)
+
+        if not quiet:
+            print "\tLoaded {0} messages from {1}".format(len(self.messageCollection.messages), cachePath)
+        return True
+
+    # _loadEntries() entries that would load message as it is now
+    def _getCachedEntries(self, message):
+        if not message.isLoaded():
+            return message.getPendingEntries()
+        entries = []
+        for subcomponent in message.subcomponents:
+            if subcomponent.isBlob:
+                entries.append(("blob", ) + subcomponent.getBlobSpan() + (subcomponent.isFuzzed, ))
+            else:
+                entries.append(("arena", ) + subcomponent.getArenaSpan() + (subcomponent.isFuzzed, ))
+        return entries
+
+    # MessageBlob for a blob path from the .fuzzer file
+    def _getBlob(self, path):
+        return self.messageCollection.getBlob(path, os.path.join(self._fuzzerFolder, path))
+
+    # Save everything readFromFD() read into the cache, best effort
+    def _writeToCache(self, cachePath, cacheKey):
+        cache = {
+            "version": CACHE_VERSION,
+            "key": cacheKey,
+            "settings": dict((attribute, value) for (attribute, value) in vars(self).iteritems() if attribute not in ("messageCollection", "fixups", "captures", "receiveOptions") and not attribute.startswith("_")),
+            "arena": str(self.messageCollection.arena.data),
+            "messages": [(message.direction, message.isFuzzed, message.encoding, self._getCachedEntries(message)) for message in self.messageCollection.messages],
+            "fixups": dict((messageNum, map(str, rules)) for (messageNum, rules) in self.fixups.iteritems()),
+            "captures": dict((messageNum, map(str, rules)) for (messageNum, rules) in self.captures.iteritems()),
+            "receiveOptions": dict((messageNum, str(options)) for (messageNum, options) in self.receiveOptions.iteritems()),
+        }
+        # Write then rename, so a half-written cache is never read
+        tempPath = "{0}.{1}.tmp".format(cachePath, os.getpid())
+        try:
+            with open(tempPath, 'wb') as cacheFile:
+                marshal.dump(cache, cacheFile)
+            os.rename(tempPath, cachePath)
+        except (IOError, OSError, ValueError):
+            # Read-only folder, or a setting marshal can't store - just don't cache
+            try:
+                os.remove(tempPath)
+            except OSError:
+                pass
     
     # Utility function to fix up self.comments and self._readComments within readFromFD()
     # as data is read in
     def _pushComments(self, commentSectionName):
-        self.comments[commentSectionName] = self._readComments
-        self._readComments = ""
+        self.comments[commentSectionName] = "".join(self._readComments)
+        self._readComments = []
 
     # Same as above, but appends to existing comment section if possible
     def _appendComments(self, commentSectionName):
         if commentSectionName in self.comments:
-            self.comments[commentSectionName] += self._readComments
+            if self._readComments:
+                self.comments[commentSectionName] += "".join(self._readComments)
         else:
-            self.comments[commentSectionName] = self._readComments
-        self._readComments = ""
+            self.comments[commentSectionName] = "".join(self._readComments)
+        self._readComments = []
+
+    # Settings that are just stored on FuzzerData as-is
+    # Setting name -> (attribute, type or function to validate with),
+    # bool settings are 0 or 1
+    _settingTypes = {
+        "processor_dir": ("processorDirectory", str),
+        "failureThreshold": ("failureThreshold", int),
+        "failureTimeout": ("failureTimeout", int),
+        "proto": ("proto", str),
+        "port": ("port", int),
+        "sourcePort": ("sourcePort", int),
+        "sourceIP": ("sourceIP", str),
+        "sourceIPPool": ("sourceIPPool", str),
+        "sourceIPPoolMode": ("sourceIPPoolMode", str),
+        "connectTimeout": ("connectTimeout", float),
+        "resolveTTL": ("resolveTTL", float),
+        "tlsCiphers": ("tlsCiphers", str),
+        "tlsAlpn": ("tlsAlpn", str),
+        "tlsClientCert": ("tlsClientCert", str),
+        "tlsClientKey": ("tlsClientKey", str),
+        "tlsSessionResumption": ("tlsSessionResumption", bool),
+        "shouldPerformTestRun": ("shouldPerformTestRun", bool),
+        "stopAfterFuzz": ("stopAfterFuzz", _stopAfterFuzzPolicy),
+        "pipelinePrefix": ("pipelinePrefix", bool),
+        "receiveTimeout": ("receiveTimeout", float),
+    }
 
     # Update for compatibilty with newer versions of Decept.
     
@@ -105,110 +325,211 @@ class FuzzerData(object):
         messageNum = 0
         
         # This is used to track multiline messages
-        lastMessage = None
-        # Build up comments in this string until we're ready to push them out to the dictionary
+        message = None
+        # Build up comments in this list until we're ready to push them out to the dictionary
         # Basically, we build lines and lines of comments, then when a command is encountered,
         # push them into the dictionary using that command as a key
         # Thus, when we go to write them back out, we can print them all before a given key
-        self._readComments = ""
+        self._readComments = []
+        self._dataEncoding = Message.Encoding.Escaped
+        # Comment section for the current message, only reformatted when it changes
+        commentSectionNum = None
+        commentSection = None
+        # Where the next line starts, for entries pointing into self._source
+        nextLineOffset = 0
         
+        # Every line is looked at once - message lines are matched by regex
+        # and deserialized directly (or checked and noted for later if
+        # reading from a file), settings are looked up in _settingTypes
         for line in fileDescriptor:
+            lineOffset = nextLineOffset
+            nextLineOffset += len(line)
             # Record comments on read so we can play them back on write if applicable
             if line.startswith("#") or line == "\n":
-                self._readComments += line
+                self._readComments.append(line)
                 # Skip all further processing for this line
                 continue
             
             line = line.replace("\n", "")
             
-            # Skip comments and whitespace
-            if not line.startswith("#") and not line == "" and not line.isspace():
-                args = line.split(" ")
-                
-                # Populate FuzzerData obj with any settings we can parse out
-                try:
-                    if args[0] == "processor_dir":
-                        self.processorDirectory = args[1]
-                        self._pushComments("processor_dir")
-                    elif args[0] == "failureThreshold":
-                        self.failureThreshold = int(args[1])
-                        self._pushComments("failureThreshold")
-                    elif args[0] == "failureTimeout":
-                        self.failureTimeout = int(args[1])
-                        self._pushComments("failureTimeout")
-                    elif args[0] == "proto":
-                        self.proto = args[1]
-                        self._pushComments("proto")
-                    elif args[0] == "port":
-                        self.port = int(args[1])
-                        self._pushComments("port")
-                    elif args[0] == "sourcePort":
-                        self.sourcePort = int(args[1])
-                        self._pushComments("sourcePort")
-                    elif args[0] == "sourceIP":
-                        self.sourceIP = args[1]
-                        self._pushComments("sourceIP")
-                    elif args[0] == "shouldPerformTestRun":
-                        # Use 0 or 1 for setting
-                        if args[1] == "0":
-                            self.shouldPerformTestRun = False
-                        elif args[1] == "1":
-                            self.shouldPerformTestRun = True
+            # Skip whitespace
+            if line == "" or line.isspace():
+                continue
+
+            try:
+                match = _messageLineRegex.match(line)
+                if match:
+                    (command, messageArgs) = match.group(1, 2)
+                    messageArgs = messageArgs.split(" ")
+                    isFuzzed = "fuzz" in messageArgs
+                    self._dataEncoding = Message.getEncodingFromArgs(messageArgs)
+                    if command == "sub":
+                        if message is None:
+                            print "\tERROR: 'sub' line declared before any 'message' lines, throwing subcomponent out: {0}".format(line)
+                        elif not message.isLoaded():
+                            Message.validateEncoded(match.group(4), self._dataEncoding)
+                            self._addEntry(message, ("line", lineOffset + match.start(4), match.end(4) - match.start(4), self._dataEncoding, isFuzzed, True), isFuzzed)
+                        else:
+                            message.appendMessageFrom(Message.Format.Raw, Message.decodeByteArray(match.group(4), self._dataEncoding), isFuzzed)
+                            if not quiet:
+                                print "\t\tSubcomponent: {0} additional bytes".format(message.subcomponents[-1].getOriginalLength())
+                    else:
+                        message = Message(self.messageCollection.arena)
+                        message.direction = command
+                        message.encoding = self._dataEncoding
+                        if self._source is not None:
+                            # Just check and note where the data is, see _loadEntries()
+                            Message.validateEncoded(match.group(4), self._dataEncoding)
+                            message.setLoader(self._loadEntries, [])
+                            self._addEntry(message, ("line", lineOffset + match.start(4), match.end(4) - match.start(4), self._dataEncoding, isFuzzed, True), isFuzzed)
                         else:
-                            raise RuntimeError("shouldPerformTestRun must be 0 or 1")
-                        self._pushComments("shouldPerformTestRun")
-                    elif args[0] == "receiveTimeout":
-                        self.receiveTimeout = float(args[1])
-                        self._pushComments("receiveTimeout")
-                    elif args[0] == "messagesToFuzz":
-                        print("WARNING: It looks like you're using a legacy .fuzzer file with messagesToFuzz set.  This is now deprecated, so please update to the new format")
-                        self.messagesToFuzz = validateNumberRange(args[1], flattenList=True)
-                        # Slight kludge: store comments above messagesToFuzz with the first message.  *shrug*
-                        # Comment saving is best effort anyway, right?
-                        self._pushComments("message0")
-                    elif args[0] == "unfuzzedBytes":
-                        print("ERROR: It looks like you're using a legacy .fuzzer file with unfuzzedBytes set.  This has been replaced by the new multi-line format.  Please update your .fuzzer file.")
-                        sys.exit(-1)
-                    elif args[0] == "inbound" or args[0] == "outbound":
-                        message = Message()
-                        message.setFromSerialized(line)
-                        self.messageCollection.addMessage(message)
-                        # Legacy code to handle old messagesToFuzz format
-                        if messageNum in self.messagesToFuzz:
-                            message.isFuzzed = True
-                        if not quiet:
-                            print "\tMessage #{0}: {1} bytes {2}".format(messageNum, len(message.getOriginalMessage()), message.direction)
-                        self._pushComments("message{0}".format(messageNum))
-                        messageNum += 1
-                        lastMessage = message
-                    # "sub" means this is a subcomponent
-                    elif args[0] == "sub":
-                        if not 'message' in locals():
+                            message.setMessageFrom(Message.Format.Raw, Message.decodeByteArray(match.group(4), self._dataEncoding), isFuzzed)
+                        messageNum = self._addMessage(message, messageNum, quiet)
+                elif _blobLineRegex.match(line):
+                    (command, messageArgs, quote, path, offset, length) = _blobLineRegex.match(line).groups()
+                    if command == "inbound" or (command == "sub" and message is not None and not message.isOutbound()):
+                        raise RuntimeError("Blob data is only supported for outbound messages")
+                    isFuzzed = "fuzz" in messageArgs.split(" ")
+                    path = path.decode("string_escape")
+                    subcomponent = BlobSubComponent(self._getBlob(path), int(offset), int(length), isFuzzed)
+                    if command == "sub":
+                        if message is None:
                             print "\tERROR: 'sub' line declared before any 'message' lines, throwing subcomponent out: {0}".format(line)
+                        elif not message.isLoaded():
+                            self._addEntry(message, ("blob", path, int(offset), int(length), isFuzzed), isFuzzed)
                         else:
-                            message.appendFromSerialized(line)
+                            message.appendSubcomponent(subcomponent)
                             if not quiet:
-                                print "\t\tSubcomponent: {1} additional bytes".format(messageNum, len(message.subcomponents[-1].message))
-                    elif line.lstrip()[0] == "'" and 'message' in locals():
-                        # If the line begins with ' and a message line has been found,
-                        # assume that this is additional message data
-                        # (Different from a subcomponent because it can't have additional data 
-                        # tacked on)
-                        message.appendFromSerialized(line.lstrip(), createNewSubcomponent=False)
+                                print "\t\tSubcomponent: {0} additional bytes from {1}".format(subcomponent.getOriginalLength(), path)
+                    else:
+                        message = Message(self.messageCollection.arena)
+                        message.direction = command
+                        message.appendSubcomponent(subcomponent)
+                        messageNum = self._addMessage(message, messageNum, quiet)
+                else:
+                    match = _continuationLineRegex.match(line) if message is not None else None
+                    if match and not message.isLoaded():
+                        Message.validateEncoded(match.group(1), self._dataEncoding)
+                        self._addEntry(message, ("line", lineOffset + match.start(1), match.end(1) - match.start(1), self._dataEncoding, False, False), False)
+                    elif match:
+                        # Additional data for the last subcomponent, see _readOtherLine()
+                        message.appendMessageFrom(Message.Format.Raw, Message.decodeByteArray(match.group(1), self._dataEncoding), False, createNewSubcomponent=False)
                     else:
-                        if not quiet:
-                            print "Unknown setting in .fuzzer file: {0}".format(args[0])
-                    # Slap any messages between "message" and "sub", etc (ascii same way) above message
-                    # It's way too annoying to print these out properly, as they get
-                    # automagically outserialized by the Message object
-                    # Plus they may change... eh, forget it, user can fix up themselves if they want
-                    self._appendComments("message{0}".format(messageNum-1))
-                except Exception as e:
-                    print "Invalid line: {0}".format(line)
-                    raise e
+                        messageNum = self._readOtherLine(line, message, messageNum, quiet)
+                        message = self.messageCollection.messages[-1] if self.messageCollection.messages else None
+                # Slap any messages between "message" and "sub", etc (ascii same way) above message
+                # It's way too annoying to print these out properly, as they get
+                # automagically outserialized by the Message object
+                # Plus they may change... eh, forget it, user can fix up themselves if they want
+                if messageNum != commentSectionNum:
+                    commentSectionNum = messageNum
+                    commentSection = "message{0}".format(messageNum-1)
+                if self._readComments or commentSection not in self.comments:
+                    self._appendComments(commentSection)
+            except Exception as e:
+                print "Invalid line: {0}".format(line)
+                raise e
+
         # Catch any comments below the last line
         self._pushComments("endcomments")
+
+        # Subcomponents can follow fixups, so only check them once everything is read
+        for (messageNum, fixups) in self.fixups.iteritems():
+            for fixup in fixups:
+                fixup.validate(self.messageCollection.messages[messageNum])
                         
+    # Add a message read from the .fuzzer, returns the next message number
+    def _addMessage(self, message, messageNum, quiet):
+        self.messageCollection.addMessage(message)
+        # Legacy code to handle old messagesToFuzz format
+        if messageNum in self.messagesToFuzz:
+            message.isFuzzed = True
+        if not quiet and not message.isLoaded():
+            print "\tMessage #{0}: {1}, read when first used".format(messageNum, message.direction)
+        elif not quiet:
+            print "\tMessage #{0}: {1} bytes {2}".format(messageNum, message.getOriginalLength(), message.direction)
+        self._pushComments("message{0}".format(messageNum))
+        return messageNum + 1
+
+    # Add a _loadEntries() entry to a message that hasn't been loaded yet
+    def _addEntry(self, message, entry, isFuzzed):
+        message.getPendingEntries().append(entry)
+        if isFuzzed:
+            message.isFuzzed = True
+
+    # Handle any line from readFromFD() that isn't a plain message line
+    # message is the last message read, if any
+    # Returns the next message number
+    def _readOtherLine(self, line, message, messageNum, quiet):
+        args = line.split(" ")
+
+        # Populate FuzzerData obj with any settings we can parse out
+        if args[0] in self._settingTypes:
+            (attribute, settingType) = self._settingTypes[args[0]]
+            if settingType == bool:
+                # Use 0 or 1 for setting
+                if args[1] == "0":
+                    value = False
+                elif args[1] == "1":
+                    value = True
+                else:
+                    raise RuntimeError("{0} must be 0 or 1".format(args[0]))
+            else:
+                value = settingType(args[1])
+            setattr(self, attribute, value)
+            self._pushComments(args[0])
+        elif args[0] == "messagesToFuzz":
+            print("WARNING: It looks like you're using a legacy .fuzzer file with messagesToFuzz set.  This is now deprecated, so please update to the new format")
+            self.messagesToFuzz = validateNumberRange(args[1], flattenList=True)
+            # Slight kludge: store comments above messagesToFuzz with the first message.  *shrug*
+            # Comment saving is best effort anyway, right?
+            self._pushComments("message0")
+        elif args[0] == "unfuzzedBytes":
+            print("ERROR: It looks like you're using a legacy .fuzzer file with unfuzzedBytes set.  This has been replaced by the new multi-line format.  Please update your .fuzzer file.")
+            sys.exit(-1)
+        elif args[0] == "inbound" or args[0] == "outbound":
+            # Message lines with unusual quoting/spacing
+            message = Message(self.messageCollection.arena)
+            message.setFromSerialized(line)
+            self._dataEncoding = message.encoding
+            messageNum = self._addMessage(message, messageNum, quiet)
+        # "sub" means this is a subcomponent
+        elif args[0] == "sub":
+            if message is None:
+                print "\tERROR: 'sub' line declared before any 'message' lines, throwing subcomponent out: {0}".format(line)
+            else:
+                message.appendFromSerialized(line)
+                self._dataEncoding = Message.getEncodingFromArgs(re.split("['\"]", line, 1)[0].split(" "))
+                if not quiet:
+                    print "\t\tSubcomponent: {0} additional bytes".format(message.subcomponents[-1].getOriginalLength())
+        # "fixup" applies to the last message, see backend/fixups.py
+        elif args[0] == "fixup":
+            if message is None or not message.isOutbound():
+                raise RuntimeError("'fixup' lines must come after an outbound message")
+            self.fixups.setdefault(messageNum-1, []).append(FixupRule(line.split(" ", 1)[1]))
+        # "capture" applies to the last message, see backend/captures.py
+        elif args[0] == "capture":
+            if message is None or message.isOutbound():
+                raise RuntimeError("'capture' lines must come after an inbound message")
+            self.captures.setdefault(messageNum-1, []).append(CaptureRule(line.split(" ", 1)[1]))
+        # "receive" applies to the last message, see backend/receive_options.py
+        elif args[0] == "receive":
+            if message is None or message.isOutbound():
+                raise RuntimeError("'receive' lines must come after an inbound message")
+            if messageNum-1 in self.receiveOptions:
+                raise RuntimeError("Only one 'receive' line is allowed per message")
+            self.receiveOptions[messageNum-1] = ReceiveOptions(" ".join(line.split()[1:]))
+        elif line.lstrip()[0] == "'" and message is not None:
+            # If the line begins with ' and a message line has been found,
+            # assume that this is additional message data
+            # (Different from a subcomponent because it can't have additional data 
+            # tacked on)
+            message.appendFromSerialized(line.lstrip(), createNewSubcomponent=False, encoding=self._dataEncoding)
+        else:
+            if not quiet:
+                print "Unknown setting in .fuzzer file: {0}".format(args[0])
+        return messageNum
+
     # Utility function to get comments for a section after checking if they exist
     # If not, returns ""
     def _getComments(self, commentSectionName):
@@ -222,6 +543,36 @@ class FuzzerData(object):
         self.messagesToFuzz = validateNumberRange(messagesToFuzzStr, flattenList=True)
         #print self._messagesToFuzz
 
+    # Drop every message after the last fuzzed outbound message and the
+    # next responses inbound messages, with any fixups/captures/receive
+    # options for them
+    # Returns how many messages were dropped
+    def truncateAfterFuzzed(self, responses):
+        messages = self.messageCollection.messages
+        fuzzedNums = [i for i in range(0, len(messages)) if messages[i].isFuzzed and messages[i].isOutbound()]
+        if not fuzzedNums:
+            return 0
+        end = fuzzedNums[-1] + 1
+        while responses > 0 and end < len(messages):
+            if not messages[end].isOutbound():
+                responses -= 1
+            end += 1
+
+        droppedCount = len(messages) - end
+        del messages[end:]
+        for rules in (self.fixups, self.captures, self.receiveOptions):
+            for messageNum in rules.keys():
+                if messageNum >= end:
+                    del rules[messageNum]
+        return droppedCount
+
+    # Set how every message's data is written out, a Message.Encoding
+    def setEncoding(self, encoding):
+        if encoding not in (Message.Encoding.Escaped, ) + Message.Encoding.Tags:
+            raise RuntimeError("Unknown message encoding {0}".format(encoding))
+        for message in self.messageCollection.messages:
+            message.encoding = encoding
+
     
     # Write out the FuzzerData to the specified .fuzzer file
     def writeToFile(self, filePath, defaultComments=False, finalMessageNum=-1):
@@ -262,7 +613,7 @@ class FuzzerData(object):
         if defaultComments:
             fileDescriptor.write("# Number of times to retry a test case causing a crash\n")
         else:
-            fileDescriptor.write(self._getComments("failure_threshold"))
+            fileDescriptor.write(self._getComments("failureThreshold"))
         fileDescriptor.write("failureThreshold {0}\n".format(self.failureThreshold))
         
         # Failure Timeout
@@ -279,6 +630,22 @@ class FuzzerData(object):
             fileDescriptor.write(self._getComments("receiveTimeout"))
         fileDescriptor.write("receiveTimeout {0}\n".format(self.receiveTimeout))
         
+        # Connect Timeout, only written if in use
+        if self.connectTimeout >= 0:
+            if defaultComments:
+                fileDescriptor.write("# How long to wait for connect() to complete, -1 to block\n")
+            else:
+                fileDescriptor.write(self._getComments("connectTimeout"))
+            fileDescriptor.write("connectTimeout {0}\n".format(self.connectTimeout))
+
+        # Resolve TTL, only written if changed
+        if self.resolveTTL != 60.0:
+            if defaultComments:
+                fileDescriptor.write("# How many seconds to cache the target's DNS resolution for\n")
+            else:
+                fileDescriptor.write(self._getComments("resolveTTL"))
+            fileDescriptor.write("resolveTTL {0}\n".format(self.resolveTTL))
+
         # Should Perform Test Run
         if defaultComments:
             fileDescriptor.write("# Whether to perform an unfuzzed test run before fuzzing\n")
@@ -286,6 +653,22 @@ class FuzzerData(object):
             fileDescriptor.write(self._getComments("shouldPerformTestRun"))
         sPTR = 1 if self.shouldPerformTestRun else 0
         fileDescriptor.write("shouldPerformTestRun {0}\n".format(sPTR))
+
+        # Stop After Fuzz, only written if in use
+        if self.stopAfterFuzz:
+            if defaultComments:
+                fileDescriptor.write("# End fuzzed runs early: after the fuzzed message's \"response\", after a number\n# of messages, or when a response \"diverge\"s from the recording\n")
+            else:
+                fileDescriptor.write(self._getComments("stopAfterFuzz"))
+            fileDescriptor.write("stopAfterFuzz {0}\n".format(self.stopAfterFuzz))
+
+        # Pipeline Prefix, only written if in use
+        if self.pipelinePrefix:
+            if defaultComments:
+                fileDescriptor.write("# Send the unfuzzed start of the conversation without waiting for responses\n")
+            else:
+                fileDescriptor.write(self._getComments("pipelinePrefix"))
+            fileDescriptor.write("pipelinePrefix 1\n")
         
         # Protocol
         if defaultComments:
@@ -294,6 +677,22 @@ class FuzzerData(object):
             fileDescriptor.write(self._getComments("proto"))
         fileDescriptor.write("proto {0}\n".format(self.proto))
         
+        # TLS options, only written if in use
+        tlsSettings = [
+            ("tlsCiphers", self.tlsCiphers, "# OpenSSL cipher list to offer\n"),
+            ("tlsAlpn", self.tlsAlpn, "# Comma-separated ALPN protocols to offer\n"),
+            ("tlsClientCert", self.tlsClientCert, "# Client certificate, relative to the .fuzzer file\n"),
+            ("tlsClientKey", self.tlsClientKey, "# Client certificate key, relative to the .fuzzer file\n"),
+            ("tlsSessionResumption", "" if self.tlsSessionResumption else "0", "# 0 sets OP_NO_TICKET so TLS session tickets aren't offered (sessions are never resumed)\n"),
+        ]
+        for (settingName, value, comment) in tlsSettings:
+            if value:
+                if defaultComments:
+                    fileDescriptor.write(comment)
+                else:
+                    fileDescriptor.write(self._getComments(settingName))
+                fileDescriptor.write("{0} {1}\n".format(settingName, value))
+
         # Port
         if defaultComments:
             fileDescriptor.write("# Port number to connect to\n")
@@ -313,18 +712,40 @@ class FuzzerData(object):
             fileDescriptor.write("# Source IP to connect from\n")
         else:
             fileDescriptor.write(self._getComments("sourceIP"))
-        fileDescriptor.write("sourceIP {0}\n\n".format(self.sourceIP))
+        fileDescriptor.write("sourceIP {0}\n".format(self.sourceIP))
+
+        # Source IP Pool, only written if in use
+        if self.sourceIPPool:
+            if defaultComments:
+                fileDescriptor.write("# Source IPs/CIDR blocks to rotate through, overrides sourceIP\n")
+            else:
+                fileDescriptor.write(self._getComments("sourceIPPool"))
+            fileDescriptor.write("sourceIPPool {0}\n".format(self.sourceIPPool))
+            if defaultComments:
+                fileDescriptor.write("# Rotate source IP per \"connection\" or once per \"worker\" process\n")
+            else:
+                fileDescriptor.write(self._getComments("sourceIPPoolMode"))
+            fileDescriptor.write("sourceIPPoolMode {0}\n".format(self.sourceIPPoolMode))
+        fileDescriptor.write("\n")
 
         # Messages
         if finalMessageNum == -1:
             finalMessageNum = len(self.messageCollection.messages)-1
         if defaultComments:
             fileDescriptor.write("# The actual messages in the conversation\n# Each contains a message to be sent to or from the server, printably-formatted\n")
+            if any(message.encoding != Message.Encoding.Escaped for message in self.messageCollection.messages[:finalMessageNum+1]):
+                fileDescriptor.write("# Data tagged 'hex' or 'base64' is in that encoding instead\n")
         for i in range(0, finalMessageNum+1):
             message = self.messageCollection.messages[i]
             if not defaultComments:
                 fileDescriptor.write(self._getComments("message{0}".format(i)))
             fileDescriptor.write(message.getSerialized())
+            for fixup in self.fixups.get(i, []):
+                fileDescriptor.write("fixup {0}\n".format(fixup))
+            for capture in self.captures.get(i, []):
+                fileDescriptor.write("capture {0}\n".format(capture))
+            if i in self.receiveOptions:
+                fileDescriptor.write("receive {0}\n".format(self.receiveOptions[i]))
             
         
         if not defaultComments:
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Background log writing, so a slow disk or network log folder doesn't
+# stall the fuzz loop
+#
+# The fuzz loop puts records on a bounded queue and a worker thread writes
+# them out in batches, flushing once per batch.  When the queue is full,
+# the block policy waits for room and the drop policy throws away records
+# marked as droppable (LogAll runs), crash logs always wait.
+#
+#------------------------------------------------------------------
+
+import Queue
+import threading
+
+class AsyncLogWriter(object):
+    class Policy:
+        Block = "block"
+        Drop = "drop"
+
+    # Most records written between flushes
+    BATCH_SIZE = 64
+
+    # writeRecord(record) - called on the worker thread for each record
+    # flush() - called on the worker thread after each batch
+    def __init__(self, queueSize, policy, writeRecord, flush):
+        if queueSize < 1:
+            raise RuntimeError("Log queue size must be at least 1, got %d" % (queueSize))
+        if policy not in (AsyncLogWriter.Policy.Block, AsyncLogWriter.Policy.Drop):
+            raise RuntimeError("Unknown log queue policy: %s" % (policy))
+        self._queue = Queue.Queue(queueSize)
+        self._policy = policy
+        self._writeRecord = writeRecord
+        self._flush = flush
+        self.droppedCount = 0
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # record should not be changed after this, the worker may still be using it
+    def put(self, record, isDroppable=False):
+        if isDroppable and self._policy == AsyncLogWriter.Policy.Drop:
+            try:
+                self._queue.put_nowait(record)
+            except Queue.Full:
+                self.droppedCount += 1
+        else:
+            self._queue.put(record)
+
+    # Wait until everything queued so far has been written and flushed
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < AsyncLogWriter.BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except Queue.Empty:
+                pass
+
+            # Keep the worker alive on errors, later records may still be writable
+            for record in batch:
+                try:
+                    self._writeRecord(record)
+                except Exception as e:
+                    print "Error writing log: %s" % (str(e))
+            try:
+                self._flush()
+            except Exception as e:
+                print "Error flushing logs: %s" % (str(e))
+            for _ in batch:
+                self._queue.task_done()
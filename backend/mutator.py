@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Runs Radamsa to mutate fuzzed subcomponents, either inline or ahead of
+# time on a background thread
+#
+#------------------------------------------------------------------
+
+import subprocess
+import threading
+from mutiny_classes.message_processor import MessageProcessorExtraParams
+
+class RadamsaMutator(object):
+    # batchProcess - MessageProcessor.postFuzzBatchProcess() if overridden
+    def __init__(self, radamsaPath, batchProcess=None):
+        self.radamsaPath = radamsaPath
+        self.batchProcess = batchProcess
+
+    # Returns byteArray mutated by Radamsa with the given seed
+    # The same seed and input always give the same output
+    def mutate(self, byteArray, seed):
+        radamsa = subprocess.Popen([self.radamsaPath, "--seed", str(seed)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (fuzzedByteArray, errorOutput) = radamsa.communicate(input=byteArray)
+        return bytearray(fuzzedByteArray)
+
+    # Returns the fuzzed data for subcomponent j of message number i
+    def mutateSubcomponent(self, i, j, message, seed):
+        fuzzedByteArray = self.mutate(message.subcomponents[j].getAlteredByteArray(), seed)
+        if self.batchProcess:
+            fuzzedByteArray = self.batchProcess([fuzzedByteArray], _batchExtraParams(i, j, message))[0]
+        return fuzzedByteArray
+
+# Fuzzes every fuzzed subcomponent in the plan for upcoming seeds on a
+# background thread, so Radamsa and postFuzzBatchProcess() are off the
+# network path
+# Seeds are assumed to go up by one each run - asking for any other seed
+# throws away what was prefetched and starts again from there
+# Only valid when the data going into Radamsa is always the original data,
+# so not with preFuzz callbacks
+# A seed that fails on the thread is fuzzed again inline when it's asked for,
+# so one bad seed doesn't stop the rest being prefetched
+class PrefetchingMutator(RadamsaMutator):
+    # depth - how many seeds to fuzz ahead
+    def __init__(self, radamsaPath, executionPlan, depth, batchProcess=None):
+        RadamsaMutator.__init__(self, radamsaPath, batchProcess)
+        self.depth = depth
+        # Seeds are fuzzed in batches of this many at once
+        self.batchSize = max(1, depth // 2)
+
+        # (i, j, original data, extraParams) for every fuzzed subcomponent
+        # Built here so the thread never touches the messages themselves
+        self.jobs = []
+        for op in executionPlan.getFuzzedOps():
+            (i, message) = op[1:3]
+            for j in op[3]:
+                self.jobs.append((i, j, message.subcomponents[j].getOriginalByteArray(), _batchExtraParams(i, j, message)))
+
+        # seed -> {(i, j): fuzzed data}, or the exception fuzzing it raised
+        self.results = {}
+        # Next seed the thread will fuzz, and the batch it's working on
+        self.nextSeed = None
+        self.pendingSeeds = xrange(0)
+        # Bumped on every restart so results from an old batch are dropped
+        self.generation = 0
+        # Set by close() to stop the thread
+        self.isClosed = False
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self._prefetch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def mutateSubcomponent(self, i, j, message, seed):
+        with self.condition:
+            if seed not in self.results and seed not in self.pendingSeeds:
+                # Not what we were expecting, restart from this seed
+                self.results.clear()
+                self.nextSeed = seed
+                self.pendingSeeds = xrange(0)
+                self.generation += 1
+                self.condition.notify_all()
+
+            # Anything below the current seed won't be asked for again
+            for oldSeed in [s for s in self.results if s < seed]:
+                del self.results[oldSeed]
+                self.condition.notify_all()
+
+            while seed not in self.results:
+                self.condition.wait()
+            result = self.results[seed]
+
+        if isinstance(result, Exception):
+            print "\tPrefetching seed %d failed (%s), fuzzing message %d inline" % (seed, str(result), i)
+            return RadamsaMutator.mutateSubcomponent(self, i, j, message, seed)
+        return result[(i, j)]
+
+    # Stop the thread, after the batch it's working on if any
+    # Call before exiting, it can't wake up while the interpreter shuts down
+    def close(self):
+        with self.condition:
+            self.isClosed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _prefetch(self):
+        while True:
+            with self.condition:
+                while not self.isClosed and (self.nextSeed == None or len(self.results) >= self.depth):
+                    self.condition.wait()
+                if self.isClosed:
+                    return
+                generation = self.generation
+                seeds = xrange(self.nextSeed, self.nextSeed + self.batchSize)
+                self.pendingSeeds = seeds
+                self.nextSeed += self.batchSize
+
+            batch = dict((seed, {}) for seed in seeds)
+            for (i, j, byteArray, extraParams) in self.jobs:
+                # Seeds that already failed on an earlier subcomponent are skipped
+                jobSeeds = []
+                payloads = []
+                for seed in seeds:
+                    if isinstance(batch[seed], Exception):
+                        continue
+                    try:
+                        payloads.append(self.mutate(byteArray, seed))
+                        jobSeeds.append(seed)
+                    except Exception as e:
+                        batch[seed] = e
+                if self.batchProcess and payloads:
+                    try:
+                        payloads = self.batchProcess(payloads, extraParams)
+                    except Exception as e:
+                        # No telling which seed it didn't like
+                        for seed in jobSeeds:
+                            batch[seed] = e
+                        continue
+                for (seed, payload) in zip(jobSeeds, payloads):
+                    batch[seed][(i, j)] = payload
+
+            with self.condition:
+                if generation == self.generation:
+                    self.results.update(batch)
+                    self.pendingSeeds = xrange(0)
+                self.condition.notify_all()
+
+def _batchExtraParams(i, j, message):
+    originalSubcomponents = message.getOriginalSubcomponents()
+    return MessageProcessorExtraParams(i, j, True, originalSubcomponents, originalSubcomponents, message.getOriginalMessage())
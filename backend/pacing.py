@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Pacing for fuzz runs and connections
+# Token buckets limit runs/connections per second, optionally shared
+# between several Mutiny processes through a small state file
+#
+#------------------------------------------------------------------
+
+import fcntl
+import mmap
+import os
+import random
+import struct
+import time
+
+# Bucket state shared between processes via a memory-mapped file
+# Each slot is (tokens available, time of last refill)
+class SharedBucketState(object):
+    slotFormat = struct.Struct("dd")
+
+    def __init__(self, path, slotCount):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+        size = self.slotFormat.size * slotCount
+        if os.fstat(self._fd).st_size < size:
+            # A zeroed slot refills to a full bucket on first use
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def lock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def unlock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def read(self, slot):
+        return self.slotFormat.unpack_from(self._map, slot * self.slotFormat.size)
+
+    def write(self, slot, tokens, lastRefill):
+        self.slotFormat.pack_into(self._map, slot * self.slotFormat.size, tokens, lastRefill)
+
+class TokenBucket(object):
+    # rate - tokens added per second
+    # burst - most tokens that can build up while idle
+    # sharedState/slot - SharedBucketState to keep tokens in, None for this process only
+    def __init__(self, rate, burst, sharedState=None, slot=0):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._sharedState = sharedState
+        self._slot = slot
+        self._tokens = self.burst
+        self._lastRefill = time.time()
+
+    # Block until a token is available and take it
+    # Returns how long we waited
+    def acquire(self):
+        waited = 0.0
+        while True:
+            wait = self._tryAcquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    # Take a token if there is one, otherwise return how long until there is
+    def _tryAcquire(self):
+        if self._sharedState:
+            self._sharedState.lock()
+            try:
+                (self._tokens, self._lastRefill) = self._sharedState.read(self._slot)
+                wait = self._refillAndTake()
+                self._sharedState.write(self._slot, self._tokens, self._lastRefill)
+                return wait
+            finally:
+                self._sharedState.unlock()
+        return self._refillAndTake()
+
+    def _refillAndTake(self):
+        now = time.time()
+        self._tokens = min(self.burst, self._tokens + (now - self._lastRefill) * self.rate)
+        self._lastRefill = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return 0
+        return (1.0 - self._tokens) / self.rate
+
+class Pacer(object):
+    # How often to print the achieved rate (seconds)
+    reportInterval = 10.0
+
+    # runRate/connectionRate - limits per second, 0 = unlimited
+    # burst - how many runs/connections can go back-to-back after idling
+    # jitter - up to this many seconds of random extra delay before each run
+    # sleepTime - fixed delay before each run (legacy --sleeptime)
+    # sharedStatePath - file to share the limits with other Mutiny processes
+    def __init__(self, runRate=0, connectionRate=0, burst=1, jitter=0, sleepTime=0, sharedStatePath=None):
+        self.jitter = jitter
+        self.sleepTime = sleepTime
+        self.burst = burst
+        self._sharedState = None
+        if sharedStatePath:
+            self._sharedState = SharedBucketState(sharedStatePath, 2)
+        self.runBucket = TokenBucket(runRate, burst, self._sharedState, 0) if runRate > 0 else None
+        self.connectionBucket = TokenBucket(connectionRate, burst, self._sharedState, 1) if connectionRate > 0 else None
+
+        self.runCount = 0
+        self.connectionCount = 0
+        self._startTime = None
+        self._lastReportTime = None
+
+    # Change the run rate limit, 0 = unlimited
+    def setRunRate(self, runRate):
+        if runRate <= 0:
+            self.runBucket = None
+        elif self.runBucket:
+            self.runBucket.rate = float(runRate)
+        else:
+            self.runBucket = TokenBucket(runRate, self.burst, self._sharedState, 0)
+
+    # Current run rate limit, 0 = unlimited
+    def getRunRate(self):
+        return self.runBucket.rate if self.runBucket else 0
+
+    # Called before every run
+    def waitForRun(self):
+        if self.sleepTime > 0:
+            time.sleep(self.sleepTime)
+        if self.runBucket:
+            self.runBucket.acquire()
+        if self.jitter > 0:
+            time.sleep(random.uniform(0, self.jitter))
+
+        now = time.time()
+        if self._startTime is None:
+            self._startTime = now
+            self._lastReportTime = now
+        elif now - self._lastReportTime >= self.reportInterval:
+            self._lastReportTime = now
+            print "\n** %s **" % (self.getRateSummary())
+        self.runCount += 1
+
+    # Called before every connection
+    def waitForConnection(self):
+        if self.connectionBucket:
+            self.connectionBucket.acquire()
+        self.connectionCount += 1
+
+    # Achieved runs and connections per second so far
+    def getRates(self):
+        if self._startTime is None:
+            return (0.0, 0.0)
+        elapsed = max(time.time() - self._startTime, 0.000001)
+        return (self.runCount / elapsed, self.connectionCount / elapsed)
+
+    def getRateSummary(self):
+        (runRate, connectionRate) = self.getRates()
+        summary = "Achieved %.2f runs/s, %.2f connections/s" % (runRate, connectionRate)
+        if self.runBucket:
+            summary += " (run limit %.2f/s)" % (self.runBucket.rate)
+        if self.connectionBucket:
+            summary += " (connection limit %.2f/s)" % (self.connectionBucket.rate)
+        return summary
@@ -78,6 +78,13 @@ class ProcDirector(object):
         self.exceptionProcessor = sys.modules['exception_processor'].ExceptionProcessor
         self.monitor = sys.modules['monitor'].Monitor 
         self.crashQueue = Event()
+
+        # Work out which MessageProcessor callbacks actually do something, by
+        # comparing against a separately loaded copy of the default processor
+        defaultProcessor = imp.load_source("default_message_processor", os.path.join(defaultDir, "message_processor.py")).MessageProcessor
+        self.messageProcessorHooks = MessageProcessorHooks(self.messageProcessor, defaultProcessor)
+        if self.messageProcessorHooks.overridden:
+            print("MessageProcessor overrides: {0}".format(", ".join(self.messageProcessorHooks.overridden)))
     
     class MonitorWrapper(object):
         def __init__(self, targetIP, targetPort, monitor):
@@ -102,3 +109,34 @@ class ProcDirector(object):
         self.monitorWrapper = self.MonitorWrapper(host, port, self.monitor())
         return self.monitorWrapper
         
+
+# Which MessageProcessor callbacks Mutiny needs to call
+# Custom processors are usually a copy of the default one with one or two
+# callbacks changed, so anything with the same code as the default
+# (pass/return the input unchanged) is skipped
+class MessageProcessorHooks(object):
+    names = ["preConnect", "preFuzzSubcomponentProcess", "preFuzzProcess", "postFuzzBatchProcess", "preSendSubcomponentProcess", "preSendProcess", "postReceiveProcess"]
+
+    def __init__(self, processorClass, defaultProcessorClass):
+        self.overridden = []
+        for name in self.names:
+            hook = getattr(processorClass, name, None)
+            isOverridden = hook is not None and not _isSameFunction(hook, getattr(defaultProcessorClass, name))
+            setattr(self, name, isOverridden)
+            if isOverridden:
+                self.overridden.append(name)
+
+        # Whether any callback can change outbound messages
+        self.altersOutbound = (self.preFuzzSubcomponentProcess or self.preFuzzProcess
+                               or self.preSendSubcomponentProcess or self.preSendProcess)
+
+        # The default postReceiveProcess() stores responses in postReceiveStore
+        # for the other callbacks, so only skip it if they're all default too
+        if self.overridden:
+            self.postReceiveProcess = True
+
+def _isSameFunction(method, otherMethod):
+    code = getattr(method, "__func__", method).__code__
+    otherCode = getattr(otherMethod, "__func__", otherMethod).__code__
+    return (code.co_code == otherCode.co_code and code.co_consts == otherCode.co_consts
+            and code.co_names == otherCode.co_names and code.co_varnames == otherCode.co_varnames)
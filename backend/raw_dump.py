@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Writes out the messages of --dumpraw runs on a background thread
+#
+# Dumping to a folder keeps the original layout, a file per message per seed
+# with the data escaped.  Dumping to an archive stores the actual bytes as
+#
+#   seed-<seed>/<message number>-<outbound|inbound>[-fuzzed]
+#
+# in a .zip (deflated, with its central directory as the index), or a .tar,
+# .tar.gz/.tgz or .tar.bz2 written as a stream.
+#
+#------------------------------------------------------------------
+
+import os.path
+import tarfile
+import time
+import zipfile
+from StringIO import StringIO
+from backend.fuzzer_types import joinPieces
+from backend.log_writer import AsyncLogWriter
+
+class RawDumper(object):
+    # Messages waiting to be written before the fuzz loop has to wait
+    QUEUE_SIZE = 1024
+
+    _tarModes = [(".tar", "w"), (".tar.gz", "w:gz"), (".tgz", "w:gz"), (".tar.bz2", "w:bz2")]
+
+    # path - folder to dump into, or an archive to create (see above)
+    def __init__(self, path):
+        self._zipFile = None
+        self._tarFile = None
+        self._folderPath = None
+        if path.endswith(".zip"):
+            self._zipFile = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            for (extension, mode) in RawDumper._tarModes:
+                if path.endswith(extension):
+                    self._tarFile = tarfile.open(path, mode)
+                    break
+            else:
+                if not os.path.isdir(path):
+                    raise RuntimeError("Raw dump path is neither a folder nor a .zip/.tar/.tar.gz/.tgz/.tar.bz2 archive: %s" % (path))
+                self._folderPath = path
+        self._writer = AsyncLogWriter(RawDumper.QUEUE_SIZE, AsyncLogWriter.Policy.Block, self._writeRecord, lambda: None)
+
+    # data - bytearray or list of pieces, must not be changed afterwards
+    def dump(self, seed, messageNumber, isOutbound, isFuzzed, data):
+        self._writer.put((seed, messageNumber, isOutbound, isFuzzed, data))
+
+    def _writeRecord(self, record):
+        (seed, messageNumber, isOutbound, isFuzzed, data) = record
+        if isinstance(data, list):
+            data = joinPieces(data)
+        direction = "outbound" if isOutbound else "inbound"
+        fuzzedSuffix = "-fuzzed" if isFuzzed else ""
+
+        if self._folderPath:
+            with open(os.path.join(self._folderPath, "%d-%s-seed-%d%s" % (messageNumber, direction, seed, fuzzedSuffix)), "wb") as dumpFile:
+                dumpFile.write(repr(str(data))[1:-1])
+            return
+
+        name = "seed-%d/%d-%s%s" % (seed, messageNumber, direction, fuzzedSuffix)
+        now = time.time()
+        if self._zipFile:
+            zipInfo = zipfile.ZipInfo(name, time.localtime(now)[:6])
+            zipInfo.compress_type = zipfile.ZIP_DEFLATED
+            zipInfo.external_attr = 0644 << 16
+            self._zipFile.writestr(zipInfo, str(data))
+        else:
+            tarInfo = tarfile.TarInfo(name)
+            tarInfo.size = len(data)
+            tarInfo.mtime = now
+            self._tarFile.addfile(tarInfo, StringIO(str(data)))
+
+    # Write out everything queued and finish the archive, call before exiting
+    def close(self):
+        self._writer.flush()
+        if self._zipFile:
+            self._zipFile.close()
+        elif self._tarFile:
+            self._tarFile.close()
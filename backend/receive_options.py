@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Co-Author Lilith Wyatt (liwyatt)
+#------------------------------------------------------------------
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Cisco Systems, Inc. nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#------------------------------------------------------------------
+#
+# Per-message receive options: a "receive" line after an inbound message
+# changes how Mutiny waits for it
+#
+#   receive [timeout=<seconds>] [min=<bytes>] [max=<bytes>] [optional] [skip]
+#
+# timeout  - wait this long instead of receiveTimeout
+# min      - keep reading until at least this many bytes have arrived
+# max      - never read more than this many bytes for this message
+# optional - carry on with the run if nothing arrives before the timeout
+# skip     - don't wait at all, only take whatever has already arrived, so
+#            a late response is read along with the next message instead
+#
+# receiveWithOptions() and receiveAggregate() do the actual reading for
+# mutiny.py, and isReceiveTimeout() tells whether a read failed by timing out
+#
+#------------------------------------------------------------------
+
+import errno
+import socket
+import ssl
+import time
+from mutiny_classes.mutiny_exceptions import ConnectionClosedException
+
+class ReceiveOptions(object):
+    def __init__(self, optionStr):
+        self.optionStr = optionStr
+        self.timeout = None
+        self.minLength = None
+        self.maxLength = None
+        self.isOptional = False
+        self.isSkipped = False
+
+        for option in optionStr.split():
+            (name, hasValue, value) = option.partition("=")
+            try:
+                if name == "timeout" and hasValue:
+                    self.timeout = float(value)
+                elif name == "min" and hasValue:
+                    self.minLength = int(value)
+                elif name == "max" and hasValue:
+                    self.maxLength = int(value)
+                elif option == "optional":
+                    self.isOptional = True
+                elif option == "skip":
+                    self.isSkipped = True
+                else:
+                    raise RuntimeError("Unknown receive option {0}: {1}".format(option, optionStr))
+            except ValueError:
+                raise RuntimeError("Invalid receive option {0}: {1}".format(option, optionStr))
+
+        if (self.timeout != None and self.timeout < 0) or (self.minLength != None and self.minLength < 0) or (self.maxLength != None and self.maxLength < 1):
+            raise RuntimeError("Receive timeout/min can't be negative and max must be at least 1: {0}".format(optionStr))
+        if self.minLength != None and self.maxLength != None and self.minLength > self.maxLength:
+            raise RuntimeError("Receive min is larger than max: {0}".format(optionStr))
+
+    def __str__(self):
+        return self.optionStr
+
+
+# Whether e, a socket.error from recv(), means the read timed out
+# Plain sockets raise socket.timeout, but on Python 2 a TLS read that times
+# out raises a plain SSLError("The read operation timed out") instead
+def isReceiveTimeout(e):
+    if isinstance(e, socket.timeout):
+        return True
+    return isinstance(e, ssl.SSLError) and e.errno is None and "timed out" in str(e)
+
+# Non-blocking reads with nothing there raise EAGAIN on plain sockets, and
+# SSLWantReadError (an SSLError and so socket.error) on TLS
+def _isWouldBlock(e):
+    if isinstance(e, ssl.SSLError):
+        return e.errno == ssl.SSL_ERROR_WANT_READ
+    return e.errno in (errno.EAGAIN, errno.EWOULDBLOCK)
+
+# Read one inbound message from connection
+# bytesToRead - length of the expected data, reads stop around there
+# receiveTimeout - the .fuzzer receiveTimeout, unless receiveOptions has one
+# recordLatency - if given, called with the seconds the first read took
+def receiveWithOptions(connection, addr, bytesToRead, receiveTimeout, receiveOptions, recordLatency=None):
+    readBufSize = 4096
+    maxLength = receiveOptions.maxLength
+    if maxLength != None:
+        readBufSize = min(readBufSize, maxLength)
+        bytesToRead = min(bytesToRead, maxLength)
+    # Skipped messages only take what has already arrived, so don't block
+    if receiveOptions.isSkipped:
+        connection.settimeout(0)
+    elif receiveOptions.timeout != None:
+        connection.settimeout(receiveOptions.timeout)
+    else:
+        connection.settimeout(receiveTimeout)
+
+    startTime = time.time()
+    try:
+        if connection.type == socket.SOCK_STREAM or connection.type == socket.SOCK_DGRAM:
+            response = bytearray(connection.recv(readBufSize))
+        else:
+            response = bytearray(connection.recvfrom(readBufSize,addr))
+    except socket.error as e:
+        if receiveOptions.isSkipped and (isReceiveTimeout(e) or _isWouldBlock(e)):
+            print "\tNothing received yet, skipping"
+            return bytearray()
+        if receiveOptions.isOptional and isReceiveTimeout(e):
+            print "\tNothing received for optional message"
+            return bytearray()
+        raise
+    if recordLatency:
+        recordLatency(time.time() - startTime)
+
+    if len(response) == 0:
+        # If 0 bytes are recv'd, the server has closed the connection
+        # per python documentation
+        raise ConnectionClosedException("Server has closed the connection")
+    if receiveOptions.minLength != None and not receiveOptions.isSkipped:
+        # Keep going until min bytes are in, anything short of that is
+        # left for the comparison with the expected data to show up
+        while len(response) < receiveOptions.minLength and (maxLength == None or len(response) < maxLength):
+            try:
+                data = connection.recv(readBufSize if maxLength == None else min(readBufSize, maxLength - len(response)))
+            except socket.error as e:
+                if isReceiveTimeout(e):
+                    break
+                raise
+            if len(data) == 0:
+                break
+            response += data
+    elif bytesToRead > readBufSize and not receiveOptions.isSkipped:
+        # If we're trying to read > 4096, don't actually bother trying to guarantee we'll read 4096
+        # Just keep reading in 4096 chunks until we should have read enough, and then return
+        # whether or not it's as much data as expected
+        i = readBufSize
+        while i < bytesToRead:
+            response += bytearray(connection.recv(readBufSize if maxLength == None else min(readBufSize, maxLength - len(response))))
+            i += readBufSize
+
+    return response
+
+# Read the responses to a pipelined prefix, up to bytesToRead in total
+# Stops short if the target goes quiet for receiveTimeout part way through
+def receiveAggregate(connection, bytesToRead, receiveTimeout):
+    connection.settimeout(receiveTimeout)
+    response = bytearray()
+    while len(response) < bytesToRead:
+        try:
+            data = connection.recv(bytesToRead - len(response))
+        except socket.error as e:
+            if not isReceiveTimeout(e) or len(response) == 0:
+                raise
+            break
+        if len(data) == 0:
+            raise ConnectionClosedException("Server has closed the connection")
+        response += data
+    return response
@@ -42,20 +42,28 @@ import os.path
 import os
 import signal
 import socket
-import subprocess
 import sys
 import threading
 import time
 import argparse
-import ssl
-from copy import deepcopy
+import atexit
 from backend.proc_director import ProcDirector
-from backend.fuzzer_types import Message, MessageCollection, Logger
-from backend.packets import PROTO,IP
+from backend.fuzzer_types import Message, MessageCollection, Logger, joinPieces
 from mutiny_classes.mutiny_exceptions import *
 from mutiny_classes.message_processor import MessageProcessorExtraParams
 from backend.fuzzerdata import FuzzerData
 from backend.menu_functions import validateNumberRange
+from backend.address_pool import SourceAddressPool
+from backend.connection_factory import ConnectionFactory
+from backend.pacing import Pacer
+from backend.autotune import Autotuner
+from backend.execution_plan import ExecutionPlan
+from backend.fixups import applyFixups
+from backend.captures import CapturedValues
+from backend.receive_options import ReceiveOptions, receiveWithOptions, receiveAggregate
+from backend.mutator import RadamsaMutator, PrefetchingMutator
+from backend.log_writer import AsyncLogWriter
+from backend.raw_dump import RawDumper
 
 # Path to Radamsa binary
 RADAMSA=os.path.abspath( os.path.join(__file__, "../radamsa-v0.6/bin/radamsa") )
@@ -67,13 +75,29 @@ MIN_RUN_NUMBER=0
 MAX_RUN_NUMBER=-1
 # For seed loop, finite range to repeat   
 SEED_LOOP = []
-# For dumpraw option, dump into log directory by default, else 'dumpraw'
-DUMPDIR = ""
+# For dumpraw option, dumps into log directory by default, else 'dumpraw'
+# or --dumpArchive
+rawDumper = None
+# Used for messages without a "receive" line
+DEFAULT_RECEIVE_OPTIONS = ReceiveOptions("")
 
 # Takes a socket and outbound data packet (byteArray), sends it out.
 # If debug mode is enabled, we print out the raw bytes
+# Messages with blob data come as a list of pieces, so large files are sent
+# straight from their mapping without being joined into one copy first
 def sendPacket(connection, addr, outPacketData):
     connection.settimeout(fuzzerData.receiveTimeout)
+    if isinstance(outPacketData, list):
+        if connection.type == socket.SOCK_STREAM:
+            for piece in outPacketData:
+                connection.sendall(piece)
+            print "\tSent %d byte packet" % (sum(map(len, outPacketData)))
+            if DEBUG_MODE:
+                print "\tRaw Bytes: %s" % (Message.serializeByteArray(joinPieces(outPacketData)))
+            return
+        # Datagrams have to go out in one piece
+        outPacketData = joinPieces(outPacketData)
+
     if connection.type == socket.SOCK_STREAM:
         connection.send(outPacketData)
     else:
@@ -85,217 +109,169 @@ def sendPacket(connection, addr, outPacketData):
         print "\tRaw Bytes: %s" % (Message.serializeByteArray(outPacketData))
 
 
-def receivePacket(connection, addr, bytesToRead):
-    readBufSize = 4096
-    connection.settimeout(fuzzerData.receiveTimeout)
+# receiveOptions - ReceiveOptions from the message's "receive" line, if any
+def receivePacket(connection, addr, bytesToRead, receiveOptions=DEFAULT_RECEIVE_OPTIONS):
+    # Only receives using receiveTimeout say anything about what it should be
+    recordLatency = None
+    if autotuner and receiveOptions is DEFAULT_RECEIVE_OPTIONS:
+        recordLatency = autotuner.recordReceive
+    response = receiveWithOptions(connection, addr, bytesToRead, fuzzerData.receiveTimeout, receiveOptions, recordLatency)
+
+    print "\tReceived %d bytes" % (len(response))
+    if DEBUG_MODE:
+        print "\tReceived: %s" % (response)
+    return response
+
+# Read the responses to a pipelined prefix, see receiveAggregate()
+def receivePipelinedResponses(connection, bytesToRead):
+    response = receiveAggregate(connection, bytesToRead, fuzzerData.receiveTimeout)
 
-    if connection.type == socket.SOCK_STREAM or connection.type == socket.SOCK_DGRAM:
-        response = bytearray(connection.recv(readBufSize))
-    else:
-        response = bytearray(connection.recvfrom(readBufSize,addr))
-    
-    
-    if len(response) == 0:
-        # If 0 bytes are recv'd, the server has closed the connection
-        # per python documentation
-        raise ConnectionClosedException("Server has closed the connection")
-    if bytesToRead > readBufSize:
-        # If we're trying to read > 4096, don't actually bother trying to guarantee we'll read 4096
-        # Just keep reading in 4096 chunks until we should have read enough, and then return
-        # whether or not it's as much data as expected
-        i = readBufSize
-        while i < bytesToRead:
-            response += bytearray(connection.recv(readBufSize))
-            i += readBufSize
-            
     print "\tReceived %d bytes" % (len(response))
     if DEBUG_MODE:
         print "\tReceived: %s" % (response)
     return response
 
+# Runs the MessageProcessor callbacks and the mutator over an outbound message
+# for this seed, returning the data to send
+# fuzzedSubcomponentNumbers - indexes of the message's subcomponents with isFuzzed set
+# fixups - FixupRules for this message
+# substitutedSubcomponentNumbers - indexes of subcomponents with ${name} captures in them
+def buildOutboundMessage(i, message, fuzzedSubcomponentNumbers, fixups, substitutedSubcomponentNumbers, messageProcessor, seed):
+    # Go ahead and revert any fuzzing or messageprocessor changes before proceeding
+    message.resetAlteredMessage()
+
+    # Fill in values captured from earlier responses, before anything else sees the data
+    for j in substitutedSubcomponentNumbers:
+        subcomponent = message.subcomponents[j]
+        subcomponent.setAlteredByteArray(capturedValues.substitute(subcomponent.getAlteredByteArray()))
+
+    # Primarily used for deciding how to handle preFuzz/preSend callbacks
+    doesMessageHaveSubcomponents = len(message.subcomponents) > 1
+
+    if doesMessageHaveSubcomponents:
+        if messageProcessorHooks.preFuzzSubcomponentProcess:
+            # For message with subcomponents, call prefuzz on fuzzed subcomponents
+            for j in range(0, len(message.subcomponents)):
+                subcomponent = message.subcomponents[j] 
+                # Note: we WANT to fetch subcomponents every time on purpose
+                # This way, if user alters subcomponent[0], it's reflected when
+                # we call the function for subcomponent[1], etc
+                # ExtraParams only fetches them if the callback asks for them
+                prefuzz = messageProcessor.preFuzzSubcomponentProcess(subcomponent.getAlteredByteArray(), MessageProcessorExtraParams(i, j, subcomponent.isFuzzed, message.getOriginalSubcomponents, message.getAlteredSubcomponents))
+                subcomponent.setAlteredByteArray(prefuzz)
+    elif messageProcessorHooks.preFuzzProcess:
+        # If no subcomponents, call prefuzz on ENTIRE message
+        prefuzz = messageProcessor.preFuzzProcess(message.subcomponents[0].getAlteredByteArray(), MessageProcessorExtraParams(i, -1, message.isFuzzed, message.getOriginalSubcomponents, message.getAlteredSubcomponents))
+        message.subcomponents[0].setAlteredByteArray(prefuzz)
+
+    # Skip fuzzing for seed == -1
+    if seed > -1:
+        # Now run the fuzzer for each fuzzed subcomponent
+        for j in fuzzedSubcomponentNumbers:
+            message.subcomponents[j].setAlteredByteArray(mutator.mutateSubcomponent(i, j, message, seed))
+    
+    # Fuzzing has now been done if this message is fuzzed
+    # Always call preSend() regardless for subcomponents if there are any
+    if doesMessageHaveSubcomponents and messageProcessorHooks.preSendSubcomponentProcess:
+        for j in range(0, len(message.subcomponents)):
+            subcomponent = message.subcomponents[j] 
+            # See preFuzz above - we ALWAYS regather this to catch any updates between
+            # callbacks from the user
+            presend = messageProcessor.preSendSubcomponentProcess(subcomponent.getAlteredByteArray(), MessageProcessorExtraParams(i, j, subcomponent.isFuzzed, message.getOriginalSubcomponents, message.getAlteredSubcomponents))
+            subcomponent.setAlteredByteArray(presend)
+
+    # Fix up lengths/checksums from the .fuzzer, after all subcomponent changes
+    applyFixups(fixups, message, seed)
+    
+    # Always let the user make any final modifications pre-send, fuzzed or not
+    if messageProcessorHooks.preSendProcess:
+        return messageProcessor.preSendProcess(message.getAlteredMessage(), MessageProcessorExtraParams(i, -1, message.isFuzzed, message.getOriginalSubcomponents, message.getAlteredSubcomponents))
+    if message.hasBlobs():
+        return message.getAlteredPieces()
+    return message.getAlteredMessage()
+
 # Perform a fuzz run.  
 # If seed is -1, don't perform fuzzing (test run)
 def performRun(fuzzerData, host, logger, messageProcessor, seed=-1):
     # Before doing anything, set up logger
     # Otherwise, if connection is refused, we'll log last, but it will be wrong
     if logger != None:
-        logger.resetForNewRun()
-    
-    # We don't perform DNS resolution, but always automatically type "localhost"
-    # ... really need to go ahead and add DNS resolution soon
-    if host == "localhost":
-        host = "127.0.0.1"
-    
-    # cheap testing for ipv6/ipv4/unix
-    # don't think it's worth using regex for this, since the user
-    # will have to actively go out of their way to subvert this.
-    if "." in host:
-        socket_family = socket.AF_INET
-        addr = (host,fuzzerData.port)
-    elif ":" in host:
-        socket_family = socket.AF_INET6 
-        addr = (host,fuzzerData.port)
-    else:
-        socket_family = socket.AF_UNIX
-        addr = (host)
-
-    #just in case filename is like "./asdf" !=> AF_INET
-    if "/" in host:
-        socket_family = socket.AF_UNIX
-        addr = (host)
+        logger.resetForNewRun(seed, fuzzerData.messageCollection)
+    capturedValues.resetForNewRun()
     
     # Call messageprocessor preconnect callback if it exists
-    try:
-        messageProcessor.preConnect(seed, host, fuzzerData.port) 
-    except AttributeError:
-        pass
+    # Callbacks unchanged from the default processor are skipped entirely
+    if messageProcessorHooks.preConnect:
+        messageProcessor.preConnect(seed, connectionFactory.targetAddress(), fuzzerData.port) 
     
-    # for TCP/UDP/RAW support
-    if fuzzerData.proto == "tcp":
-        connection = socket.socket(socket_family,socket.SOCK_STREAM)
-        # Don't connect yet, until after we do any binding below
-    elif fuzzerData.proto == "tls":
-        try:
-            _create_unverified_https_context = ssl._create_unverified_context
-        except AttributeError:
-            # Legacy Python that doesn't verify HTTPS certificates by default
-            pass
-        else:
-            # Handle target environment that doesn't support HTTPS verification
-            ssl._create_default_https_context = _create_unverified_https_context
-        tcpConnection = socket.socket(socket_family,socket.SOCK_STREAM)
-        connection = ssl.wrap_socket(tcpConnection)
-        # Don't connect yet, until after we do any binding below
-    elif fuzzerData.proto == "udp":
-        connection = socket.socket(socket_family,socket.SOCK_DGRAM)
-    # PROTO = dictionary of assorted L3 proto => proto number
-    # e.g. "icmp" => 1
-    elif fuzzerData.proto in PROTO:
-        connection = socket.socket(socket_family,socket.SOCK_RAW,PROTO[fuzzerData.proto]) 
-        if fuzzerData.proto != "raw":
-            connection.setsockopt(socket.IPPROTO_IP,socket.IP_HDRINCL,0)
-        addr = (host,0)
-        try:
-            connection = socket.socket(socket_family,socket.SOCK_RAW,PROTO[fuzzerData.proto]) 
-        except Exception as e:
-            print e
-            print "Unable to create raw socket, please verify that you have sudo access"
-            sys.exit(0)
-    elif fuzzerData.proto == "L2raw":
-        connection = socket.socket(socket.AF_PACKET,socket.SOCK_RAW,0x0300)
-    else:
-        addr = (host,0)
-        try:
-            #test if it's a valid number 
-            connection = socket.socket(socket_family,socket.SOCK_RAW,int(fuzzerData.proto)) 
-            connection.setsockopt(socket.IPPROTO_IP,socket.IP_HDRINCL,0)
-        except Exception as e:
-            print e
-            print "Unable to create raw socket, please verify that you have sudo access"
-            sys.exit(0)
-        
-    if fuzzerData.proto == "tcp" or fuzzerData.proto == "udp" or fuzzerData.proto == "tls":
-        # Specifying source port or address is only supported for tcp and udp currently
-        if fuzzerData.sourcePort != -1:
-            # Only support right now for tcp or udp, but bind source port address to something
-            # specific if requested
-            if fuzzerData.sourceIP != "" or fuzzerData.sourceIP != "0.0.0.0":
-                connection.bind((fuzzerData.sourceIP, fuzzerData.sourcePort))
-            else:
-                # User only specified a port, not an IP
-                connection.bind(('0.0.0.0', fuzzerData.sourcePort))
-        elif fuzzerData.sourceIP != "" and fuzzerData.sourceIP != "0.0.0.0":
-            # No port was specified, so 0 should auto-select
-            connection.bind((fuzzerData.sourceIP, 0))
-    if fuzzerData.proto == "tcp" or fuzzerData.proto == "tls":
-        # Now that we've had a chance to bind as necessary, connect
-        connection.connect(addr)
-
-    i = 0   
-    for i in range(0, len(fuzzerData.messageCollection.messages)):
-        message = fuzzerData.messageCollection.messages[i]
-        
-        # Go ahead and revert any fuzzing or messageprocessor changes before proceeding
-        message.resetAlteredMessage()
-
-        if message.isOutbound():
-            # Primarily used for deciding how to handle preFuzz/preSend callbacks
-            doesMessageHaveSubcomponents = len(message.subcomponents) > 1
-
-            # Get original subcomponents for outbound callback only once
-            originalSubcomponents = map(lambda subcomponent: subcomponent.getOriginalByteArray(), message.subcomponents)
-            
-            if doesMessageHaveSubcomponents:
-                # For message with subcomponents, call prefuzz on fuzzed subcomponents
-                for j in range(0, len(message.subcomponents)):
-                    subcomponent = message.subcomponents[j] 
-                    # Note: we WANT to fetch subcomponents every time on purpose
-                    # This way, if user alters subcomponent[0], it's reflected when
-                    # we call the function for subcomponent[1], etc
-                    actualSubcomponents = map(lambda subcomponent: subcomponent.getAlteredByteArray(), message.subcomponents)
-                    prefuzz = messageProcessor.preFuzzSubcomponentProcess(subcomponent.getAlteredByteArray(), MessageProcessorExtraParams(i, j, subcomponent.isFuzzed, originalSubcomponents, actualSubcomponents))
-                    subcomponent.setAlteredByteArray(prefuzz)
-            else:
-                # If no subcomponents, call prefuzz on ENTIRE message
-                actualSubcomponents = map(lambda subcomponent: subcomponent.getAlteredByteArray(), message.subcomponents)
-                prefuzz = messageProcessor.preFuzzProcess(actualSubcomponents[0], MessageProcessorExtraParams(i, -1, message.isFuzzed, originalSubcomponents, actualSubcomponents))
-                message.subcomponents[0].setAlteredByteArray(prefuzz)
-
-            # Skip fuzzing for seed == -1
-            if seed > -1:
-                # Now run the fuzzer for each fuzzed subcomponent
-                for subcomponent in message.subcomponents:
-                    if subcomponent.isFuzzed:
-                        radamsa = subprocess.Popen([RADAMSA, "--seed", str(seed)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        byteArray = subcomponent.getAlteredByteArray()
-                        (fuzzedByteArray, error_output) = radamsa.communicate(input=byteArray)
-                        fuzzedByteArray = bytearray(fuzzedByteArray)
-                        subcomponent.setAlteredByteArray(fuzzedByteArray)
-            
-            # Fuzzing has now been done if this message is fuzzed
-            # Always call preSend() regardless for subcomponents if there are any
-            if doesMessageHaveSubcomponents:
-                for j in range(0, len(message.subcomponents)):
-                    subcomponent = message.subcomponents[j] 
-                    # See preFuzz above - we ALWAYS regather this to catch any updates between
-                    # callbacks from the user
-                    actualSubcomponents = map(lambda subcomponent: subcomponent.getAlteredByteArray(), message.subcomponents)
-                    presend = messageProcessor.preSendSubcomponentProcess(subcomponent.getAlteredByteArray(), MessageProcessorExtraParams(i, j, subcomponent.isFuzzed, originalSubcomponents, actualSubcomponents))
-                    subcomponent.setAlteredByteArray(presend)
-            
-            # Always let the user make any final modifications pre-send, fuzzed or not
-            actualSubcomponents = map(lambda subcomponent: subcomponent.getAlteredByteArray(), message.subcomponents)
-            byteArrayToSend = messageProcessor.preSendProcess(message.getAlteredMessage(), MessageProcessorExtraParams(i, -1, message.isFuzzed, originalSubcomponents, actualSubcomponents))
-
-            if args.dumpraw:
-                loc = os.path.join(DUMPDIR,"%d-outbound-seed-%d"%(i,args.dumpraw))
-                if message.isFuzzed:
-                    loc+="-fuzzed"
-                with open(loc,"wb") as f:
-                    f.write(repr(str(byteArrayToSend))[1:-1])
-
+    # Socket family, binding and connecting are all handled by the factory
+    (connection, addr) = connectionFactory.createConnection()
+
+    # Walk the plan - messages that never change are joined the first time a
+    # run reaches them, only fuzzed/processed messages are rebuilt per seed
+    # Fuzzed runs can end early after the fuzz point, see stopAfterFuzz
+    for op in executionPlan:
+        opType = op[0]
+        i = op[1]
+        isDivergent = False
+
+        if opType == ExecutionPlan.Send:
+            byteArrayToSend = op[2]
+            if rawDumper:
+                rawDumper.dump(seed, i, True, False, byteArrayToSend)
+            sendPacket(connection, addr, byteArrayToSend)
+        elif opType == ExecutionPlan.Mutate:
+            message = op[2]
+            byteArrayToSend = buildOutboundMessage(i, message, op[3], op[4], op[5], messageProcessor, seed)
+            if rawDumper:
+                rawDumper.dump(seed, i, True, message.isFuzzed, byteArrayToSend)
             sendPacket(connection, addr, byteArrayToSend)
+        elif opType == ExecutionPlan.Pipeline:
+            # The whole unfuzzed prefix at once, see pipelinePrefix
+            if rawDumper:
+                for (j, sendData) in op[4]:
+                    rawDumper.dump(seed, j, True, False, sendData)
+            sendPacket(connection, addr, op[2])
+            expectedData = op[3]
+            data = receivePipelinedResponses(connection, len(expectedData))
+            if data == expectedData:
+                print "\tReceived expected responses"
+            else:
+                # Split by recorded length below, so logged responses may not
+                # line up with the messages they're logged against
+                print "\tReceived unexpected responses to messages 0-%d (%d bytes, expected %d)" % (i, len(data), len(expectedData))
+            # Responses are split up by their recorded lengths for logging
+            for (j, response) in ExecutionPlan.splitResponses(op, data):
+                if logger != None:
+                    logger.setReceivedMessageData(j, response)
+                if rawDumper:
+                    rawDumper.dump(seed, j, False, False, response)
         else: 
             # Receiving packet from server
-            messageByteArray = message.getAlteredMessage()
-            data = receivePacket(connection,addr,len(messageByteArray))
+            # Inbound messages are never altered, so this is the cached original
+            messageByteArray = op[2]
+            data = receivePacket(connection,addr,op[3],op[5] or DEFAULT_RECEIVE_OPTIONS)
             if data == messageByteArray:
                 print "\tReceived expected response"
+            elif seed != -1 and executionPlan.stopOnDivergence and i > executionPlan.fuzzPoint:
+                isDivergent = True
             if logger != None:
                 logger.setReceivedMessageData(i, data)
+            if op[4]:
+                capturedValues.capture(i, data)
         
-            messageProcessor.postReceiveProcess(data, MessageProcessorExtraParams(i, -1, False, [messageByteArray], [data]))
+            if messageProcessorHooks.postReceiveProcess:
+                messageProcessor.postReceiveProcess(data, MessageProcessorExtraParams(i, -1, False, [messageByteArray], [data], messageByteArray))
 
-            if args.dumpraw:
-                loc = os.path.join(DUMPDIR,"%d-inbound-seed-%d"%(i,args.dumpraw))
-                with open(loc,"wb") as f:
-                    f.write(repr(str(data))[1:-1])
+            if rawDumper:
+                rawDumper.dump(seed, i, False, False, data)
 
         if logger != None:  
             logger.setHighestMessageNumber(i)
-        
 
-        i += 1
+        if seed != -1 and (isDivergent or i == executionPlan.stopAfter):
+            print "\tEnding run early after message %d" % (i)
+            break
     
     connection.close()
 
@@ -311,14 +287,31 @@ parser = argparse.ArgumentParser(description=desc,epilog=epi)
 parser.add_argument("prepped_fuzz", help="Path to file.fuzzer")
 parser.add_argument("target_host", help="Target to fuzz")
 parser.add_argument("-s","--sleeptime",help="Time to sleep between fuzz cases (float)",type=float,default=0)
+pacing = parser.add_argument_group("pacing")
+pacing.add_argument("--rate",help="Maximum fuzz cases per second (float), 0 for unlimited",type=float,default=0)
+pacing.add_argument("--connrate",help="Maximum connections per second (float), 0 for unlimited",type=float,default=0)
+pacing.add_argument("--burst",help="How many cases/connections may go back-to-back after being idle",type=int,default=1)
+pacing.add_argument("--jitter",help="Add up to this many seconds of random delay before each case (float)",type=float,default=0)
+pacing.add_argument("--rateshare",help="State file to share --rate/--connrate limits with other Mutiny instances")
+autotune = parser.add_argument_group("autotune")
+autotune.add_argument("--autotune",help="Pick receiveTimeout and --rate from this many unfuzzed test runs per step before fuzzing, never going above the .fuzzer receiveTimeout or --rate",type=int,default=0)
+autotune.add_argument("--autotuneEvery",help="Repeat autotuning every this many cases",type=int,default=0)
+autotune.add_argument("--autotuneMaxFail",help="Highest acceptable fraction of test runs timing out or failing (float)",type=float,default=0.01)
+parser.add_argument("--prefetch",help="Fuzz up to this many cases ahead on a background thread",type=int,default=0)
+parser.add_argument("--truncate",help="End each run this many responses after the last fuzzed message, skipping the rest of the conversation",type=int)
 seed_constraint = parser.add_mutually_exclusive_group()
 seed_constraint.add_argument("-r", "--range", help="Run only the specified cases. Acceptable arg formats: [ X | X- | X-Y ], for integers X,Y") 
 seed_constraint.add_argument("-l", "--loop", help="Loop/repeat the given finite number range. Acceptible arg format: [ X | X-Y | X,Y,Z-Q,R | ...]")
-seed_constraint.add_argument("-d", "--dumpraw", help="Test single seed, dump to 'dumpraw' folder",type=int)
+seed_constraint.add_argument("-d", "--dumpraw", help="Run only the given seeds and dump their messages, to the log folder or 'dumpraw' folder with -q. Acceptable arg formats: [ X | X- | X-Y ]")
+parser.add_argument("--dumpArchive", help="Dump the actual bytes of --dumpraw messages into this .zip, .tar, .tar.gz/.tgz or .tar.bz2 instead of a folder")
 
 verbosity = parser.add_mutually_exclusive_group()
 verbosity.add_argument("-q", "--quiet", help="Don't log the outputs",action="store_true")
 verbosity.add_argument("--logAll", help="Log all the outputs",action="store_true")
+parser.add_argument("--campaignLog", help="Log to one binary campaign log instead of a file per run, read it with util/campaign_log.py",action="store_true")
+parser.add_argument("--logLast", help="How many runs before the current one to log when a crash is only noticed later (LogLastAndHalt, late monitor crash events)",type=int,default=1)
+parser.add_argument("--logQueue", help="Write logs on a background thread, queueing up to this many runs, 0 to write them in the fuzz loop",type=int,default=0)
+parser.add_argument("--logQueuePolicy", help="When the log queue is full, block the fuzz loop or drop --logAll logs (crash logs always block)",choices=[AsyncLogWriter.Policy.Block, AsyncLogWriter.Policy.Drop],default=AsyncLogWriter.Policy.Block)
 
 args = parser.parse_args()
 
@@ -348,6 +341,8 @@ if args.range:
     (MIN_RUN_NUMBER, MAX_RUN_NUMBER) = getRunNumbersFromArgs(args.range)
 elif args.loop:
     SEED_LOOP = validateNumberRange(args.loop,True) 
+elif args.dumpraw:
+    (MIN_RUN_NUMBER, MAX_RUN_NUMBER) = getRunNumbersFromArgs(args.dumpraw)
 
 #Check for dependency binaries
 if not os.path.exists(RADAMSA):
@@ -376,6 +371,21 @@ optionDict = {"unfuzzedBytes":{}, "message":[]}
 fuzzerData = FuzzerData()
 print "Reading in fuzzer data from %s..." % (fuzzerFilePath)
 fuzzerData.readFromFile(fuzzerFilePath)
+if args.truncate != None:
+    droppedCount = fuzzerData.truncateAfterFuzzed(args.truncate)
+    print "Truncated conversation to %d messages, dropped %d" % (len(fuzzerData.messageCollection.messages), droppedCount)
+
+# Source addresses to rotate through, if the .fuzzer asks for it
+sourceAddressPool = None
+if fuzzerData.sourceIPPool:
+    sourceAddressPool = SourceAddressPool(fuzzerData.sourceIPPool, fuzzerData.sourceIPPoolMode)
+    print "Binding to %d source addresses, rotating per %s" % (sourceAddressPool.size, sourceAddressPool.mode)
+
+# Rate limiting for runs and connections
+pacer = Pacer(args.rate, args.connrate, args.burst, args.jitter, args.sleeptime, args.rateshare)
+
+# Resolve the target and work out socket parameters once for the whole session
+connectionFactory = ConnectionFactory(fuzzerData, host, sourceAddressPool, fuzzerFolder, pacer)
 
 ######## Processor Setup ################
 # The processor just acts as a container #
@@ -408,22 +418,52 @@ logger = None
 
 if not isReproduce:
     print "Logging to %s" % (outputDataFolderPath)
-    logger = Logger(outputDataFolderPath)
+    logger = Logger(outputDataFolderPath, args.campaignLog, args.logQueue, args.logQueuePolicy, args.logLast)
+    # Every halt ends in exit(), so this writes out anything still queued
+    atexit.register(logger.flush)
 
 if args.dumpraw:
-    if not isReproduce:
-        DUMPDIR = outputDataFolderPath
+    if args.dumpArchive:
+        dumpPath = args.dumpArchive
+    elif not isReproduce:
+        dumpPath = outputDataFolderPath
     else:
-        DUMPDIR = "dumpraw"
+        dumpPath = "dumpraw"
         try:
             os.mkdir("dumpraw")
         except:
             print "Unable to create dumpraw dir"
             pass
-    
+    rawDumper = RawDumper(dumpPath)
+    # Finishes the archive too, which isn't readable until then
+    atexit.register(rawDumper.close)
+
 
 exceptionProcessor = procDirector.exceptionProcessor()
 messageProcessor = procDirector.messageProcessor()
+messageProcessorHooks = procDirector.messageProcessorHooks
+
+# Compile the conversation once, now that we know which callbacks are used
+capturedValues = CapturedValues(fuzzerData.captures, fuzzerData.messageCollection)
+executionPlan = ExecutionPlan(fuzzerData, messageProcessorHooks, capturedValues)
+if executionPlan.stopAfter != None:
+    print "Fuzzed runs end after message %d" % (executionPlan.stopAfter)
+elif executionPlan.stopOnDivergence:
+    print "Fuzzed runs end at the first response after message %d that differs from the recording" % (executionPlan.fuzzPoint)
+if executionPlan.pipelineOp != None:
+    print "Pipelining messages 0-%d" % (executionPlan.pipelineOp[1])
+elif fuzzerData.pipelinePrefix:
+    print "Not pipelining, pipelinePrefix needs tcp/tls, no postReceiveProcess() and a response followed by unaltered messages"
+batchProcess = messageProcessor.postFuzzBatchProcess if messageProcessorHooks.postFuzzBatchProcess else None
+# Mutations can only be done ahead of time if the data going into Radamsa
+# is the same every run, so not if preFuzz callbacks or captures change it
+if args.prefetch > 0 and not args.dumpraw and not (messageProcessorHooks.preFuzzSubcomponentProcess or messageProcessorHooks.preFuzzProcess or executionPlan.fuzzesSubstitutedData):
+    mutator = PrefetchingMutator(RADAMSA, executionPlan, args.prefetch, batchProcess)
+    atexit.register(mutator.close)
+else:
+    if args.prefetch > 0 and not args.dumpraw:
+        print "Not prefetching mutations, preFuzz callbacks or captures change the data to fuzz each run"
+    mutator = RadamsaMutator(RADAMSA, batchProcess)
 
 # Set up signal handler for CTRL+C and signals from child monitor thread
 # since this is the same signal, we use the monitor.crashEvent flag()
@@ -437,22 +477,37 @@ def sigint_handler(signal, frame):
 
 signal.signal(signal.SIGINT, sigint_handler)
 
+########## Autotune receiveTimeout/rate if requested
+def runAutotune():
+    autotuner.tune(lambda: performRun(fuzzerData, host, None, messageProcessor, seed=-1), fuzzerData, pacer)
+
+autotuner = None
+if args.autotune > 0:
+    autotuner = Autotuner(args.autotune, args.autotuneMaxFail, "%s.autotune" % (os.path.splitext(fuzzerFilePath)[0]))
+    runAutotune()
+casesSinceAutotune = 0
+
 ########## Begin fuzzing
-i = MIN_RUN_NUMBER-1 if fuzzerData.shouldPerformTestRun else MIN_RUN_NUMBER
+i = MIN_RUN_NUMBER-1 if fuzzerData.shouldPerformTestRun and not args.dumpraw else MIN_RUN_NUMBER
 failureCount = 0
 loop_len = len(SEED_LOOP) # if --loop
 
 while True:
-    lastMessageCollection = deepcopy(fuzzerData.messageCollection)
     wasCrashDetected = False
-    print "\n** Sleeping for %.3f seconds **" % args.sleeptime
-    time.sleep(args.sleeptime)
+    if autotuner and args.autotuneEvery > 0 and casesSinceAutotune >= args.autotuneEvery:
+        runAutotune()
+        casesSinceAutotune = 0
+    casesSinceAutotune += 1
+
+    if DEBUG_MODE and args.sleeptime:
+        print "\n** Sleeping for %.3f seconds **" % args.sleeptime
+    pacer.waitForRun()
     
     try:
         try:
             if args.dumpraw:
-                print "\n\nPerforming single raw dump case: %d" % args.dumpraw
-                performRun(fuzzerData, host, logger, messageProcessor, seed=args.dumpraw)  
+                print "\n\nPerforming raw dump case: %d" % (i)
+                performRun(fuzzerData, host, logger, messageProcessor, seed=i)  
             elif i == MIN_RUN_NUMBER-1:
                 print "\n\nPerforming test run without fuzzing..."
                 performRun(fuzzerData, host, logger, messageProcessor, seed=-1) 
@@ -465,7 +520,7 @@ while True:
             #if --quiet, (logger==None) => AttributeError
             if logAll:
                 try:
-                    logger.outputLog(i, fuzzerData.messageCollection, "LogAll ")
+                    logger.outputLog(i, fuzzerData.messageCollection, "LogAll ", isDroppable=True)
                 except AttributeError:
                     pass
                  
@@ -474,6 +529,10 @@ while True:
                 print "Crash event detected"
                 try:
                     logger.outputLog(i, fuzzerData.messageCollection, "Crash event detected")
+                    # The monitor can notice a crash a few runs late, so
+                    # log the runs before this one too if asked to
+                    if logger.historySize > 1 and i > MIN_RUN_NUMBER:
+                        logger.outputLastLog(i-1, fuzzerData.messageCollection, "Crash event detected")
                     #exit()
                 except AttributeError: 
                     pass
@@ -481,7 +540,7 @@ while True:
 
             elif logAll:
                 try:
-                    logger.outputLog(i, fuzzerData.messageCollection, "LogAll ")
+                    logger.outputLog(i, fuzzerData.messageCollection, "LogAll ", isDroppable=True)
                 except AttributeError:
                     pass
             
@@ -504,7 +563,7 @@ while True:
 
         if logAll:
             try:
-                logger.outputLog(i, fuzzerData.messageCollection, "LogAll ")
+                logger.outputLog(i, fuzzerData.messageCollection, "LogAll ", isDroppable=True)
             except AttributeError:
                 pass
 
@@ -536,10 +595,10 @@ while True:
                 print "Received LogLastAndHaltException, logging last run and halting"
                 if MIN_RUN_NUMBER == MAX_RUN_NUMBER:
                     #in case only 1 case is run
-                    logger.outputLastLog(i, lastMessageCollection, str(e))
+                    logger.outputLastLog(i, fuzzerData.messageCollection, str(e))
                     print "Logged case %d" % i
                 else:
-                    logger.outputLastLog(i-1, lastMessageCollection, str(e))
+                    logger.outputLastLog(i-1, fuzzerData.messageCollection, str(e))
             else:
                 print "Received LogLastAndHaltException, skipping logging (due to last run being a test run) and halting"
         else:
@@ -565,7 +624,4 @@ while True:
     # Stop if we have a maximum and have hit it
     if MAX_RUN_NUMBER >= 0 and i > MAX_RUN_NUMBER:
         exit()
-
-    if args.dumpraw:
-        exit()
         
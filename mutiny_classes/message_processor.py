@@ -49,7 +49,7 @@ from mutiny_classes.mutiny_exceptions import *
 # Do not bother this here, as only the base mutiny_classes version will get
 # imported by design
 class MessageProcessorExtraParams(object):
-    def __init__(self, messageNumber, subcomponentNumber, isFuzzed, originalSubcomponents, actualSubcomponents):
+    def __init__(self, messageNumber, subcomponentNumber, isFuzzed, originalSubcomponents, actualSubcomponents, originalMessage=None):
         # Which message number this is in the .fuzzer file list, 0-indexed
         self.messageNumber = messageNumber
         
@@ -61,17 +61,45 @@ class MessageProcessorExtraParams(object):
         self.isFuzzed = isFuzzed
         
         # List of subcomponent data as they are recorded in the .fuzzer file
-        self.originalSubcomponents = originalSubcomponents
+        # Can also be a function returning the list, like actualSubcomponents
+        self._originalSubcomponents = originalSubcomponents
         
         # List of subcomponent data as it was actually received or will be
         # transmitted after fuzzing
-        self.actualSubcomponents = actualSubcomponents
+        # Mutiny may pass a function returning the list instead, so it's
+        # only built if the processor actually looks at it
+        self._actualSubcomponents = actualSubcomponents
 
-        # Convenience variable that is literally just all the originalSubcomponents combined
-        self.originalMessage = bytearray().join(self.originalSubcomponents)
-        
-        # Convenience variable that is literally just all the actualSubcomponents combined
-        self.actualMessage = bytearray().join(self.actualSubcomponents)
+        # Joined versions of the above, built on first use unless
+        # Mutiny already has originalMessage on hand
+        self._originalMessage = originalMessage
+        self._actualMessage = None
+
+    @property
+    def originalSubcomponents(self):
+        if callable(self._originalSubcomponents):
+            self._originalSubcomponents = self._originalSubcomponents()
+        return self._originalSubcomponents
+
+    @property
+    def actualSubcomponents(self):
+        if callable(self._actualSubcomponents):
+            self._actualSubcomponents = self._actualSubcomponents()
+        return self._actualSubcomponents
+
+    # Convenience variable that is literally just all the originalSubcomponents combined
+    @property
+    def originalMessage(self):
+        if self._originalMessage is None:
+            self._originalMessage = bytearray().join(self.originalSubcomponents)
+        return self._originalMessage
+
+    # Convenience variable that is literally just all the actualSubcomponents combined
+    @property
+    def actualMessage(self):
+        if self._actualMessage is None:
+            self._actualMessage = bytearray().join(self.actualSubcomponents)
+        return self._actualMessage
 
 class MessageProcessor(object):
     def __init__(self):
@@ -101,6 +129,20 @@ class MessageProcessor(object):
     def preFuzzProcess(self, message, extraParams):
         return message
 
+    # payloads = list of fuzzed versions of one subcomponent, one per seed,
+    # for consecutive seeds
+    # Called right after fuzzing for every fuzzed subcomponent, before
+    # preSendSubcomponentProcess()/preSendProcess()
+    # Meant for fixups that only depend on the fuzzed data itself (length
+    # fields, checksums), which can then be done for many seeds at once
+    # With --prefetch, this runs ahead of time on the mutator thread, so it
+    # must not depend on anything from the current run (postReceiveStore etc)
+    # extraParams contains MessageProcessorExtraParams based on the Message this
+    # is a subcomponent for, with actualSubcomponents being the originals
+    # Return a list of the same length with any required modifications made
+    def postFuzzBatchProcess(self, payloads, extraParams):
+        return payloads
+
     # subcomponent = subcomponent of message about to be sent
     # Will not be called if message has no subcomponents
     # extraParams contains MessageProcessorExtraParams based on the Message this
@@ -49,6 +49,11 @@ parser.add_argument("-f", "--force",
                     action = "store_true",  
                     default=False) 
 
+parser.add_argument("-e", "--encoding",
+                    help="How to write message data in the .fuzzer, hex or base64 are more compact for binary protocols",
+                    choices=["escaped", "hex", "base64"],
+                    default="escaped")
+
 args = parser.parse_args()
 inputFilePath = args.pcap_file
 
@@ -271,6 +276,9 @@ if fuzzerData.proto == "manual":
 # Port number to connect on
 fuzzerData.port = promptInt("What port should the fuzzer %s?" % ("connect to"), defaultResponse=defaultPort) if not args.force else defaultPort
 
+# How message data is written out
+fuzzerData.setEncoding(args.encoding)
+
 # How many of the messages to output to the .fuzzer
 default = len(fuzzerData.messageCollection.messages)-1
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test source address pools and their rotation modes
+#
+#------------------------------------------------------------------
+
+import os
+import socket
+import sys
+sys.path.append("../..")
+from backend.address_pool import SourceAddressPool
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+def testRotation(name, poolStr, mode, family, count, expected, expectedSize):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        pool = SourceAddressPool(poolStr, mode)
+        actual = [pool.nextAddress(family) for _ in range(count)]
+        size = pool.size
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+        size = None
+    print("\tExpected: {0}, size {1}".format(expected, expectedSize))
+    print("\t  Actual: {0}, size {1}".format(actual, size))
+    printResult(name, actual == expected and size == expectedSize)
+
+def main():
+    Connection = SourceAddressPool.Mode.Connection
+    Worker = SourceAddressPool.Mode.Worker
+
+    # Network and broadcast addresses are skipped, then it wraps around
+    testRotation("IPv4 Per Connection", "10.0.0.8/30,10.0.1.1", Connection, socket.AF_INET, 4, ["10.0.0.9", "10.0.0.10", "10.0.1.1", "10.0.0.9"], 3)
+    # The same address every time, picked by pid
+    workerAddress = ["10.0.0.9", "10.0.0.10", "10.0.1.1"][os.getpid() % 3]
+    testRotation("IPv4 Per Worker", "10.0.0.8/30,10.0.1.1", Worker, socket.AF_INET, 3, [workerAddress] * 3, 3)
+
+    # Far too many addresses for an int, and the network address is skipped
+    testRotation("IPv6 Per Connection", "fd00::/64", Connection, socket.AF_INET6, 3, ["fd00::1", "fd00::2", "fd00::3"], 2**64 - 1)
+    workerIndex = os.getpid() % (2**64 - 1)
+    testRotation("IPv6 Per Worker", "fd00::/64", Worker, socket.AF_INET6, 2, ["fd00::%x" % (workerIndex + 1)] * 2, 2**64 - 1)
+    testRotation("IPv6 /127", "fd00::/127", Connection, socket.AF_INET6, 3, ["fd00::", "fd00::1", "fd00::"], 2)
+
+    # Mixed pools rotate each family separately and have nothing for the other
+    testRotation("Mixed Families", "10.0.0.1,fd00::5", Connection, socket.AF_INET6, 2, ["fd00::5", "fd00::5"], 2)
+    testRotation("No Matching Family", "fd00::5", Connection, socket.AF_INET, 1, [None], 1)
+
+if __name__ == "__main__":
+    main()
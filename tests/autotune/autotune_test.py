@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test autotuning against a fake target and pacer
+#
+#------------------------------------------------------------------
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+sys.path.append("../..")
+from backend.autotune import Autotuner
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# Records rate changes without ever waiting
+class FakePacer(object):
+    def __init__(self, runRate):
+        self.runRate = runRate
+        self.rates = []
+
+    def getRunRate(self):
+        return self.runRate
+
+    def setRunRate(self, runRate):
+        self.runRate = runRate
+        self.rates.append(runRate)
+
+    def waitForRun(self):
+        pass
+
+class FakeFuzzerData(object):
+    def __init__(self, receiveTimeout):
+        self.receiveTimeout = receiveTimeout
+
+# A target that times out unless the rate limit is at most maxRate (0 = never
+# times out), and otherwise answers after latency seconds
+def makeRunOnce(autotuner, pacer, maxRate, latency):
+    def runOnce():
+        if maxRate and (pacer.runRate == 0 or pacer.runRate > maxRate):
+            raise socket.timeout("timed out")
+        autotuner.recordReceive(latency)
+    return runOnce
+
+def testTune(name, ceilingRate, maxRate, expectedRate, expectedTimeout):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    folderPath = tempfile.mkdtemp()
+    try:
+        autotuner = Autotuner(20, 0.01, os.path.join(folderPath, "test.autotune"))
+        pacer = FakePacer(ceilingRate)
+        fuzzerData = FakeFuzzerData(2.0)
+        autotuner.tune(makeRunOnce(autotuner, pacer, maxRate, 0.1), fuzzerData, pacer)
+        # Tuning again starts from the same ceilings, not the last result
+        autotuner.tune(makeRunOnce(autotuner, pacer, maxRate, 0.1), fuzzerData, pacer)
+        highestRate = max(pacer.rates)
+        print("\tExpected: rate {0}, receiveTimeout {1}, never above {2}".format(expectedRate, expectedTimeout, ceilingRate))
+        print("\t  Actual: rate {0}, receiveTimeout {1}, rates tried {2}".format(pacer.runRate, fuzzerData.receiveTimeout, pacer.rates))
+        isPass = abs(pacer.runRate - expectedRate) < 0.0001 and abs(fuzzerData.receiveTimeout - expectedTimeout) < 0.0001
+        if ceilingRate:
+            isPass = isPass and highestRate <= ceilingRate and 0 not in pacer.rates
+        printResult(name, isPass)
+    finally:
+        shutil.rmtree(folderPath)
+
+def main():
+    # Responses at 0.1s give a receiveTimeout of 0.15 with the default margin
+    testTune("Unlimited Target", 0, 0, 0, 0.15)
+    testTune("Ceiling Kept", 10, 0, 10, 0.15)
+    # The fake pacer doesn't wait, so the achieved rate is capped by the ceiling first
+    testTune("Backing Off Below Ceiling", 100, 30, 25, 0.15)
+    # No rate works, so the ceiling is restored and receiveTimeout left alone
+    testTune("No Working Rate", 100, 0.0001, 100, 2.0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test writing and reading back binary campaign logs
+#
+#------------------------------------------------------------------
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+sys.path.append("../..")
+from backend.campaign_log import CampaignLogWriter, CampaignLogReader, INDEX_NAME, SEGMENT_NAME, parseSeedRange
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+def describe(record):
+    return (record.seed, record.startTime, record.endTime, record.highestMessageNumber, record.errorMessage, [(m, s, str(a)) for (m, s, a) in record.alteredState], dict((m, str(d)) for (m, d) in record.receivedMessageData.items()))
+
+def testParseSeedRange(seedsStr, expected):
+    print("\n{}Testing seed range '{}'...{}".format(Color.BOLD, seedsStr, Color.END))
+    try:
+        actual = parseSeedRange(seedsStr)
+    except RuntimeError as e:
+        print("\tError: {0}".format(str(e)))
+        actual = "error"
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult("Seed Range '{0}'".format(seedsStr), actual == expected)
+
+# Seeds util/campaign_log.py lists from folderPath with args
+def listSeeds(folderPath, args):
+    output = subprocess.check_output([sys.executable, "../../util/campaign_log.py", "list", folderPath] + args)
+    return [int(line.split()[1]) for line in output.splitlines()]
+
+def main():
+    testParseSeedRange("5", (5, 5))
+    testParseSeedRange("2-7", (2, 7))
+    testParseSeedRange("-1", (-1, -1))
+    testParseSeedRange("-1-3", (-1, 3))
+    testParseSeedRange("-5--2", (-5, -2))
+    testParseSeedRange("1-", "error")
+    testParseSeedRange("x", "error")
+
+    folderPath = tempfile.mkdtemp()
+    try:
+        print("\n{}Testing records across segments...{}".format(Color.BOLD, Color.END))
+        # Small segments so a few records are enough to start new ones
+        writer = CampaignLogWriter(folderPath, segmentSize=200)
+        expected = {}
+        for seed in range(10):
+            alteredState = [(2, 0, bytearray("fuzzed %d \x00\xff" % (seed)))] if seed % 3 else []
+            receivedMessageData = {1: bytearray("reply %d\n" % (seed)), 3: bytearray()}
+            writer.append(seed, 1000.5 + seed, 1001.25 + seed, 3, "LogAll ", alteredState, receivedMessageData)
+            expected[seed] = (seed, 1000.5 + seed, 1001.25 + seed, 3, "LogAll ", [(m, s, str(a)) for (m, s, a) in alteredState], dict((m, str(d)) for (m, d) in receivedMessageData.items()))
+        # Logging a seed again, the latest record should win
+        writer.append(4, 2000.0, 2001.0, -1, "Crash event detected", [], {})
+        expected[4] = (4, 2000.0, 2001.0, -1, "Crash event detected", [], {})
+        writer.close()
+
+        reader = CampaignLogReader(folderPath)
+        actual = dict((seed, describe(reader.getRecord(seed))) for seed in reader.getSeeds())
+        print("\tSegments: {0}".format(len([name for name in os.listdir(folderPath) if name != INDEX_NAME])))
+        print("\tExpected: {0}".format(expected))
+        print("\t  Actual: {0}".format(actual))
+        printResult("Records Across Segments", actual == expected and os.path.exists(os.path.join(folderPath, SEGMENT_NAME % (1))))
+
+        print("\n{}Testing a partial index entry...{}".format(Color.BOLD, Color.END))
+        with open(os.path.join(folderPath, INDEX_NAME), "ab") as indexFile:
+            indexFile.write("\x01\x02\x03")
+        reader = CampaignLogReader(folderPath)
+        printResult("Partial Index Entry", reader.getSeeds() == range(10))
+    finally:
+        shutil.rmtree(folderPath)
+
+    # The test run is logged as seed -1, and has to be selectable too
+    print("\n{}Testing listing seeds with -s...{}".format(Color.BOLD, Color.END))
+    folderPath = tempfile.mkdtemp()
+    try:
+        writer = CampaignLogWriter(folderPath)
+        for seed in range(-1, 5):
+            writer.append(seed, 1000.0 + seed, 1000.5 + seed, 3, "LogAll ", [], {})
+        writer.close()
+        expected = [[-1], [-1, 0, 1, 2], [3, 4]]
+        actual = [listSeeds(folderPath, args) for args in (["-s", "-1"], ["-s=-1-2"], ["-s", "3-4"])]
+        print("\tExpected: {0}".format(expected))
+        print("\t  Actual: {0}".format(actual))
+        printResult("List Seeds", actual == expected)
+    finally:
+        shutil.rmtree(folderPath)
+
+if __name__ == "__main__":
+    main()
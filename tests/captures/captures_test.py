@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test .fuzzer capture rules and ${name} substitution
+#
+#------------------------------------------------------------------
+
+import sys
+from StringIO import StringIO
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.captures import CapturedValues
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+FUZZER = """outbound 'auth\\n'
+inbound 'session 92 user bob\\n'
+capture session regex 'session ([0-9]+)'
+capture user 16-18
+outbound 'do_stuff ${session} ${user} ${unknown}\\n'
+inbound 'OK\\n'
+"""
+
+def testSubstitution(name, capturedValues, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    actual = capturedValues.substitute(bytearray("do_stuff ${session} ${user} ${unknown}\n"))
+    print("\tExpected: {0}".format(repr(str(expected))))
+    print("\t  Actual: {0}".format(repr(str(actual))))
+    printResult(name, actual == expected)
+
+def main():
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFD(StringIO(FUZZER), quiet=True)
+    capturedValues = CapturedValues(fuzzerData.captures, fuzzerData.messageCollection)
+
+    # Before anything is received, values come from the recorded conversation
+    testSubstitution("Recorded Defaults", capturedValues, bytearray("do_stuff 92 bob ${unknown}\n"))
+
+    capturedValues.capture(1, bytearray("session 55 user amy\n"))
+    testSubstitution("Captured Values", capturedValues, bytearray("do_stuff 55 amy ${unknown}\n"))
+
+    # Data that doesn't match leaves the last value alone
+    capturedValues.capture(1, bytearray("no\n"))
+    testSubstitution("Unmatched Capture", capturedValues, bytearray("do_stuff 55 amy ${unknown}\n"))
+
+    capturedValues.resetForNewRun()
+    testSubstitution("Reset For New Run", capturedValues, bytearray("do_stuff 92 bob ${unknown}\n"))
+
+    print("\n{}Testing Capture Serialization...{}".format(Color.BOLD, Color.END))
+    output = StringIO()
+    fuzzerData.writeToFD(output)
+    print(output.getvalue())
+    printResult("Capture Serialization", FUZZER in output.getvalue())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test how ConnectionFactory picks socket families and source addresses,
+# and how long it keeps a resolved target
+#
+#------------------------------------------------------------------
+
+import socket
+import ssl
+import sys
+import threading
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.address_pool import SourceAddressPool
+from backend.connection_factory import ConnectionFactory, OP_NO_TICKET
+
+# Self-signed certificate and key for the TLS end of the tests
+TLS_CERT = "../tls_test.pem"
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# settings - FuzzerData attributes to change from the defaults
+def makeFuzzerData(settings):
+    fuzzerData = FuzzerData()
+    fuzzerData.port = 2500
+    for (attribute, value) in settings.items():
+        setattr(fuzzerData, attribute, value)
+    return fuzzerData
+
+# expected - (family, socket type, proto, addr, bind address) the factory settles on
+def testSocketArgs(name, host, settings, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        factory = ConnectionFactory(makeFuzzerData(settings), host)
+        actual = factory._socketArgs + (factory.addr, factory._nextBindAddress())
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# Counts getaddrinfo() calls, answering with each of results in turn
+class FakeGetAddrInfo(object):
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def __call__(self, host, port, family, socketType):
+        result = self.results[min(self.calls, len(self.results) - 1)]
+        self.calls += 1
+        return [result]
+
+# expected - whether IP_HDRINCL is cleared on raw sockets for each of protos
+def testHeaderInclude(name, host, protos, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        actual = [ConnectionFactory(makeFuzzerData({"proto": proto}), host)._clearHeaderInclude for proto in protos]
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# The factory resolves once when it's created, then resolve() is called 3 more times
+def testResolveTTL(name, resolveTTL, expectedCalls, expectedFamily):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    fakeGetAddrInfo = FakeGetAddrInfo([
+        (socket.AF_INET, socket.SOCK_STREAM, 0, "", ("10.0.0.1", 2500)),
+        (socket.AF_INET6, socket.SOCK_STREAM, 0, "", ("fd00::1", 2500, 0, 0)),
+    ])
+    realGetAddrInfo = socket.getaddrinfo
+    socket.getaddrinfo = fakeGetAddrInfo
+    try:
+        factory = ConnectionFactory(makeFuzzerData({"resolveTTL": resolveTTL}), "target.example")
+        families = [factory.resolve()[0] for _ in range(3)]
+        # A new family has to rebuild the socket arguments too
+        actual = (fakeGetAddrInfo.calls, families[-1], factory._socketArgs[0])
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    finally:
+        socket.getaddrinfo = realGetAddrInfo
+    expected = (expectedCalls, expectedFamily, expectedFamily)
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# Accepts TLS connections on listener, recording (SNI name, ALPN protocol,
+# cipher) as the server sees them for each
+def serveTLS(listener, connections, seen):
+    context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    context.load_cert_chain(TLS_CERT)
+    # So the client's cipher list decides the cipher
+    context.options |= ssl.OP_NO_TLSv1_3
+    context.set_alpn_protocols(["h2", "http/1.1"])
+    serverNames = []
+    context.set_servername_callback(lambda sslSocket, serverName, sslContext: serverNames.append(serverName))
+    for _ in range(connections):
+        (connection, _) = listener.accept()
+        try:
+            connection = context.wrap_socket(connection, server_side=True)
+            seen.append((serverNames.pop() if serverNames else None, connection.selected_alpn_protocol(), connection.cipher()[0]))
+        except Exception as e:
+            seen.append(str(e))
+        connection.close()
+
+# expected - (what the server saw on the first connection, whether OP_NO_TICKET is set, handshakes counted)
+# The cipher is only checked with tlsCiphers set, otherwise it's up to the OpenSSL build
+def testTLS(name, host, settings, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+    seen = []
+    thread = threading.Thread(target=serveTLS, args=(listener, 2, seen))
+    thread.start()
+    try:
+        settings = dict(settings, proto="tls", port=listener.getsockname()[1])
+        factory = ConnectionFactory(makeFuzzerData(settings), host)
+        for _ in range(2):
+            (connection, addr) = factory.createConnection()
+            connection.close()
+        thread.join()
+        (serverName, alpn, cipher) = seen[0]
+        if not settings.get("tlsCiphers"):
+            cipher = None
+        actual = ((serverName, alpn, cipher), bool(factory._tlsContext.options & OP_NO_TICKET), factory.tlsStats.handshakes)
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    finally:
+        listener.close()
+        thread.join()
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+def main():
+    AF_INET = socket.AF_INET
+    AF_INET6 = socket.AF_INET6
+    STREAM = socket.SOCK_STREAM
+    DGRAM = socket.SOCK_DGRAM
+    RAW = socket.SOCK_RAW
+
+    testSocketArgs("IPv4 TCP", "127.0.0.1", {}, (AF_INET, STREAM, 0, ("127.0.0.1", 2500), None))
+    testSocketArgs("IPv6 UDP", "::1", {"proto": "udp"}, (AF_INET6, DGRAM, 0, ("::1", 2500, 0, 0), None))
+    # Names with both families keep meaning IPv4
+    testSocketArgs("Localhost", "localhost", {}, (AF_INET, STREAM, 0, ("127.0.0.1", 2500), None))
+    testSocketArgs("Domain Socket", "/tmp/mutiny.sock", {}, (socket.AF_UNIX, STREAM, 0, "/tmp/mutiny.sock", None))
+    # Raw sockets have no port, and never bind
+    testSocketArgs("Raw ICMP", "127.0.0.1", {"proto": "icmp", "sourceIP": "127.0.0.2"}, (AF_INET, RAW, 1, ("127.0.0.1", 0), None))
+    testSocketArgs("Raw Number", "127.0.0.1", {"proto": "50"}, (AF_INET, RAW, 50, ("127.0.0.1", 0), None))
+    testSocketArgs("Layer 2", "lo", {"proto": "L2raw"}, (socket.AF_PACKET, RAW, 0x0300, ("lo", 0), None))
+
+    testSocketArgs("Bind Source IP", "127.0.0.1", {"sourceIP": "127.0.0.2"}, (AF_INET, STREAM, 0, ("127.0.0.1", 2500), ("127.0.0.2", 0)))
+    testSocketArgs("Bind Source Port", "127.0.0.1", {"proto": "udp", "sourcePort": 5000}, (AF_INET, DGRAM, 0, ("127.0.0.1", 2500), ("0.0.0.0", 5000)))
+
+    # Only numbered protocols over IPv4 clear IP_HDRINCL
+    testHeaderInclude("IPv4 Header Include", "127.0.0.1", ["tcp", "icmp", "50", "L2raw"], [False, False, True, False])
+    testHeaderInclude("IPv6 Header Include", "::1", ["ipv6-icmp", "50"], [False, False])
+
+    testResolveTTL("Resolve Cached For TTL", 60.0, 1, AF_INET)
+    testResolveTTL("Resolve Every Time With No TTL", 0.0, 4, AF_INET6)
+
+    # Real connections, rotating through the pool for the target's family
+    # and falling back to sourceIP when the pool has nothing for it
+    print("\n{}Testing source address rotation...{}".format(Color.BOLD, Color.END))
+    listener = socket.socket(AF_INET, STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+    try:
+        fuzzerData = makeFuzzerData({"port": listener.getsockname()[1], "sourceIP": "127.0.0.4"})
+        pools = [SourceAddressPool("127.0.0.2,127.0.0.3"), SourceAddressPool("fd00::1")]
+        actual = []
+        for pool in pools:
+            factory = ConnectionFactory(fuzzerData, "127.0.0.1", pool)
+            for _ in range(3):
+                (connection, addr) = factory.createConnection()
+                actual.append(connection.getsockname()[0])
+                connection.close()
+                listener.accept()[0].close()
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    finally:
+        listener.close()
+    expected = ["127.0.0.2", "127.0.0.3", "127.0.0.2", "127.0.0.4", "127.0.0.4", "127.0.0.4"]
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult("Source Address Rotation", actual == expected)
+
+    # SNI only for host names, and every handshake counted in tlsStats
+    testTLS("TLS Defaults", "localhost", {}, (("localhost", None, None), False, 2))
+    testTLS("TLS IP Address Without SNI", "127.0.0.1", {}, ((None, None, None), False, 2))
+    testTLS("TLS Settings", "localhost", {"tlsCiphers": "ECDHE-RSA-AES128-GCM-SHA256", "tlsAlpn": "http/1.1", "tlsSessionResumption": False},
+        (("localhost", "http/1.1", "ECDHE-RSA-AES128-GCM-SHA256"), True, 2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test which ops an ExecutionPlan builds for a .fuzzer conversation
+#
+#------------------------------------------------------------------
+
+import socket
+import ssl
+import sys
+import threading
+from StringIO import StringIO
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.captures import CapturedValues
+from backend.execution_plan import ExecutionPlan
+from backend.proc_director import MessageProcessorHooks
+from backend.receive_options import receiveAggregate
+from mutiny_classes.message_processor import MessageProcessor
+
+# Self-signed certificate and key for the TLS end of the tests
+TLS_CERT = "../tls_test.pem"
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# Changes outbound messages, so every one has to be rebuilt each run
+class PreSendProcessor(MessageProcessor):
+    def preSendProcess(self, message, extraParams):
+        return message + "\n"
+
+def buildPlan(fuzzerStr, processorClass=MessageProcessor):
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFD(StringIO(fuzzerStr), quiet=True)
+    capturedValues = CapturedValues(fuzzerData.captures, fuzzerData.messageCollection)
+    return ExecutionPlan(fuzzerData, MessageProcessorHooks(processorClass, MessageProcessor), capturedValues)
+
+# Op as plain strings, with the op type by name
+def describeOp(op):
+    if op[0] == ExecutionPlan.Send:
+        return ("Send", op[1], str(op[2]))
+    elif op[0] == ExecutionPlan.Mutate:
+        return ("Mutate", op[1], op[3], [str(fixup) for fixup in op[4]], op[5])
+    elif op[0] == ExecutionPlan.Receive:
+        return ("Receive", op[1], str(op[2]), op[3], [capture.name for capture in op[4]], str(op[5]) if op[5] else None)
+    return ("Pipeline", op[1])
+
+def testOps(name, fuzzerStr, expected, processorClass=MessageProcessor):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        actual = [describeOp(op) for op in buildPlan(fuzzerStr, processorClass)]
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# expected - (fuzzPoint, stopAfter, stopOnDivergence)
+def testStopAfterFuzz(name, stopAfterFuzz, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    plan = buildPlan("stopAfterFuzz {0}\noutbound 'a'\ninbound 'b'\noutbound fuzz 'c'\noutbound 'd'\ninbound 'e'\noutbound 'f'\ninbound 'g'\n".format(stopAfterFuzz))
+    actual = (plan.fuzzPoint, plan.stopAfter, plan.stopOnDivergence)
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# Pipeline op as plain strings, or None
+def describePipeline(plan):
+    op = plan.pipelineOp
+    if op is None:
+        return None
+    return (op[1], str(op[2]), str(op[3]), [(i, str(data)) for (i, data) in op[4]], [(i, str(data)) for (i, data) in op[5]])
+
+def testPipeline(name, fuzzerStr, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        actual = describePipeline(buildPlan("pipelinePrefix 1\n" + fuzzerStr))
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = "exception"
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# Connected (client, server) sockets, with the handshake done for TLS
+def makeSocketPair(isTLS):
+    (clientSock, serverSock) = [socket.socket(_sock=s) for s in socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)]
+    if not isTLS:
+        return (clientSock, serverSock)
+    serverSide = []
+    thread = threading.Thread(target=lambda: serverSide.append(ssl.wrap_socket(serverSock, server_side=True, certfile=TLS_CERT)))
+    thread.start()
+    client = ssl.wrap_socket(clientSock)
+    thread.join()
+    return (client, serverSide[0])
+
+# sends - pieces of the pipelined responses for the other end to send, a little apart
+def testAggregate(name, isTLS, sends, bytesToRead, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    (connection, peer) = makeSocketPair(isTLS)
+    try:
+        timers = [threading.Timer(0.02 * j, peer.sendall, [data]) for (j, data) in enumerate(sends)]
+        for timer in timers:
+            timer.start()
+        try:
+            actual = str(receiveAggregate(connection, bytesToRead, 0.2))
+        except Exception as e:
+            actual = e.__class__.__name__
+        for timer in timers:
+            timer.join()
+        print("\tExpected: {0}".format(repr(expected)))
+        print("\t  Actual: {0}".format(repr(actual)))
+        printResult(name, actual == expected)
+    finally:
+        connection.close()
+        peer.close()
+
+CONVERSATION = """outbound 'hello'
+sub 'world'
+inbound 'session 7'
+capture session regex 'session ([0-9]+)'
+outbound fuzz 'a'
+sub 'b'
+sub fuzz 'c'
+outbound '\\x00\\x01data'
+fixup length 0:0-1 0
+outbound 'use ${session}'
+inbound 'bye'
+receive timeout=0.5 optional
+"""
+
+def main():
+    testOps("Op Construction", CONVERSATION, [
+        ("Send", 0, "helloworld"),
+        ("Receive", 1, "session 7", 9, ["session"], None),
+        ("Mutate", 2, [0, 2], [], []),
+        ("Mutate", 3, [], ["length 0:0-1 0"], []),
+        ("Mutate", 4, [], [], [0]),
+        ("Receive", 5, "bye", 3, [], "timeout=0.5 optional"),
+    ])
+    # Callbacks that alter outbound messages need every one rebuilt
+    testOps("Op Construction With Callbacks", CONVERSATION, [
+        ("Mutate", 0, [], [], []),
+        ("Receive", 1, "session 7", 9, ["session"], None),
+        ("Mutate", 2, [0, 2], [], []),
+        ("Mutate", 3, [], ["length 0:0-1 0"], []),
+        ("Mutate", 4, [], [], [0]),
+        ("Receive", 5, "bye", 3, [], "timeout=0.5 optional"),
+    ], PreSendProcessor)
+
+    print("\n{}Testing ops built on first use...{}".format(Color.BOLD, Color.END))
+    plan = buildPlan(CONVERSATION)
+    beforeIterating = [op is not None for op in plan.ops]
+    iterator = iter(plan)
+    next(iterator)
+    next(iterator)
+    afterTwo = [op is not None for op in plan.ops]
+    # Fuzzed ops are built up front to look for captured values in fuzzed data
+    expected = ([False, False, True, False, False, False], [True, True, True, False, False, False])
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format((beforeIterating, afterTwo)))
+    printResult("Ops Built On First Use", (beforeIterating, afterTwo) == expected)
+
+    print("\n{}Testing fuzzed captured values...{}".format(Color.BOLD, Color.END))
+    actual = (buildPlan(CONVERSATION).fuzzesSubstitutedData, buildPlan(CONVERSATION.replace("outbound 'use", "outbound fuzz 'use")).fuzzesSubstitutedData)
+    print("\tExpected: (False, True)")
+    print("\t  Actual: {0}".format(actual))
+    printResult("Fuzzed Captured Values", actual == (False, True))
+
+    testStopAfterFuzz("Stop After Response", "response", (2, 4, False))
+    testStopAfterFuzz("Stop After Count", "2", (2, 4, False))
+    testStopAfterFuzz("Stop On Divergence", "diverge", (2, None, True))
+
+    # Nothing is sent after a response, so there's nothing to gain
+    testPipeline("Pipeline Sends Only", "outbound 'a'\noutbound 'b'\n", None)
+
+    # Sends after the last response are part of the pipeline too
+    testPipeline("Pipeline Trailing Send", "outbound 'a'\ninbound 'b'\noutbound 'c'\n",
+        (2, "ac", "b", [(0, "a"), (2, "c")], [(1, "b")]))
+
+    # A response with captures has to be read on its own, so the pipeline stops before it
+    testPipeline("Pipeline Stops At Capture", "outbound 'a'\ninbound 'b'\noutbound 'c'\ninbound 'session 1'\ncapture s regex 'session ([0-9]+)'\noutbound 'd'\n",
+        (2, "ac", "b", [(0, "a"), (2, "c")], [(1, "b")]))
+
+    # Altered from the very first message, nothing is pipelined
+    testPipeline("Pipeline Altered First Message", "outbound fuzz 'a'\ninbound 'b'\noutbound 'c'\n", None)
+
+    print("\n{}Testing pipelined response splitting...{}".format(Color.BOLD, Color.END))
+    plan = buildPlan("pipelinePrefix 1\noutbound 'a'\ninbound 'b'\noutbound 'c'\ninbound 'de'\noutbound 'f'\n")
+    expected = [[(1, "x"), (3, "yz")], [(1, "x"), (3, "")], [(1, "x"), (3, "yz")]]
+    actual = [[(i, str(data)) for (i, data) in ExecutionPlan.splitResponses(plan.pipelineOp, bytearray(data))] for data in ("xyz", "x", "xyzw")]
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult("Pipeline Response Splitting", actual == expected)
+
+    # A short response comes back as is, for the mismatch to be reported
+    testAggregate("Aggregate Full", False, ["abc", "def"], 6, "abcdef")
+    testAggregate("Aggregate Short", False, ["abc"], 6, "abc")
+    testAggregate("Aggregate Nothing", False, [], 6, "timeout")
+    testAggregate("Aggregate Full On TLS", True, ["abc", "def"], 6, "abcdef")
+    testAggregate("Aggregate Short On TLS", True, ["abc"], 6, "abc")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test .fuzzer fixup rules against known lengths/checksums
+#
+#------------------------------------------------------------------
+
+import sys
+from StringIO import StringIO
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.fixups import applyFixups
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# Reads fuzzerStr, applies fixups to message 0 and returns what would be sent
+def fixupMessage(fuzzerStr):
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFD(StringIO(fuzzerStr), quiet=True)
+    message = fuzzerData.messageCollection.messages[0]
+    message.resetAlteredMessage()
+    applyFixups(fuzzerData.fixups.get(0, []), message, -1)
+    return (fuzzerData, message.getAlteredMessage())
+
+def testFixup(name, fuzzerStr, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        (fuzzerData, actual) = fixupMessage(fuzzerStr)
+        print("\tExpected: {0}".format(repr(str(expected))))
+        print("\t  Actual: {0}".format(repr(str(actual))))
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    printResult(name, actual == expected)
+
+def main():
+    testFixup("Length Fixup",
+        "outbound 'LL\\x00\\x00'\nsub 'abc'\nsub 'defg'\nfixup length 0:2-3 1-2\n",
+        bytearray("LL\x00\x07abcdefg"))
+    testFixup("Little Endian Length Fixup",
+        "outbound '\\x00\\x00\\x00\\x00'\nsub 'abc'\nfixup length 0:0-3 1 little\n",
+        bytearray("\x03\x00\x00\x00abc"))
+    testFixup("CRC32 Fixup",
+        "outbound '123456789'\nsub '....'\nfixup crc32 1:0-3 0\n",
+        bytearray("123456789\xcb\xf4\x39\x26"))
+    testFixup("Adler32 Fixup",
+        "outbound 'Wikipedia'\nsub '....'\nfixup adler32 1:0-3 0\n",
+        bytearray("Wikipedia\x11\xe6\x03\x98"))
+    # IPv4 header with the checksum field inside the data it covers
+    testFixup("Internet Checksum Fixup",
+        "outbound '\\x45\\x00\\x00\\x73\\x00\\x00\\x40\\x00\\x40\\x11\\xff\\xff\\xc0\\xa8\\x00\\x01\\xc0\\xa8\\x00\\xc7'\nfixup inet 0:10-11 0\n",
+        bytearray("\x45\x00\x00\x73\x00\x00\x40\x00\x40\x11\xb8\x61\xc0\xa8\x00\x01\xc0\xa8\x00\xc7"))
+
+    # Counters send the original value plus seed + 1, whatever ran before
+    print("\n{}Testing Counter Fixup...{}".format(Color.BOLD, Color.END))
+    (fuzzerData, first) = fixupMessage("outbound '\\x00\\xfe'\nfixup counter 0:0-1\n")
+    message = fuzzerData.messageCollection.messages[0]
+    sent = [first]
+    for seed in (1, 0, 1, -1, 255):
+        message.resetAlteredMessage()
+        applyFixups(fuzzerData.fixups[0], message, seed)
+        sent.append(message.getAlteredMessage())
+    print("\tSent: {0}".format(repr(map(str, sent))))
+    printResult("Counter Fixup", sent == [bytearray("\x00\xfe"), bytearray("\x01\x00"), bytearray("\x00\xff"), bytearray("\x01\x00"), bytearray("\x00\xfe"), bytearray("\x01\xfe")])
+
+    # Fixups should survive writing the .fuzzer back out
+    print("\n{}Testing Fixup Serialization...{}".format(Color.BOLD, Color.END))
+    fuzzerStr = "outbound 'LL\\x00\\x00'\nsub fuzz 'abc'\nfixup length 0:2-3 1\nfixup crc32 0:0-3 1 little\ninbound 'OK'\n"
+    (fuzzerData, actual) = fixupMessage(fuzzerStr)
+    output = StringIO()
+    fuzzerData.writeToFD(output)
+    print(output.getvalue())
+    printResult("Fixup Serialization", "sub fuzz 'abc'\nfixup length 0:2-3 1\nfixup crc32 0:0-3 1 little\ninbound 'OK'\n" in output.getvalue())
+
+    # Invalid rules should be caught on read
+    for (name, fuzzerStr) in [
+            ("Bad Field Size", "outbound 'abcdef'\nfixup crc32 0:0-1 0\n"),
+            ("Missing Subcomponent", "outbound 'abcd'\nfixup length 0:0-1 1\n"),
+            ("Inbound Fixup", "inbound 'abcd'\nfixup length 0:0-1 0\n")]:
+        print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+        try:
+            fixupMessage(fuzzerStr)
+            isPass = False
+        except RuntimeError as e:
+            print("\tRaised: {0}".format(str(e)))
+            isPass = True
+        printResult(name, isPass)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test the background log writer's queue policies and flushing
+#
+#------------------------------------------------------------------
+
+import sys
+import threading
+sys.path.append("../..")
+from backend.log_writer import AsyncLogWriter
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# Writes records into a list, holding up the first one until released
+class SlowLog(object):
+    def __init__(self):
+        self.written = []
+        self.flushCount = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def writeRecord(self, record):
+        self.started.set()
+        self.release.wait()
+        self.written.append(record)
+
+    def flush(self):
+        self.flushCount += 1
+
+def testPolicy(policy, expectedWritten, expectedDropped):
+    print("\n{}Testing {} policy...{}".format(Color.BOLD, policy, Color.END))
+    log = SlowLog()
+    writer = AsyncLogWriter(1, policy, log.writeRecord, log.flush)
+    # The worker takes the first record and waits, the second fills the queue
+    writer.put(1)
+    log.started.wait()
+    writer.put(2)
+    # Releases the worker shortly, so a blocking put can finish
+    threading.Timer(0.2, log.release.set).start()
+    writer.put(3, isDroppable=True)
+    writer.put(4)
+    writer.flush()
+    print("\tExpected: {0}, {1} dropped".format(expectedWritten, expectedDropped))
+    print("\t  Actual: {0}, {1} dropped, {2} flushes".format(log.written, writer.droppedCount, log.flushCount))
+    printResult("{0} Policy".format(policy), log.written == expectedWritten and writer.droppedCount == expectedDropped and log.flushCount > 0)
+
+def main():
+    testPolicy(AsyncLogWriter.Policy.Block, [1, 2, 3, 4], 0)
+    testPolicy(AsyncLogWriter.Policy.Drop, [1, 2, 4], 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test the runs Logger keeps for logging crashes noticed late
+#
+#------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.fuzzer_types import Logger
+from backend.campaign_log import CampaignLogReader
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+FUZZER = """outbound fuzz 'hello'
+inbound 'hi'
+"""
+
+# Pretend to do a run, fuzzing message 0 to "fuzzed <seed>"
+def fakeRun(logger, messageCollection, seed):
+    logger.resetForNewRun(seed, messageCollection)
+    messageCollection.messages[0].resetAlteredMessage()
+    if seed != -1:
+        messageCollection.messages[0].subcomponents[0].setAlteredByteArray(bytearray("fuzzed %d" % (seed)))
+    logger.setHighestMessageNumber(0)
+    logger.setReceivedMessageData(1, bytearray("reply %d" % (seed)))
+    logger.setHighestMessageNumber(1)
+
+def testHistory(name, historySize, seeds, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    folderPath = os.path.join(tempfile.mkdtemp(), "logs")
+    try:
+        fuzzerData = FuzzerData()
+        fuzzerData.readFromFD(StringIO(FUZZER), quiet=True)
+        messageCollection = fuzzerData.messageCollection
+        logger = Logger(folderPath, useCampaignLog=True, historySize=historySize)
+        for seed in seeds:
+            fakeRun(logger, messageCollection, seed)
+        # The previous run is logged under the number given, like mutiny.py
+        # does for LogLastAndHaltException
+        logger.outputLastLog(seeds[-2], messageCollection, "Crash")
+
+        reader = CampaignLogReader(folderPath)
+        actual = []
+        for seed in reader.getSeeds():
+            record = reader.getRecord(seed)
+            actual.append((seed, [str(altered) for (_, _, altered) in record.alteredState], str(record.receivedMessageData[1]), record.highestMessageNumber))
+        print("\tExpected: {0}".format(expected))
+        print("\t  Actual: {0}".format(actual))
+        printResult(name, actual == expected)
+    finally:
+        shutil.rmtree(os.path.dirname(folderPath))
+
+def main():
+    testHistory("Last Run Only", 1, [-1, 1, 2, 3], [(2, ["fuzzed 2"], "reply 2", 1)])
+    # Slots are reused after 4 runs, and older runs come from the ring
+    testHistory("Last 3 Runs", 3, [-1, 1, 2, 3, 4, 5, 6], [(3, ["fuzzed 3"], "reply 3", 1), (4, ["fuzzed 4"], "reply 4", 1), (5, ["fuzzed 5"], "reply 5", 1)])
+    # The test run isn't logged even if there's room for it
+    testHistory("Fewer Runs Than Kept", 4, [-1, 1, 2, 3], [(1, ["fuzzed 1"], "reply 1", 1), (2, ["fuzzed 2"], "reply 2", 1)])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test that PrefetchingMutator hands back the same data as fuzzing inline,
+# and that a seed failing on the prefetch thread only affects that seed
+#
+#------------------------------------------------------------------
+
+import sys
+import threading
+from StringIO import StringIO
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.captures import CapturedValues
+from backend.execution_plan import ExecutionPlan
+from backend.proc_director import MessageProcessorHooks
+from backend.mutator import PrefetchingMutator
+from mutiny_classes.message_processor import MessageProcessor
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# Seed 3 only fails on the prefetch thread, seed 5 fails everywhere
+class FakeMutator(PrefetchingMutator):
+    def mutate(self, byteArray, seed):
+        if seed == 5 or (seed == 3 and threading.current_thread() is self.thread):
+            raise RuntimeError("seed {0} failed".format(seed))
+        return bytearray("{0}-{1}".format(str(byteArray), seed))
+
+def main():
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFD(StringIO("outbound fuzz 'abc'\ninbound 'x'\noutbound 'd'\nsub fuzz 'ef'\n"), quiet=True)
+    capturedValues = CapturedValues(fuzzerData.captures, fuzzerData.messageCollection)
+    plan = ExecutionPlan(fuzzerData, MessageProcessorHooks(MessageProcessor, MessageProcessor), capturedValues)
+    mutator = FakeMutator("radamsa", plan, 4)
+    messages = fuzzerData.messageCollection.messages
+
+    print("\n{}Testing prefetched seeds...{}".format(Color.BOLD, Color.END))
+    expected = []
+    actual = []
+    for seed in range(0, 8):
+        for (i, j) in ((0, 0), (2, 1)):
+            expected.append("failed" if seed == 5 else "{0}-{1}".format(str(messages[i].subcomponents[j].getOriginalByteArray()), seed))
+            try:
+                actual.append(str(mutator.mutateSubcomponent(i, j, messages[i], seed)))
+            except RuntimeError:
+                actual.append("failed")
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult("Prefetched Seeds", actual == expected)
+
+    # Skipping ahead restarts the prefetch from the new seed
+    print("\n{}Testing seed jump...{}".format(Color.BOLD, Color.END))
+    actual = str(mutator.mutateSubcomponent(0, 0, messages[0], 100))
+    print("\tExpected: abc-100")
+    print("\t  Actual: {0}".format(actual))
+    printResult("Seed Jump", actual == "abc-100")
+    mutator.close()
+
+if __name__ == "__main__":
+    main()
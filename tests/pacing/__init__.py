@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+#
+# Cisco Confidential
+# November 2014, created within ASIG
+# Author James Spadaro (jaspadar)
+# Codeveloper Lilith Wyatt (liwyatt)
+#
+# Copyright (c) 2014-2015 by Cisco Systems, Inc.
+# All rights reserved.
+#
+#------------------------------------------------------------------
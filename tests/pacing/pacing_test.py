@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test token bucket refill and burst limits, alone and shared between
+# buckets through a SharedBucketState file
+#
+#------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.append("../..")
+import backend.pacing
+from backend.pacing import TokenBucket, SharedBucketState
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+# Stands in for the time module in backend.pacing, sleeping just moves the clock
+# Like a real clock it always moves on a little, or rounding could leave a
+# bucket waiting on a tiny fraction of a token forever
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0.000001)
+
+# steps - "take" to acquire a token from bucket number n as ("take", n),
+#   or ("idle", seconds)
+# expected - how long each take waited, rounded to the millisecond
+def testBuckets(name, fakeTime, buckets, steps, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    actual = []
+    for (action, value) in steps:
+        if action == "idle":
+            fakeTime.sleep(value)
+        else:
+            actual.append(round(buckets[value].acquire(), 3))
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+def main():
+    fakeTime = FakeTime()
+    backend.pacing.time = fakeTime
+
+    # A full bucket goes back-to-back for burst tokens, then waits 1/rate
+    bucket = TokenBucket(10, 3)
+    testBuckets("Burst", fakeTime, [bucket], [("take", 0)] * 5, [0.0, 0.0, 0.0, 0.1, 0.1])
+
+    # Idling refills at rate, partial tokens shorten the next wait
+    testBuckets("Refill", fakeTime, [bucket], [("idle", 0.25), ("take", 0), ("take", 0), ("take", 0)], [0.0, 0.0, 0.05])
+
+    # However long it idles, no more than burst tokens build up
+    testBuckets("Burst Cap", fakeTime, [bucket], [("idle", 60)] + [("take", 0)] * 4, [0.0, 0.0, 0.0, 0.1])
+
+    # A burst below 1 still allows one token
+    testBuckets("Minimum Burst", fakeTime, [TokenBucket(2, 0)], [("take", 0), ("take", 0)], [0.0, 0.5])
+
+    tempFolder = tempfile.mkdtemp()
+    try:
+        statePath = os.path.join(tempFolder, "pacing.state")
+        # Buckets in different processes share one slot, so they share tokens
+        # A new (zeroed) slot starts off full
+        sharedState = SharedBucketState(statePath, 2)
+        otherState = SharedBucketState(statePath, 2)
+        buckets = [TokenBucket(10, 2, sharedState, 0), TokenBucket(10, 2, otherState, 0), TokenBucket(10, 2, otherState, 1)]
+        testBuckets("Shared Slot", fakeTime, buckets, [("take", 0), ("take", 1), ("take", 0), ("take", 1), ("take", 2), ("take", 2)], [0.0, 0.0, 0.1, 0.1, 0.0, 0.0])
+
+        # What's in the file survives for the next process to open it
+        (tokens, lastRefill) = SharedBucketState(statePath, 2).read(0)
+        print("\n{}Testing shared state file...{}".format(Color.BOLD, Color.END))
+        print("\tExpected: tokens 0.0, last refill {0}".format(fakeTime.now))
+        print("\t  Actual: tokens {0}, last refill {1}".format(round(tokens, 6), lastRefill))
+        printResult("Shared State File", round(tokens, 6) == 0.0 and lastRefill == fakeTime.now)
+    finally:
+        shutil.rmtree(tempFolder)
+
+if __name__ == "__main__":
+    main()
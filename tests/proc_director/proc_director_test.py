@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test which MessageProcessor callbacks count as overridden, so Mutiny
+# can skip the ones that do nothing
+#
+#------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.append("../..")
+from backend.proc_director import ProcDirector, MessageProcessorHooks
+from mutiny_classes.message_processor import MessageProcessor
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../mutiny_classes/message_processor.py")
+
+# Same code as the defaults, just written out again
+class SameCodeProcessor(MessageProcessor):
+    def preFuzzProcess(self, message, extraParams):
+        return message
+
+    def preSendSubcomponentProcess(self, subcomponent, extraParams):
+        return subcomponent
+
+class PreSendProcessor(MessageProcessor):
+    def preSendProcess(self, message, extraParams):
+        return message + "\n"
+
+class PostReceiveProcessor(MessageProcessor):
+    def postReceiveProcess(self, message, extraParams):
+        self.lastMessage = message
+
+# Returns (overridden, altersOutbound, postReceiveProcess)
+def describeHooks(hooks):
+    return (hooks.overridden, bool(hooks.altersOutbound), bool(hooks.postReceiveProcess))
+
+def testHooks(name, processorClass, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    actual = describeHooks(MessageProcessorHooks(processorClass, MessageProcessor))
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+# Load a processor folder the way Mutiny does
+# source - contents of message_processor.py, None to leave it out
+def testProcessorFolder(name, source, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    processDir = tempfile.mkdtemp()
+    try:
+        if source is not None:
+            with open(os.path.join(processDir, "message_processor.py"), "w") as processorFile:
+                processorFile.write(source)
+        actual = describeHooks(ProcDirector(processDir).messageProcessorHooks)
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        actual = None
+    finally:
+        shutil.rmtree(processDir)
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult(name, actual == expected)
+
+def main():
+    testHooks("Default Processor", MessageProcessor, ([], False, False))
+    testHooks("Same Code Overrides", SameCodeProcessor, ([], False, False))
+    # Anything overridden needs postReceiveProcess() to fill in postReceiveStore
+    testHooks("Changed preSendProcess", PreSendProcessor, (["preSendProcess"], True, True))
+    testHooks("Changed postReceiveProcess", PostReceiveProcessor, (["postReceiveProcess"], False, True))
+
+    with open(DEFAULT_PATH, "r") as defaultFile:
+        defaultSource = defaultFile.read()
+    # The usual custom processor, a copy of the default with edits
+    testProcessorFolder("Default Folder", None, ([], False, False))
+    testProcessorFolder("Copied Default", defaultSource, ([], False, False))
+    changedSource = defaultSource.replace("targetPort):\n        pass", "targetPort):\n        print(targetIP)")
+    testProcessorFolder("Copied With preConnect Changed", changedSource, (["preConnect"], False, True))
+
+if __name__ == "__main__":
+    main()
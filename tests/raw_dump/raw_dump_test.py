@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test dumping raw messages into folders and archives
+#
+#------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import zipfile
+sys.path.append("../..")
+from backend.raw_dump import RawDumper
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+def dumpMessages(path):
+    rawDumper = RawDumper(path)
+    for seed in (1, 2):
+        rawDumper.dump(seed, 0, True, True, bytearray("sent \x00\xff %d" % (seed)))
+        # Blob messages are sent as a list of pieces
+        rawDumper.dump(seed, 1, True, False, [bytearray("piece "), buffer("two")])
+        rawDumper.dump(seed, 2, False, False, bytearray("got\n"))
+    rawDumper.close()
+
+EXPECTED_ARCHIVE = {
+    "seed-1/0-outbound-fuzzed": "sent \x00\xff 1",
+    "seed-1/1-outbound": "piece two",
+    "seed-1/2-inbound": "got\n",
+    "seed-2/0-outbound-fuzzed": "sent \x00\xff 2",
+    "seed-2/1-outbound": "piece two",
+    "seed-2/2-inbound": "got\n",
+}
+
+def testArchive(folderPath, name):
+    print("\n{}Testing {} archive...{}".format(Color.BOLD, name, Color.END))
+    path = os.path.join(folderPath, "dump.{0}".format(name))
+    dumpMessages(path)
+    if name == "zip":
+        with zipfile.ZipFile(path) as zipFile:
+            actual = dict((member, zipFile.read(member)) for member in zipFile.namelist())
+    else:
+        tarFile = tarfile.open(path)
+        actual = dict((member.name, tarFile.extractfile(member).read()) for member in tarFile.getmembers())
+        tarFile.close()
+    print("\t  Actual: {0}".format(actual))
+    printResult("{0} Archive".format(name), actual == EXPECTED_ARCHIVE)
+
+def main():
+    folderPath = tempfile.mkdtemp()
+    try:
+        for name in ("zip", "tar", "tar.gz", "tar.bz2"):
+            testArchive(folderPath, name)
+
+        print("\n{}Testing folder dump...{}".format(Color.BOLD, Color.END))
+        dumpFolderPath = os.path.join(folderPath, "dumpraw")
+        os.mkdir(dumpFolderPath)
+        dumpMessages(dumpFolderPath)
+        actual = {}
+        for fileName in os.listdir(dumpFolderPath):
+            with open(os.path.join(dumpFolderPath, fileName), "rb") as dumpFile:
+                actual[fileName] = dumpFile.read()
+        # The original layout, with the data escaped
+        expected = {
+            "0-outbound-seed-1-fuzzed": "sent \\x00\\xff 1",
+            "1-outbound-seed-1": "piece two",
+            "2-inbound-seed-1": "got\\n",
+            "0-outbound-seed-2-fuzzed": "sent \\x00\\xff 2",
+            "1-outbound-seed-2": "piece two",
+            "2-inbound-seed-2": "got\\n",
+        }
+        print("\t  Actual: {0}".format(actual))
+        printResult("Folder Dump", actual == expected)
+    finally:
+        shutil.rmtree(folderPath)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test "receive" line parsing and reading with receive options
+#
+#------------------------------------------------------------------
+
+import socket
+import ssl
+import sys
+import threading
+sys.path.append("../..")
+from backend.receive_options import ReceiveOptions, receiveWithOptions
+
+# Self-signed certificate and key for the TLS end of the tests
+TLS_CERT = "../tls_test.pem"
+
+class Color:
+   GREEN = '\033[92m'
+   RED = '\033[91m'
+   BOLD = '\033[1m'
+   END = '\033[0m'
+
+def printResult(message, isPass):
+    if isPass:
+        resultStr = "Pass"
+        resultColor = Color.GREEN
+    else:
+        resultStr = "Fail"
+        resultColor = Color.RED
+    
+    print("\n{}: {}{}{}\n".format(message, resultColor, resultStr, Color.END))
+
+def testParse(optionStr, expected):
+    print("\n{}Testing parsing '{}'...{}".format(Color.BOLD, optionStr, Color.END))
+    try:
+        options = ReceiveOptions(optionStr)
+        actual = (options.timeout, options.minLength, options.maxLength, options.isOptional, options.isSkipped)
+    except RuntimeError as e:
+        actual = "error"
+        print("\tError: {0}".format(str(e)))
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(actual))
+    printResult("Parse '{0}'".format(optionStr), actual == expected)
+
+# sends - data for the other end to send before the read, then after a delay
+def testReceive(name, optionStr, bytesToRead, sends, expected, expectedLeftover):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    (connection, peer) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        (before, after) = sends
+        if before:
+            peer.sendall(before)
+        if after:
+            timer = threading.Timer(0.05, peer.sendall, [after])
+            timer.start()
+        try:
+            actual = str(receiveWithOptions(connection, None, bytesToRead, 0.5, ReceiveOptions(optionStr)))
+        except socket.timeout:
+            actual = "timeout"
+        if after:
+            timer.join()
+        # Whatever wasn't read is left for the next receive
+        connection.settimeout(0.2)
+        try:
+            peer.shutdown(socket.SHUT_WR)
+            leftover = connection.recv(4096)
+        except socket.timeout:
+            leftover = ""
+        print("\tExpected: {0}, leaving {1}".format(repr(expected), repr(expectedLeftover)))
+        print("\t  Actual: {0}, leaving {1}".format(repr(actual), repr(leftover)))
+        printResult(name, actual == expected and leftover == expectedLeftover)
+    finally:
+        connection.close()
+        peer.close()
+
+# Stands in for a TLS socket with nothing to read in non-blocking mode
+class WantReadSocket(object):
+    type = socket.SOCK_STREAM
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self, size):
+        raise ssl.SSLWantReadError(ssl.SSL_ERROR_WANT_READ, "The operation did not complete (read)")
+
+# Connected (client, server) TLS sockets, handshake already done
+def makeTLSPair():
+    (clientSock, serverSock) = [socket.socket(_sock=s) for s in socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)]
+    serverSide = []
+    thread = threading.Thread(target=lambda: serverSide.append(ssl.wrap_socket(serverSock, server_side=True, certfile=TLS_CERT)))
+    thread.start()
+    client = ssl.wrap_socket(clientSock)
+    thread.join()
+    return (client, serverSide[0])
+
+# Same as testReceive() over TLS, where Python 2 reports read timeouts as
+# SSLError rather than socket.timeout
+def testTLSReceive(name, optionStr, bytesToRead, sends, expected):
+    print("\n{}Testing {}...{}".format(Color.BOLD, name, Color.END))
+    (connection, peer) = makeTLSPair()
+    try:
+        (before, after) = sends
+        if before:
+            peer.sendall(before)
+        if after:
+            timer = threading.Timer(0.05, peer.sendall, [after])
+            timer.start()
+        try:
+            actual = str(receiveWithOptions(connection, None, bytesToRead, 0.5, ReceiveOptions(optionStr)))
+        except Exception as e:
+            actual = "{0}: {1}".format(e.__class__.__name__, str(e))
+        if after:
+            timer.join()
+        print("\tExpected: {0}".format(repr(expected)))
+        print("\t  Actual: {0}".format(repr(actual)))
+        printResult(name, actual == expected)
+    finally:
+        connection.close()
+        peer.close()
+
+def main():
+    testParse("", (None, None, None, False, False))
+    testParse("timeout=0.5 min=2 max=10 optional", (0.5, 2, 10, True, False))
+    testParse("skip", (None, None, None, False, True))
+    testParse("timeout", "error")
+    testParse("bogus", "error")
+    testParse("min=x", "error")
+    testParse("timeout=-1", "error")
+    testParse("max=0", "error")
+    testParse("min=5 max=4", "error")
+
+    testReceive("Default", "", 5, ("hello", None), "hello", "")
+    testReceive("Default Timeout", "timeout=0.05", 5, (None, None), "timeout", "")
+    testReceive("Optional", "optional timeout=0.05", 5, (None, None), "", "")
+    testReceive("Skip Nothing Yet", "skip", 5, (None, "late"), "", "late")
+    testReceive("Skip Already Arrived", "skip", 5, ("early", None), "early", "")
+    # Without min, the first read returns as soon as anything arrives
+    testReceive("No Min", "", 6, ("abc", "def"), "abc", "def")
+    testReceive("Min", "min=6", 6, ("abc", "def"), "abcdef", "")
+    testReceive("Max", "max=3", 6, ("abcdef", None), "abc", "def")
+    testReceive("Min Capped By Max", "min=2 max=4", 6, ("a", "bcdef"), "abcd", "ef")
+
+    print("\n{}Testing skip on TLS...{}".format(Color.BOLD, Color.END))
+    try:
+        actual = str(receiveWithOptions(WantReadSocket(), None, 5, 0.5, ReceiveOptions("skip")))
+    except Exception as e:
+        actual = "{0}: {1}".format(e.__class__.__name__, str(e))
+    print("\t  Actual: {0}".format(repr(actual)))
+    printResult("Skip On TLS", actual == "")
+
+    testTLSReceive("Default On TLS", "", 5, ("hello", None), "hello")
+    testTLSReceive("Optional On TLS", "optional timeout=0.05", 5, (None, None), "")
+    testTLSReceive("Min On TLS", "min=6", 6, ("abc", "def"), "abcdef")
+    testTLSReceive("Min Short On TLS", "min=6 timeout=0.1", 6, ("abc", None), "abc")
+    testTLSReceive("Skip Nothing Yet On TLS", "skip", 5, (None, None), "")
+
+if __name__ == "__main__":
+    main()
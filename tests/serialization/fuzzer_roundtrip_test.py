@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Test that .fuzzer files read the same after being written back out,
+# and that unusually formatted lines parse as expected
+#
+#------------------------------------------------------------------
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from serialization_test import Color, printResult
+
+# Everything about a FuzzerData that should survive a round trip
+def describe(fuzzerData):
+    # Legacy messagesToFuzz is written back out as "fuzz" on the messages
+    settings = dict((key, value) for (key, value) in vars(fuzzerData).items() if key not in ("messageCollection", "fixups", "captures", "receiveOptions", "comments", "messagesToFuzz") and not key.startswith("_"))
+    # writeToFD() adds blank lines around sections, so only compare actual comments
+    settings["comments"] = {}
+    for (section, comments) in fuzzerData.comments.items():
+        lines = [line for line in comments.splitlines() if line]
+        if lines:
+            settings["comments"][section] = lines
+    settings["receiveOptions"] = dict((messageNum, str(options)) for (messageNum, options) in fuzzerData.receiveOptions.items())
+    messages = [(message.direction, message.isFuzzed, [(str(subcomponent.getOriginalByteArray()), subcomponent.isFuzzed) for subcomponent in message.subcomponents]) for message in fuzzerData.messageCollection.messages]
+    fixups = dict((messageNum, map(str, rules)) for (messageNum, rules) in fuzzerData.fixups.items())
+    captures = dict((messageNum, map(str, rules)) for (messageNum, rules) in fuzzerData.captures.items())
+    return (settings, messages, fixups, captures)
+
+def readFuzzer(fuzzerStr):
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFD(StringIO(fuzzerStr), quiet=True)
+    return fuzzerData
+
+def writeFuzzer(fuzzerData):
+    output = StringIO()
+    fuzzerData.writeToFD(output)
+    return output.getvalue()
+
+# encoding - if given, write messages out in this Message.Encoding
+def testRoundTrip(name, fuzzerStr, encoding=None):
+    if encoding:
+        name = "{0} ({1})".format(name, encoding)
+    print("\n{}Testing round trip of {}...{}".format(Color.BOLD, name, Color.END))
+    try:
+        first = readFuzzer(fuzzerStr)
+        if encoding:
+            first.setEncoding(encoding)
+        written = writeFuzzer(first)
+        second = readFuzzer(written)
+        isPass = describe(first) == describe(second)
+        isPass = isPass and [message.encoding for message in first.messageCollection.messages] == [message.encoding for message in second.messageCollection.messages]
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        isPass = False
+    printResult("Round Trip {0}".format(name), isPass)
+
+# readFromFile() only decodes messages when first used, but should end up
+# with the same thing as reading everything up front
+def testLazyRead(fuzzerPath):
+    print("\n{}Testing lazy read of {}...{}".format(Color.BOLD, fuzzerPath, Color.END))
+    try:
+        with open(fuzzerPath, "r") as fuzzerFile:
+            eager = readFuzzer(fuzzerFile.read())
+        lazy = FuzzerData()
+        lazy.readFromFile(fuzzerPath, quiet=True, useCache=False)
+        unloadedCount = len([message for message in lazy.messageCollection.messages if not message.isLoaded()])
+        isPass = (unloadedCount > 0 or not lazy.messageCollection.messages) and describe(eager) == describe(lazy)
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        isPass = False
+    printResult("Lazy Read {0}".format(fuzzerPath), isPass)
+
+# Bad message data should be reported while reading, not when the message
+# is first used, and editing the file afterwards shouldn't change anything
+def testLazyReadChecks():
+    print("\n{}Testing lazy read checks...{}".format(Color.BOLD, Color.END))
+    tempFolder = tempfile.mkdtemp()
+    fuzzerPath = os.path.join(tempFolder, "test.fuzzer")
+    try:
+        with open(fuzzerPath, "w") as fuzzerFile:
+            fuzzerFile.write("outbound 'a'\noutbound hex '6162'\n    'zz'\n")
+        try:
+            FuzzerData().readFromFile(fuzzerPath, quiet=True, useCache=False)
+            isRejected = False
+        except RuntimeError as e:
+            isRejected = "hex" in str(e)
+        with open(fuzzerPath, "w") as fuzzerFile:
+            fuzzerFile.write("outbound 'abc'\ninbound 'def'\n")
+        fuzzerData = FuzzerData()
+        fuzzerData.readFromFile(fuzzerPath, quiet=True, useCache=False)
+        # Truncate the file before anything is decoded
+        open(fuzzerPath, "w").close()
+        messages = [str(message.getOriginalMessage()) for message in fuzzerData.messageCollection.messages]
+    except Exception as e:
+        print("Caught exception running test: {}".format(str(e)))
+        (isRejected, messages) = (False, None)
+    finally:
+        shutil.rmtree(tempFolder)
+    print("\tExpected: rejected True, ['abc', 'def']")
+    print("\t  Actual: rejected {0}, {1}".format(isRejected, messages))
+    printResult("Lazy Read Checks", isRejected and messages == ["abc", "def"])
+
+# Lines that don't look like what writeToFD() produces
+UNUSUAL = """processor_dir default
+tlsSessionResumption 0
+stopAfterFuzz diverge
+pipelinePrefix 1
+outbound 'abc'
+    ' continued'
+sub fuzz "it's"
+sub 'a"b"c'
+\t'tab continued'
+outbound  'two spaces'
+inbound 'x\\x00\\xff\\n\\\\'
+receive  timeout=0.5   optional
+outbound "crlf"\r
+"""
+
+# Hex and base64 tagged data, continuation lines use the tag of the line above
+ENCODED = """outbound fuzz hex '6162'
+    '6364'
+sub base64 'AP8K'
+sub 'a hex b'
+inbound hex "78"
+"""
+
+def main():
+    for fuzzerPath in sorted(glob.glob("../../sample_apps/*/data/*.fuzzer")):
+        with open(fuzzerPath, "r") as fuzzerFile:
+            testRoundTrip(fuzzerPath, fuzzerFile.read())
+        testLazyRead(fuzzerPath)
+    testLazyReadChecks()
+    testRoundTrip("Unusual Lines", UNUSUAL)
+    testRoundTrip("Unusual Lines", UNUSUAL, encoding="hex")
+    testRoundTrip("Unusual Lines", UNUSUAL, encoding="base64")
+    testRoundTrip("Encoded Lines", ENCODED)
+
+    print("\n{}Testing unusual lines...{}".format(Color.BOLD, Color.END))
+    (settings, messages, fixups, captures) = describe(readFuzzer(UNUSUAL))
+    expected = [
+        ("outbound", True, [("abc continued", False), ("it's", True), ('a"b"ctab continued', False)]),
+        ("outbound", False, [("two spaces", False)]),
+        ("inbound", False, [("x\x00\xff\n\\", False)]),
+        ("outbound", False, [("crlf", False)]),
+    ]
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0}".format(messages))
+    printResult("Unusual Lines", messages == expected and settings["tlsSessionResumption"] == False and settings["stopAfterFuzz"] == "diverge" and settings["pipelinePrefix"] == True and settings["receiveOptions"] == {2: "timeout=0.5 optional"})
+
+    print("\n{}Testing encoded lines...{}".format(Color.BOLD, Color.END))
+    fuzzerData = readFuzzer(ENCODED)
+    (settings, messages, fixups, captures) = describe(fuzzerData)
+    expected = [
+        ("outbound", True, [("abcd", True), ("\x00\xff\n", False), ("a hex b", False)]),
+        ("inbound", False, [("x", False)]),
+    ]
+    encodings = [message.encoding for message in fuzzerData.messageCollection.messages]
+    print("\tExpected: {0}".format(expected))
+    print("\t  Actual: {0} {1}".format(messages, encodings))
+    printResult("Encoded Lines", messages == expected and encodings == ["hex", "hex"])
+
+    print("\n{}Testing truncation after the last fuzzed message...{}".format(Color.BOLD, Color.END))
+    fuzzerData = readFuzzer("outbound 'a'\ninbound 'b'\noutbound fuzz 'c'\noutbound 'd'\ninbound 'e'\noutbound 'f'\nfixup counter 0:0-0\ninbound 'g'\n")
+    droppedCount = fuzzerData.truncateAfterFuzzed(1)
+    remaining = "".join(str(message.getOriginalMessage()) for message in fuzzerData.messageCollection.messages)
+    print("\tExpected: abcde, dropped 2, no fixups")
+    print("\t  Actual: {0}, dropped {1}, fixups {2}".format(remaining, droppedCount, fuzzerData.fixups))
+    printResult("Truncation", remaining == "abcde" and droppedCount == 2 and not fuzzerData.fixups)
+
+if __name__ == "__main__":
+    main()
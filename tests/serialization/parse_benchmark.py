@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Time reading a large generated .fuzzer file
+# Usage: parse_benchmark.py [messageCount]
+#
+#------------------------------------------------------------------
+
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.append("../..")
+from backend.fuzzerdata import FuzzerData
+from backend.fuzzer_types import Message
+
+def generateFuzzer(path, messageCount):
+    random.seed(0)
+    with open(path, "w") as fuzzerFile:
+        fuzzerFile.write("processor_dir default\nproto tcp\nport 2500\n\n")
+        for i in range(0, messageCount):
+            data = bytearray(random.getrandbits(8) for j in range(0, random.randint(16, 512)))
+            fuzzerFile.write("# Message {0}\n".format(i))
+            fuzzerFile.write("{0} {1}{2}\n".format("outbound" if i % 2 == 0 else "inbound", "fuzz " if i % 10 == 0 else "", Message.serializeByteArray(data[:len(data)/2])))
+            if i % 3 == 0:
+                fuzzerFile.write("sub {0}\n".format(Message.serializeByteArray(data[len(data)/2:])))
+            else:
+                fuzzerFile.write("    {0}\n".format(Message.serializeByteArray(data[len(data)/2:])))
+
+def main():
+    messageCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    (fd, path) = tempfile.mkstemp(suffix=".fuzzer")
+    os.close(fd)
+    try:
+        generateFuzzer(path, messageCount)
+        print("Generated {0} messages, {1:.1f}MB".format(messageCount, os.path.getsize(path) / 1048576.0))
+        times = []
+        for i in range(0, 3):
+            startTime = time.time()
+            FuzzerData().readFromFile(path, quiet=True)
+            times.append(time.time() - startTime)
+        print("Best of 3: {0:.3f}s ({1:.0f} messages/s)".format(min(times), messageCount / min(times)))
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
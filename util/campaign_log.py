@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#------------------------------------------------------------------
+# Read binary campaign logs written by mutiny.py --campaignLog
+#
+# Copyright (c) 2014-2017 by Cisco Systems, Inc.
+# All rights reserved.
+#
+#------------------------------------------------------------------
+
+import argparse
+import datetime
+import os.path
+import sys
+
+# Kind of dirty, grab libs from one directory up
+sys.path.insert(0, os.path.abspath( os.path.join(__file__, "../..")))
+from backend.fuzzerdata import FuzzerData
+from backend.fuzzer_types import Logger
+from backend.campaign_log import CampaignLogReader, parseSeedRange
+
+epilog = """Actions: 
+list - List the seeds in the log with their times and error messages
+show - Write the usual text log for each seed in --seeds
+"""
+parser = argparse.ArgumentParser(description="Script to read binary campaign logs", formatter_class=argparse.RawDescriptionHelpFormatter, epilog=epilog)
+parser.add_argument("action", help="Action to use, see below", choices=["list", "show"])
+parser.add_argument("logfolder", help="Log folder of the session, <XYZ>_logs/<time_of_session>")
+parser.add_argument("-f", "--fuzzerfile", help="The .fuzzer the session was run with (show)")
+parser.add_argument("-s", "--seeds", help="Seeds to show, X or X-Y, all logged seeds otherwise (-s=X-Y if X is negative)")
+parser.add_argument("-o", "--outfile", help="File to write results to, uses stdout otherwise")
+args = parser.parse_args()
+
+reader = CampaignLogReader(args.logfolder)
+seeds = reader.getSeeds()
+if args.seeds:
+    try:
+        (low, high) = parseSeedRange(args.seeds)
+    except RuntimeError as e:
+        print(str(e))
+        exit(1)
+    seeds = [seed for seed in seeds if low <= seed <= high]
+
+outFileDesc = sys.stdout
+if args.outfile:
+    outFileDesc = open(args.outfile, "w")
+
+if args.action == "list":
+    for seed in seeds:
+        record = reader.getRecord(seed)
+        startTime = datetime.datetime.fromtimestamp(record.startTime).strftime("%Y-%m-%d %H:%M:%S.%f")
+        outFileDesc.write("Seed %d at %s, %.3f seconds: %s\n" % (seed, startTime, record.endTime - record.startTime, record.errorMessage))
+
+elif args.action == "show":
+    if not args.fuzzerfile:
+        print("fuzzerfile required for action {0}".format(args.action))
+        exit(1)
+
+    # Records only hold what changed in the run, the rest comes from the .fuzzer
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFile(args.fuzzerfile, quiet=True)
+    for seed in seeds:
+        record = reader.getRecord(seed)
+        Logger.writeLog(outFileDesc, seed, fuzzerData.messageCollection, record.errorMessage, record.receivedMessageData, record.highestMessageNumber, record.alteredState)
+
+if args.outfile:
+    outFileDesc.close()
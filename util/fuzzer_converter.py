@@ -25,13 +25,15 @@ epilog = """Actions:
 fuzzer2bin - Pull binary message out of .fuzzer file
 bin2fuzzer - Update message in .fuzzer file with raw binary data
 list       - List all messages in a .fuzzer
+encode     - Rewrite a .fuzzer with all messages in the --encoding given
 """
 parser = argparse.ArgumentParser(description="Script to convert and view .fuzzer data", formatter_class=argparse.RawDescriptionHelpFormatter, epilog=epilog)
-parser.add_argument("action", help="Action to use, see below", choices=["fuzzer2bin", "bin2fuzzer", "list"])
+parser.add_argument("action", help="Action to use, see below", choices=["fuzzer2bin", "bin2fuzzer", "list", "encode"])
 parser.add_argument("-i", "--infile", help="File to read input from, uses stdin otherwise")
 parser.add_argument("-o", "--outfile", help="File to write results to, uses stdout otherwise")
 parser.add_argument("-f", "--fuzzerfile", help="File to get .fuzzer data from for bin2fuzzer, if it should differ from outfile or outfile is stdout")
 parser.add_argument("-m", "--messagenum", help="Message number to read/write (fuzzer2bin and bin2fuzzer)", type=int)
+parser.add_argument("-e", "--encoding", help="How to write message data (bin2fuzzer and encode), hex or base64 are more compact for binary data", choices=["escaped", "hex", "base64"])
 args = parser.parse_args()
 
 if args.action != "bin2fuzzer" and args.fuzzerfile:
@@ -51,6 +53,18 @@ if args.action == "list":
     fuzzerData = FuzzerData()
     # Allow a non-quiet read to list out messages
     fuzzerData.readFromFD(inFileDesc, quiet=False)
+
+elif args.action == "encode":
+    if not args.encoding:
+        print("Encoding required for action {0}".format(args.action))
+        exit(1)
+
+    fuzzerData = FuzzerData()
+    fuzzerData.readFromFD(inFileDesc, quiet=True)
+    fuzzerData.setEncoding(args.encoding)
+    if args.outfile:
+        outFileDesc = open(args.outfile, "w")
+    fuzzerData.writeToFD(outFileDesc)
     
 elif args.action in ["fuzzer2bin", "bin2fuzzer"]:
     if args.messagenum == None:
@@ -79,7 +93,8 @@ elif args.action in ["fuzzer2bin", "bin2fuzzer"]:
             fuzzerData.readFromFile(args.fuzzerfile, quiet=True)
         else:
             try:
-                # readFromFile() since outFileDesc is opened for write
+                # readFromFile() since outFileDesc is opened for write, which
+                # is fine as it keeps its own copy of the file's contents
                 fuzzerData.readFromFile(args.outfile, quiet=True)
             except Exception as ex:
                 print("Ignoring bad outfile, writing default .fuzzer data, error: {0}".format(str(ex)))
@@ -95,6 +110,8 @@ elif args.action in ["fuzzer2bin", "bin2fuzzer"]:
             exit(1)
         message = fuzzerData.messageCollection.messages[args.messagenum]
         message.setMessageFrom(Message.Format.Raw, messageData, message.isFuzzed)
+        if args.encoding:
+            message.encoding = args.encoding
         if args.outfile:
             outFileDesc = open(args.outfile, "w")
         fuzzerData.writeToFD(outFileDesc)